@@ -1,8 +1,24 @@
+import asyncio
 import random
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
 
+from . import metrics
+from .config import env_float, env_int
+from .game import SHOT_COSTS, random_free_position
+from .models import BoardGeometry, GameState, Position, geometry
 from .rooms import Room
 
+# Cells a hard AI may inspect when picking one base position. Everything else
+# it does per move is a handful of popcounts over precomputed masks.
+AI_HARD_BUDGET = env_int("AI_HARD_BUDGET", 64)
+# Hard AI decisions run on this pool; past the timeout the cheap saldo rule
+# is used instead, so a slow decision never stalls the game.
+AI_DECISION_TIMEOUT = env_float("AI_DECISION_TIMEOUT", 0.5)
+_executor = ThreadPoolExecutor(max_workers=env_int("AI_WORKERS", 2), thread_name_prefix="ai")
+
 
 def ai_should_act(room: Room) -> bool:
     if not room.ai_player_id:
@@ -16,20 +32,276 @@ def ai_should_act(room: Room) -> bool:
     return False
 
 
+@dataclass(frozen=True)
+class HardTables:
+    """Per board size lookup tables for the hard AI.
+
+    `exposure[i]` is how many strong-shot centres cover cell i, and `classes`
+    groups cells by that count, lowest first, as (count, mask) pairs.
+    """
+
+    board: BoardGeometry
+    exposure: Tuple[int, ...]
+    classes: Tuple[Tuple[int, int], ...]
+
+
+@lru_cache(maxsize=None)
+def hard_tables(rows: int, cols: int) -> HardTables:
+    board = geometry(rows, cols)
+    exposure = tuple(neighborhood.bit_count() for neighborhood in board.neighborhoods)
+    classes = {}
+    for index, count in enumerate(exposure):
+        classes[count] = classes.get(count, 0) | (1 << index)
+    return HardTables(board, exposure, tuple(sorted(classes.items())))
+
+
+@dataclass(frozen=True)
+class HardView:
+    """Everything a hard AI decision reads, captured on the event loop.
+
+    The purchase fields are only filled in when a purchase is possible, so a
+    view taken before the human moves still matches after a plain miss.
+    """
+
+    rows: int
+    cols: int
+    budget: int
+    saldo: int = 0
+    enemy_count: int = 0
+    cleared: int = 0
+    pool: int = 0
+    own: Optional[int] = None
+    ruled_out: int = 0
+    enemy_armed: bool = False
+    placing: int = 0
+
+
+Decision = Tuple[str, object]
+
+
+class HardAI:
+    """Probabilistic opponent model behind the "hard" difficulty.
+
+    Shots land at random, so the AI cannot aim; what it can do is estimate how
+    many hits each shot type is worth and where its own bases are safest.
+    Every cell its own shots have impacted is known to be free of enemy bases
+    (any base there was destroyed), until the enemy buys a new one. The
+    remaining enemy bases are spread uniformly over the unknown cells, which
+    gives the expected hits of each shot type. Defensively it tracks which
+    cells the enemy's normal shots have already ruled out, since those shots
+    never return to a missed cell until they hit something.
+
+    The model itself only does bookkeeping; decisions are made by `plan` on
+    a `HardView` snapshot so they can run off the event loop.
+    """
+
+    def __init__(self, budget: Optional[int] = None) -> None:
+        self.budget = AI_HARD_BUDGET if budget is None else budget
+        self.cleared = 0
+        self.ruled_out = 0
+        self.enemy_count: Optional[int] = None
+        self.own_count: Optional[int] = None
+        self.turn_seen = -1
+
+    def observe(self, state: GameState, ai_id: str) -> None:
+        """Fold in what happened since the AI's last move, once per turn."""
+        enemy_id = state.enemy_id(ai_id)
+        if not enemy_id or state.turn_number == self.turn_seen:
+            return
+        self.turn_seen = state.turn_number
+        enemy_count = len(state.bases[enemy_id])
+        own_count = len(state.bases[ai_id])
+        if self.enemy_count is not None and enemy_count > self.enemy_count:
+            # A bought base can sit anywhere, including cells we cleared.
+            self.cleared = 0
+        if self.own_count is not None and state.last_shooter_id == enemy_id:
+            if own_count < self.own_count:
+                # Normal shots start over after a hit.
+                self.ruled_out = 0
+            elif len(state.last_impacts) == 1:
+                self.ruled_out |= state.board.mask_of(state.last_impacts)
+        self.enemy_count = enemy_count
+        self.own_count = own_count
+
+    def after_shot(self, state: GameState, ai_id: str, impacts) -> None:
+        enemy_id = state.enemy_id(ai_id)
+        self.cleared |= state.board.mask_of(impacts)
+        self.enemy_count = len(state.bases[enemy_id]) if enemy_id else 0
+
+    def view(self, state: GameState, ai_id: str) -> HardView:
+        board = state.board
+        own = state.bases[ai_id]
+        if state.phase == "placement":
+            return HardView(
+                state.rows,
+                state.cols,
+                self.budget,
+                own=own.mask,
+                ruled_out=self.ruled_out,
+                placing=state.max_bases - len(own),
+            )
+        enemy_id = state.enemy_id(ai_id)
+        enemy_count = len(state.bases[enemy_id]) if enemy_id else 0
+        if (board.full & ~self.cleared).bit_count() < enemy_count:
+            self.cleared = 0
+        saldo = state.players[ai_id].saldo
+        buying = saldo >= 2 and len(own) <= 1
+        return HardView(
+            state.rows,
+            state.cols,
+            self.budget,
+            saldo=saldo,
+            enemy_count=enemy_count,
+            cleared=self.cleared,
+            pool=len(state.normal_candidates[ai_id]) or board.size,
+            own=own.mask if buying else None,
+            ruled_out=self.ruled_out if buying else 0,
+            enemy_armed=buying and bool(enemy_id) and state.players[enemy_id].saldo >= 1,
+        )
+
+    def prepare(self, state: GameState, ai_id: str) -> HardView:
+        if state.phase == "battle":
+            self.observe(state, ai_id)
+        return self.view(state, ai_id)
+
+
+def expected_hits(view: HardView) -> dict:
+    remaining = view.enemy_count
+    if not remaining:
+        return {"normal": 0.0, "precise": 0.0, "strong": 0.0}
+    tables = hard_tables(view.rows, view.cols)
+    board = tables.board
+    unknown = board.full & ~view.cleared
+    density = remaining / unknown.bit_count()
+    exposure = sum(count * (unknown & mask).bit_count() for count, mask in tables.classes)
+    return {
+        "normal": min(1.0, remaining / view.pool),
+        "precise": 0.5,
+        "strong": density * exposure / board.size,
+    }
+
+
+def choose_shot(view: HardView) -> str:
+    hits = expected_hits(view)
+    # A saldo point is worth what it adds to next turn's shot.
+    value = max(0.0, hits["precise"] - hits["normal"])
+    best, best_score = "normal", hits["normal"] * (1 + value)
+    for shot_type in ("precise", "strong"):
+        cost = SHOT_COSTS[shot_type]
+        if view.saldo < cost:
+            continue
+        score = hits[shot_type] * (1 + value) - cost * value
+        if score > best_score:
+            best, best_score = shot_type, score
+    return best
+
+
+def threat(view: HardView) -> float:
+    """Chance the enemy's best shot next turn lands on one of our bases."""
+    own = view.own.bit_count() if view.own else 0
+    if not own:
+        return 0.0
+    size = view.rows * view.cols
+    odds = own / max(size - view.ruled_out.bit_count(), own)
+    if view.enemy_armed:
+        odds = max(odds, 0.5)
+    return odds
+
+
+def should_buy(view: HardView) -> bool:
+    if view.own is None:
+        return False
+    # With one enemy base left a precise shot ends the game half the time.
+    if view.enemy_count == 1:
+        return False
+    return threat(view) >= 0.25
+
+
+def pick_cell(view: HardView, taken: int) -> Optional[Position]:
+    """Safest free cell: ruled out by enemy normal shots, then least exposed."""
+    tables = hard_tables(view.rows, view.cols)
+    free = tables.board.full & ~taken
+    for preferred in (free & view.ruled_out, free):
+        for _, mask in tables.classes:
+            candidates = preferred & mask
+            if candidates:
+                return _sample(tables.board, candidates, view.budget)
+    return None
+
+
+def _sample(board: BoardGeometry, mask: int, budget: int) -> Position:
+    if mask.bit_count() <= budget:
+        return random.choice(board.positions_of(mask))
+    for _ in range(budget):
+        index = random.randrange(board.size)
+        if mask >> index & 1:
+            return board.positions[index]
+    # Budget spent on misses: take the lowest cell instead of scanning.
+    return board.positions[(mask & -mask).bit_length() - 1]
+
+
+def plan(view: HardView) -> Decision:
+    """Hard AI decision for a view; pure, so it can run on a worker thread."""
+    if view.placing:
+        taken = view.own or 0
+        positions = []
+        for _ in range(view.placing):
+            pos = pick_cell(view, taken)
+            if pos is None:
+                break
+            positions.append(pos)
+            taken |= 1 << (pos[0] * view.cols + pos[1])
+        return "place", positions
+    if should_buy(view):
+        pos = pick_cell(view, view.own or 0)
+        if pos is not None:
+            return "buy", pos
+    return "shot", choose_shot(view)
+
+
+def fallback(view: HardView) -> Decision:
+    """Cheap heuristic used when `plan` misses its deadline."""
+    if view.placing:
+        board = geometry(view.rows, view.cols)
+        taken = view.own or 0
+        positions = []
+        for _ in range(view.placing):
+            pos = random_free_position(board, taken)
+            if pos is None:
+                break
+            positions.append(pos)
+            taken |= board.bit(pos)
+        return "place", positions
+    if view.saldo >= 3:
+        return "shot", "strong"
+    if view.saldo >= 1:
+        return "shot", "precise"
+    return "shot", "normal"
+
+
+def _hard_ai(room: Room) -> HardAI:
+    if room.ai_model is None:
+        room.ai_model = HardAI()
+    return room.ai_model
+
+
 def _ai_place_bases(room: Room) -> None:
     ai_id = room.ai_player_id
     if not ai_id:
         return
     game = room.game
+    board = game.state.board
     bases = game.state.bases[ai_id]
-    all_positions = list(game.state.all_positions())
-    random.shuffle(all_positions)
-    for pos in all_positions:
-        if len(bases) >= game.state.max_bases:
+    taken = bases.mask
+    positions = []
+    for _ in range(game.state.max_bases - len(bases)):
+        pos = random_free_position(board, taken)
+        if pos is None:
             break
-        if pos in bases:
-            continue
-        game.place_base(ai_id, pos)
+        positions.append(pos)
+        taken |= board.bit(pos)
+    if positions:
+        game.place_bases(ai_id, positions)
 
 
 def _ai_choose_shot(room: Room) -> str:
@@ -40,23 +312,43 @@ def _ai_choose_shot(room: Room) -> str:
     if difficulty == "easy":
         return "normal"
     if difficulty == "hard":
-        if saldo >= 3:
-            return "strong"
-        if saldo >= 1:
-            return "precise"
-        return "normal"
+        return choose_shot(_hard_ai(room).prepare(game.state, room.ai_player_id))
     # normal
     if saldo >= 1 and random.random() < 0.5:
         return "precise"
     return "normal"
 
 
+def _apply_hard(room: Room, decision: Decision) -> None:
+    game = room.game
+    state = game.state
+    ai_id = room.ai_player_id
+    model = _hard_ai(room)
+    kind, value = decision
+    if kind == "place":
+        if value:
+            game.place_bases(ai_id, value)
+    elif kind == "buy":
+        game.set_message(game.buy_base(ai_id, value))
+        model.own_count = len(state.bases[ai_id])
+    else:
+        message, impacts = game.shot(ai_id, value)
+        model.after_shot(state, ai_id, impacts)
+        game.set_message(message, impacts)
+
+
 def apply_ai(room: Room) -> bool:
     if not room.ai_player_id:
         return False
     game = room.game
     ai_id = room.ai_player_id
 
+    if room.ai_difficulty == "hard":
+        if not ai_should_act(room):
+            return False
+        _apply_hard(room, plan(_hard_ai(room).prepare(game.state, ai_id)))
+        return True
+
     if game.state.phase == "placement":
         if not game.state.players[ai_id].placement_ready:
             _ai_place_bases(room)
@@ -65,7 +357,69 @@ def apply_ai(room: Room) -> bool:
 
     if game.state.phase == "battle" and game.state.turn_player_id == ai_id:
         shot_type = _ai_choose_shot(room)
-        game.state.last_message, game.state.last_impacts = game.shot(ai_id, shot_type)
+        game.set_message(*game.shot(ai_id, shot_type))
         return True
 
     return False
+
+
+def plan_ahead(room: Room) -> None:
+    """Start computing the hard AI's next decision on the worker pool.
+
+    On the AI's own turn this is the real decision, ready before the move
+    delay ends. On the human's turn it is a guess that the human's move will
+    not change anything the decision reads; `apply_ai_async` checks the guess
+    and plans again if it was wrong.
+    """
+    if room.ai_difficulty != "hard" or not room.ai_player_id:
+        return
+    state = room.game.state
+    model = _hard_ai(room)
+    if ai_should_act(room):
+        view = model.prepare(state, room.ai_player_id)
+    elif state.phase == "battle":
+        view = model.view(state, room.ai_player_id)
+    else:
+        return
+    if room.ai_plan and room.ai_plan[0] == view:
+        return
+    _drop_plan(room)
+    loop = asyncio.get_running_loop()
+    room.ai_plan = (view, loop.run_in_executor(_executor, plan, view))
+
+
+def _drop_plan(room: Room) -> None:
+    if room.ai_plan:
+        room.ai_plan[1].cancel()
+        room.ai_plan = None
+
+
+async def _decide(room: Room, view: HardView) -> Decision:
+    planned, room.ai_plan = room.ai_plan, None
+    if planned and planned[0] == view:
+        metrics.AI_PLAN_HITS.inc()
+        future = planned[1]
+    else:
+        metrics.AI_PLAN_MISSES.inc()
+        if planned:
+            planned[1].cancel()
+        future = asyncio.get_running_loop().run_in_executor(_executor, plan, view)
+    try:
+        return await asyncio.wait_for(future, AI_DECISION_TIMEOUT)
+    except Exception:
+        metrics.AI_FALLBACKS.inc()
+        return fallback(view)
+
+
+async def apply_ai_async(room: Room) -> bool:
+    """apply_ai, with the hard AI's decision made off the event loop.
+
+    A planned decision is used when its view still matches; otherwise the
+    decision is computed on the pool, and the cheap heuristic takes over if
+    it does not finish within AI_DECISION_TIMEOUT.
+    """
+    if room.ai_difficulty != "hard" or not ai_should_act(room):
+        return apply_ai(room)
+    view = _hard_ai(room).prepare(room.game.state, room.ai_player_id)
+    _apply_hard(room, await _decide(room, view))
+    return True
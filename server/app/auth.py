@@ -1,9 +1,22 @@
+import asyncio
+import hashlib
+import json
 import os
-from typing import Dict
+import re
+import time
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
 
 import firebase_admin
+import jwt
+from cryptography.x509 import load_pem_x509_certificate
 from firebase_admin import auth, credentials
 
+from . import metrics
+from .config import env_float, env_int
+
 
 def _auth_disabled() -> bool:
     return os.getenv("AUTH_DISABLED", "").lower() in {"1", "true", "yes"}
@@ -19,10 +32,207 @@ def _init_admin() -> None:
     firebase_admin.initialize_app(cred)
 
 
+class TokenCache:
+    """LRU cache of verified ID tokens, keyed by token hash.
+
+    Entries expire at the token's own `exp` (capped by `max_ttl`), so a
+    cached token is never trusted longer than Firebase would trust it.
+    """
+
+    def __init__(self, max_size: int = 10000, max_ttl: float = 3600.0) -> None:
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+
+    @staticmethod
+    def key(id_token: str) -> str:
+        return hashlib.sha256(id_token.encode("utf-8")).hexdigest()
+
+    def get(self, id_token: str, now: Optional[float] = None) -> Optional[Dict]:
+        now = time.time() if now is None else now
+        key = self.key(id_token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, decoded = entry
+        if expires_at <= now:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return decoded
+
+    def put(self, id_token: str, decoded: Dict, now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        exp = decoded.get("exp")
+        if exp is None or self.max_size <= 0:
+            return
+        expires_at = min(float(exp), now + self.max_ttl)
+        if expires_at <= now:
+            return
+        key = self.key(id_token)
+        self._entries[key] = (expires_at, decoded)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+token_cache = TokenCache(
+    max_size=env_int("AUTH_CACHE_SIZE", 10000),
+    max_ttl=env_float("AUTH_CACHE_MAX_TTL", 3600.0),
+)
+metrics.AUTH_CACHE_HITS.callback = lambda: token_cache.hits
+metrics.AUTH_CACHE_MISSES.callback = lambda: token_cache.misses
+
+
+GOOGLE_CERTS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/"
+    "securetoken@system.gserviceaccount.com"
+)
+ISSUER_PREFIX = "https://securetoken.google.com/"
+
+
+class KeyStore:
+    """Local copy of the Firebase ID-token signing keys.
+
+    `source` is "remote" to fetch Google's published certificates, or the
+    path to a JSON file with the same `{kid: certificate PEM}` shape for
+    offline runs and tests. `load()` is blocking and is meant to run on a
+    worker thread; `run()` keeps the keys fresh in the background.
+    """
+
+    def __init__(self, source: str, refresh_seconds: float = 3600.0) -> None:
+        self.source = source
+        self.refresh_seconds = refresh_seconds
+        self.keys: Dict[str, object] = {}
+        self.expires_at = 0.0
+
+    def _fetch(self) -> Tuple[Dict[str, str], float]:
+        if self.source != "remote":
+            with open(self.source, "r", encoding="utf-8") as handle:
+                return json.load(handle), self.refresh_seconds
+        with urllib.request.urlopen(GOOGLE_CERTS_URL, timeout=10) as response:
+            certs = json.loads(response.read().decode("utf-8"))
+            cache_control = response.headers.get("Cache-Control", "")
+        match = re.search(r"max-age=(\d+)", cache_control)
+        max_age = float(match.group(1)) if match else self.refresh_seconds
+        return certs, max_age
+
+    def load(self) -> float:
+        certs, max_age = self._fetch()
+        self.keys = {
+            kid: load_pem_x509_certificate(pem.encode("utf-8")).public_key()
+            for kid, pem in certs.items()
+        }
+        self.expires_at = time.time() + max_age
+        return max_age
+
+    def get(self, kid: Optional[str]) -> Optional[object]:
+        if not self.keys or time.time() >= self.expires_at:
+            self.load()
+        return self.keys.get(kid or "")
+
+    async def run(self, retry_seconds: float = 60.0) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                delay = await loop.run_in_executor(_executor, self.load)
+            except Exception:
+                delay = retry_seconds
+            await asyncio.sleep(max(delay, 1.0))
+
+
+def _create_keystore() -> Optional[KeyStore]:
+    source = os.getenv("AUTH_KEYSTORE", "")
+    if not source:
+        return None
+    return KeyStore(source, refresh_seconds=env_float("AUTH_KEYS_REFRESH", 3600.0))
+
+
+keystore = _create_keystore()
+_executor = ThreadPoolExecutor(
+    max_workers=env_int("AUTH_VERIFY_WORKERS", 4), thread_name_prefix="auth-verify"
+)
+
+
+def _project_id() -> str:
+    return os.getenv("AUTH_PROJECT_ID") or os.getenv("FIREBASE_PROJECT_ID", "")
+
+
+def _verify_with_keystore(id_token: str, store: KeyStore) -> Dict:
+    header = jwt.get_unverified_header(id_token)
+    key = store.get(header.get("kid"))
+    if key is None:
+        raise ValueError("Unknown signing key")
+    project_id = _project_id()
+    decoded = jwt.decode(
+        id_token,
+        key,
+        algorithms=["RS256"],
+        audience=project_id,
+        issuer=ISSUER_PREFIX + project_id,
+    )
+    subject = decoded.get("sub")
+    if not subject or len(subject) > 128:
+        raise ValueError("Invalid token subject")
+    decoded["uid"] = subject
+    return decoded
+
+
+def session_active(decoded: Optional[Dict], now: Optional[float] = None) -> bool:
+    """Whether a token verified earlier on this connection is still valid."""
+    if not decoded:
+        return False
+    exp = decoded.get("exp")
+    if exp is None:
+        return True
+    now = time.time() if now is None else now
+    return float(exp) > now
+
+
+def _verify_uncached(id_token: str) -> Dict:
+    started = time.perf_counter()
+    try:
+        if keystore is not None:
+            decoded = _verify_with_keystore(id_token, keystore)
+        else:
+            _init_admin()
+            decoded = auth.verify_id_token(id_token)
+    finally:
+        metrics.AUTH_VERIFY_SECONDS.observe(time.perf_counter() - started)
+    token_cache.put(id_token, decoded)
+    return decoded
+
+
 def verify_id_token(id_token: str) -> Dict:
     if not id_token:
         raise ValueError("Missing token")
     if _auth_disabled():
         return {"uid": "test-user"}
-    _init_admin()
-    return auth.verify_id_token(id_token)
+    cached = token_cache.get(id_token)
+    if cached is not None:
+        return cached
+    return _verify_uncached(id_token)
+
+
+async def verify_id_token_async(id_token: str) -> Dict:
+    """verify_id_token that runs cache misses on the auth thread pool."""
+    if not id_token:
+        raise ValueError("Missing token")
+    if _auth_disabled():
+        return {"uid": "test-user"}
+    cached = token_cache.get(id_token)
+    if cached is not None:
+        return cached
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, _verify_uncached, id_token)
@@ -0,0 +1,62 @@
+"""Tick-based coalescing of room broadcasts.
+
+A state change that arrives when its room has been quiet for a tick is
+sent at once, so a lone action never waits. Changes that follow within
+BROADCAST_TICK seconds only mark the room dirty; one timer per tick then
+sends a single frame for every dirty room, carrying all of their changes.
+Sending never awaits, so the tick is a plain loop callback rather than a
+task. Turn and phase transitions, and callers passing `flush=True`,
+always go out immediately.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Callable, Dict, Optional
+
+from . import metrics
+from .config import env_float
+
+BROADCAST_TICK = env_float("BROADCAST_TICK", 0.02)
+
+
+class Coalescer:
+    def __init__(self, send: Callable[[object], None], tick: Optional[float] = None) -> None:
+        self.send = send
+        self.tick = BROADCAST_TICK if tick is None else tick
+        # Rooms with changes waiting for the next tick, by code.
+        self.dirty: Dict[str, object] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def submit(self, room, flush: bool = False) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if (
+            flush
+            or self.tick <= 0
+            or room.turn_changed()
+            or (room.code not in self.dirty and now - room.broadcast_at >= self.tick)
+        ):
+            self.dirty.pop(room.code, None)
+            self._send(room, now)
+            return
+        if room.code not in self.dirty:
+            self.dirty[room.code] = room
+        else:
+            metrics.BROADCASTS_COALESCED.inc()
+        if self._timer is None or self._loop is not loop:
+            self._timer = loop.call_later(self.tick, self.flush, loop)
+            self._loop = loop
+
+    def flush(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Send one frame for every room changed since the last tick."""
+        self._timer = None
+        dirty, self.dirty = self.dirty, {}
+        now = loop.time()
+        for room in dirty.values():
+            self._send(room, now)
+
+    def _send(self, room, now: float) -> None:
+        room.broadcast_at = now
+        room.mark_sent()
+        self.send(room)
@@ -0,0 +1,41 @@
+"""JSON codec for WebSocket traffic.
+
+Uses orjson when it is installed and the stdlib `json` module otherwise;
+JSON_CODEC=json forces the stdlib. Both produce the same compact, UTF-8
+text. orjson only handles 64-bit integers, so `dumps` falls back to the
+stdlib for payloads it rejects. The journal keeps using the stdlib: its
+snapshots hold board bitmasks wider than 64 bits, which orjson would read
+back as floats.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _std_dumps(payload: Any) -> str:
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+
+
+if orjson is not None and os.getenv("JSON_CODEC", "").lower() != "json":
+    NAME = "orjson"
+
+    def loads(raw):
+        return orjson.loads(raw)
+
+    def dumps(payload: Any) -> str:
+        try:
+            return orjson.dumps(payload).decode("utf-8")
+        except TypeError:
+            return _std_dumps(payload)
+
+else:
+    NAME = "json"
+    loads = json.loads
+    dumps = _std_dumps
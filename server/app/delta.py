@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+# Fields of a serialized player worth diffing individually.
+PLAYER_FIELDS = ("name", "saldo", "ready", "placement_ready", "connected")
+
+
+def _as_positions(bases: List) -> set:
+    return {tuple(pos) for pos in bases}
+
+
+def diff_state(old: Dict, new: Dict) -> Dict:
+    """Changes that turn serialized state `old` into `new`.
+
+    Scalars are sent whole, players only with the fields that changed and
+    bases as added/removed positions per player.
+    """
+    changes: Dict = {}
+    for key, value in new.items():
+        if key in ("players", "bases", "version"):
+            continue
+        if old.get(key) != value:
+            changes[key] = value
+
+    old_players = {p["id"]: p for p in old.get("players", [])}
+    players: Dict[str, Dict] = {}
+    for player in new.get("players", []):
+        before: Optional[Dict] = old_players.get(player["id"])
+        if before is None:
+            players[player["id"]] = {k: player[k] for k in PLAYER_FIELDS}
+            continue
+        changed = {k: player[k] for k in PLAYER_FIELDS if before.get(k) != player[k]}
+        if changed:
+            players[player["id"]] = changed
+    if players:
+        changes["players"] = players
+
+    old_bases = old.get("bases", {})
+    bases: Dict[str, Dict] = {}
+    for pid, positions in new.get("bases", {}).items():
+        current = _as_positions(positions)
+        previous = _as_positions(old_bases.get(pid, []))
+        added = current - previous
+        removed = previous - current
+        if added or removed or pid not in old_bases:
+            bases[pid] = {
+                "added": [list(pos) for pos in sorted(added)],
+                "removed": [list(pos) for pos in sorted(removed)],
+            }
+    if bases:
+        changes["bases"] = bases
+    return changes
@@ -0,0 +1,56 @@
+"""Handler registry for WebSocket messages.
+
+Each message type maps to one Route: its handler plus what the shared
+middleware in `main.dispatch` does around it, in this order: validate the
+message against the route's precompiled schema, redirect room codes owned
+by another worker, verify the ID token, resolve and lock the room, call
+the handler and finally run the post-action hook.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .schema import compile_schema
+
+Handler = Callable[..., Awaitable[None]]
+
+
+class Rejected(Exception):
+    """Raised by a handler to answer with an error and skip the post-action hook."""
+
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+        self.message = message
+
+
+@dataclass(frozen=True)
+class Route:
+    handler: Handler
+    validate: Callable[[Dict], Optional[str]]
+    # "verify" checks the message's idToken every time; "session" reuses the
+    # token verified earlier on the connection while it is still valid.
+    auth: Optional[str] = None
+    # "new" creates a room from the board options, "code" looks up the
+    # message's room_code and "current" the room the connection plays in.
+    room: Optional[str] = None
+    # Whether the handler runs under the room lock.
+    lock: bool = True
+    # Error sent when the room cannot be resolved.
+    missing: str = "Sala inexistente"
+    # "ai" lets the AI act, then arms timers and broadcasts; "broadcast"
+    # broadcasts first and then arms timers.
+    after: Optional[str] = None
+    # Room-entry messages carry the connection's protocol options.
+    entry: bool = False
+
+
+ROUTES: Dict[str, Route] = {}
+
+
+def route(msg_type: str, schema: Optional[Dict[str, Any]] = None, **options: Any) -> Callable[[Handler], Handler]:
+    def register(handler: Handler) -> Handler:
+        ROUTES[msg_type] = Route(handler, compile_schema(schema or {}), **options)
+        return handler
+
+    return register
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Optional, Set, Tuple, Union
+
+# Viewers handed a frame before the fan-out task yields to the event loop.
+FANOUT_CHUNK = 500
+
+
+class Fanout:
+    """Spectator tier for one room.
+
+    The game side only calls `publish`, which stores the newest encoded frame
+    and wakes a background task; that task hands the same frame to every
+    viewer's outbox outside the room lock, yielding every FANOUT_CHUNK
+    viewers. Like outboxes it is latest-wins: viewers that fall behind skip
+    straight to the newest version. Viewers on the binary subprotocol get the
+    binary encoding of the same frame; `binary` counts them so the binary
+    frame is only built while someone needs it.
+    """
+
+    def __init__(self) -> None:
+        self.viewers: Set[object] = set()
+        self.binary = 0
+        self._frame: Optional[Tuple[str, Optional[bytes], int]] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.viewers)
+
+    def add(self, outbox, frame: Union[str, bytes], version: int) -> None:
+        if outbox not in self.viewers and outbox.binary:
+            self.binary += 1
+        self.viewers.add(outbox)
+        outbox.send_state(frame, version)
+
+    def discard(self, outbox) -> None:
+        if outbox in self.viewers and outbox.binary:
+            self.binary -= 1
+        self.viewers.discard(outbox)
+
+    def publish(self, frame: str, version: int, binary: Optional[bytes] = None) -> None:
+        self._frame = (frame, binary, version)
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self.viewers:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._frame is None:
+                continue
+            frame, binary, version = self._frame
+            for index, outbox in enumerate(list(self.viewers)):
+                if index and index % FANOUT_CHUNK == 0:
+                    await asyncio.sleep(0)
+                outbox.send_state(binary if outbox.binary else frame, version)
+
+    def close(self) -> None:
+        self.viewers.clear()
+        self.binary = 0
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
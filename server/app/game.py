@@ -2,20 +2,56 @@ from __future__ import annotations
 
 import random
 import uuid
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
-from .models import GameState, Player, Position
+from .config import env_int
+from .models import Board, CandidatePool, GameState, Player, Position
 
+BOARD_MAX_ROWS = env_int("BOARD_MAX_ROWS", 50)
+BOARD_MAX_COLS = env_int("BOARD_MAX_COLS", 50)
+# Random probes before a sampler falls back to scanning the board.
+_SAMPLE_TRIES = 16
+SHOT_COSTS = {"normal": 0, "precise": 1, "strong": 3}
+
+
+def validate_board(rows: int, cols: int, max_bases: int) -> Optional[str]:
+    for value in (rows, cols, max_bases):
+        if not isinstance(value, int) or isinstance(value, bool):
+            return "Tabuleiro invalido"
+    if not 1 <= rows <= BOARD_MAX_ROWS or not 1 <= cols <= BOARD_MAX_COLS:
+        return "Tabuleiro invalido"
+    if not 1 <= max_bases <= rows * cols:
+        return "Tabuleiro invalido"
+    return None
+
+
+def random_free_position(board, taken: int) -> Optional[Position]:
+    """Uniform random cell outside `taken`, or None if the board is full.
+
+    Bases are sparse, so a few random probes almost always succeed and the
+    O(board) scan is only a fallback for crowded boards.
+    """
+    for _ in range(_SAMPLE_TRIES):
+        idx = random.randrange(board.size)
+        if not taken >> idx & 1:
+            return board.positions[idx]
+    free = board.positions_of(board.full & ~taken)
+    return random.choice(free) if free else None
 
-class GameManager:
-    def __init__(self) -> None:
-        self.state = GameState()
 
-    def add_player(self, name: str) -> str:
-        player_id = str(uuid.uuid4())
+class GameManager:
+    def __init__(self, rows: int = 3, cols: int = 5, max_bases: int = 5) -> None:
+        self.state = GameState(rows=rows, cols=cols, max_bases=max_bases)
+        # Called with (op, data) for every accepted action, outcome included,
+        # so `replay` can rebuild the game without re-rolling any dice.
+        self.recorder: Optional[Callable[[str, Dict], None]] = None
+
+    def add_player(self, name: str, player_id: Optional[str] = None) -> str:
+        player_id = player_id or str(uuid.uuid4())
         self.state.players[player_id] = Player(player_id=player_id, name=name)
-        self.state.bases[player_id] = set()
-        self.state.normal_candidates[player_id] = self.state.all_positions()
+        board = self.state.board
+        self.state.bases[player_id] = Board(board)
+        self.state.normal_candidates[player_id] = CandidatePool(board)
 
         if len(self.state.players) == 1:
             self.state.phase = "lobby"
@@ -26,6 +62,8 @@ class GameManager:
         else:
             self.state.last_message = "Sala cheia"
 
+        self._touch()
+        self._record("add_player", player_id=player_id, name=name)
         return player_id
 
     def add_ai_player(self, name: str = "CPU") -> str:
@@ -37,6 +75,8 @@ class GameManager:
             self.state.phase = "ended"
             self.state.winner_id = self.state.enemy_id(player_id)
             self.state.last_message = "Oponente desistiu"
+            self._touch()
+            self._record("remove_player", player_id=player_id)
 
     def disconnect_player(self, player_id: str) -> None:
         player = self.state.players.get(player_id)
@@ -44,6 +84,7 @@ class GameManager:
             return
         player.connected = False
         self.state.last_message = "Oponente desconectou"
+        self._touch()
 
     def reconnect_player(self, player_id: str) -> None:
         player = self.state.players.get(player_id)
@@ -51,6 +92,7 @@ class GameManager:
             return
         player.connected = True
         self.state.last_message = "Oponente reconectou"
+        self._touch()
 
     def set_ready(self, player_id: str, ready: bool) -> str:
         if self.state.phase != "lobby":
@@ -59,6 +101,8 @@ class GameManager:
         if not player:
             return "Jogador invalido"
         player.ready = ready
+        self._touch()
+        self._record("set_ready", player_id=player_id, ready=ready)
         if self._both_lobby_ready():
             self._start_placement()
             return "Jogadores prontos. Coloquem suas bases"
@@ -68,6 +112,8 @@ class GameManager:
         if self.state.phase != "placement":
             return "A partida nao esta em fase de colocacao"
 
+        if not self.state.board.contains(pos):
+            return "Posicao invalida"
         bases = self.state.bases[player_id]
         if pos in bases:
             return "Posicao ocupada"
@@ -75,14 +121,52 @@ class GameManager:
             return "Limite de bases atingido"
 
         bases.add(pos)
+        self._touch()
         if len(bases) == self.state.max_bases:
             self.state.players[player_id].placement_ready = True
 
         if self._both_placement_ready():
             self._start_battle()
+            self._record("place_base", player_id=player_id, pos=pos, turn=self.state.turn_player_id)
+        else:
+            self._record("place_base", player_id=player_id, pos=pos)
 
         return "Base colocada"
 
+    def place_bases(self, player_id: str, positions: List[Position]) -> str:
+        """Place several bases as one action: all of them, or none if any is invalid."""
+        if self.state.phase != "placement":
+            return "A partida nao esta em fase de colocacao"
+
+        board = self.state.board
+        bases = self.state.bases[player_id]
+        mask = 0
+        for pos in positions:
+            if not board.contains(pos):
+                return "Posicao invalida"
+            bit = board.bit(pos)
+            if (bases.mask | mask) & bit:
+                return "Posicao ocupada"
+            mask |= bit
+        if not mask:
+            return "Posicao invalida"
+        if len(bases) + mask.bit_count() > self.state.max_bases:
+            return "Limite de bases atingido"
+
+        bases.mask |= mask
+        self._touch()
+        if len(bases) == self.state.max_bases:
+            self.state.players[player_id].placement_ready = True
+
+        placed = [tuple(pos) for pos in positions]
+        if self._both_placement_ready():
+            self._start_battle()
+            self._record("place_bases", player_id=player_id, positions=placed, turn=self.state.turn_player_id)
+        else:
+            self._record("place_bases", player_id=player_id, positions=placed)
+
+        return "Bases colocadas"
+
     def buy_base(self, player_id: str, pos: Position) -> str:
         if self.state.phase != "battle":
             return "A partida precisa estar em andamento"
@@ -90,12 +174,16 @@ class GameManager:
         player = self.state.players[player_id]
         if player.saldo < 2:
             return "Saldo insuficiente"
+        if not self.state.board.contains(pos):
+            return "Posicao invalida"
         if pos in self.state.bases[player_id]:
             return "Posicao ocupada"
 
         player.saldo -= 2
         self.state.bases[player_id].add(pos)
         self._end_turn()
+        self._touch()
+        self._record("buy_base", player_id=player_id, pos=pos)
         return "Base comprada"
 
     def shot(self, player_id: str, shot_type: str) -> Tuple[str, List[Position]]:
@@ -105,27 +193,38 @@ class GameManager:
             return "Nao e seu turno", []
 
         player = self.state.players[player_id]
+        if shot_type not in SHOT_COSTS:
+            return "Tipo de tiro invalido", []
+        if player.saldo < SHOT_COSTS[shot_type]:
+            return "Saldo insuficiente", []
         if shot_type == "normal":
             impacts = self._shot_normal(player_id)
         elif shot_type == "precise":
-            if player.saldo < 1:
-                return "Saldo insuficiente", []
-            player.saldo -= 1
             impacts = self._shot_precise(player_id)
-        elif shot_type == "strong":
-            if player.saldo < 3:
-                return "Saldo insuficiente", []
-            player.saldo -= 3
-            impacts = self._shot_strong(player_id)
         else:
-            return "Tipo de tiro invalido", []
+            impacts = self._shot_strong(player_id)
 
+        self._resolve_shot(player_id, shot_type, impacts)
+        self._record("shot", player_id=player_id, shot_type=shot_type, impacts=list(impacts))
+        return "Tiro efetuado", impacts
+
+    def _resolve_shot(self, player_id: str, shot_type: str, impacts: List[Position]) -> None:
+        """Everything a shot does once its impacts are known."""
+        self.state.players[player_id].saldo -= SHOT_COSTS[shot_type]
+        if shot_type == "normal" and impacts:
+            self._update_candidates(player_id, impacts[0])
         self.state.last_shooter_id = player_id
         self._apply_impacts(player_id, impacts)
         self._check_victory(player_id)
         if self.state.phase != "ended":
             self._end_turn()
-        return "Tiro efetuado", impacts
+        self._touch()
+
+    def set_message(self, message: str, impacts: Optional[List[Position]] = None) -> None:
+        self.state.last_message = message
+        if impacts is not None:
+            self.state.last_impacts = impacts
+        self._touch()
 
     def serialize(self) -> Dict:
         players = [
@@ -152,8 +251,94 @@ class GameManager:
             "last_impacts": self.state.last_impacts,
             "message": self.state.last_message,
             "last_shooter_id": self.state.last_shooter_id,
+            "version": self.state.version,
+        }
+
+    def replay(self, op: str, data: Dict) -> None:
+        """Re-apply a recorded action with its recorded outcome."""
+        player_id = data.get("player_id", "")
+        if op == "add_player":
+            self.add_player(data["name"], player_id)
+        elif op == "remove_player":
+            self.remove_player(player_id)
+        elif op == "set_ready":
+            self.set_ready(player_id, data["ready"])
+        elif op in ("place_base", "place_bases"):
+            if op == "place_base":
+                self.place_base(player_id, tuple(data["pos"]))
+            else:
+                self.place_bases(player_id, [tuple(pos) for pos in data["positions"]])
+            if data.get("turn"):
+                # The first turn was drawn at random; use the recorded draw.
+                self.state.turn_player_id = data["turn"]
+        elif op == "buy_base":
+            self.buy_base(player_id, tuple(data["pos"]))
+        elif op == "shot":
+            impacts = [tuple(pos) for pos in data["impacts"]]
+            self._resolve_shot(player_id, data["shot_type"], impacts)
+        else:
+            raise ValueError(f"Unknown action: {op}")
+
+    def snapshot(self) -> Dict:
+        """Compact, JSON-ready copy of the full game state."""
+        state = self.state
+        board = state.board
+        return {
+            "rows": state.rows,
+            "cols": state.cols,
+            "max_bases": state.max_bases,
+            "phase": state.phase,
+            "turn_player_id": state.turn_player_id,
+            "turn_number": state.turn_number,
+            "winner_id": state.winner_id,
+            "players": [
+                [p.player_id, p.name, p.saldo, p.ready, p.placement_ready]
+                for p in state.players.values()
+            ],
+            "bases": {pid: bases.mask for pid, bases in state.bases.items()},
+            "candidates": {
+                pid: board.mask_of(pool) for pid, pool in state.normal_candidates.items()
+            },
+            "last_impacts": list(state.last_impacts),
+            "last_message": state.last_message,
+            "last_shooter_id": state.last_shooter_id,
+            "version": state.version,
         }
 
+    @classmethod
+    def restore(cls, snapshot: Dict) -> "GameManager":
+        game = cls(snapshot["rows"], snapshot["cols"], snapshot["max_bases"])
+        state = game.state
+        board = state.board
+        for player_id, name, saldo, ready, placement_ready in snapshot["players"]:
+            state.players[player_id] = Player(
+                player_id=player_id,
+                name=name,
+                saldo=saldo,
+                ready=ready,
+                placement_ready=placement_ready,
+            )
+        for player_id, mask in snapshot["bases"].items():
+            state.bases[player_id] = Board(board, mask=mask)
+        for player_id, mask in snapshot["candidates"].items():
+            state.normal_candidates[player_id] = CandidatePool(board, board.positions_of(mask))
+        state.phase = snapshot["phase"]
+        state.turn_player_id = snapshot["turn_player_id"]
+        state.turn_number = snapshot["turn_number"]
+        state.winner_id = snapshot["winner_id"]
+        state.last_impacts = [tuple(pos) for pos in snapshot["last_impacts"]]
+        state.last_message = snapshot["last_message"]
+        state.last_shooter_id = snapshot["last_shooter_id"]
+        state.version = snapshot["version"]
+        return game
+
+    def _record(self, op: str, **data) -> None:
+        if self.recorder:
+            self.recorder(op, data)
+
+    def _touch(self) -> None:
+        self.state.version += 1
+
     def _both_lobby_ready(self) -> bool:
         if len(self.state.players) < 2:
             return False
@@ -173,12 +358,14 @@ class GameManager:
     def _start_battle(self) -> None:
         self.state.phase = "battle"
         self.state.turn_player_id = random.choice(list(self.state.players.keys()))
+        self.state.turn_number += 1
         self.state.last_message = "Partida iniciada"
 
     def _end_turn(self) -> None:
         enemy_id = self.state.enemy_id(self.state.turn_player_id or "")
         if enemy_id:
             self.state.turn_player_id = enemy_id
+            self.state.turn_number += 1
 
     def _shot_normal(self, player_id: str) -> List[Position]:
         enemy_id = self.state.enemy_id(player_id)
@@ -186,57 +373,56 @@ class GameManager:
             return []
         candidates = self.state.normal_candidates[player_id]
         if not candidates:
-            candidates = self.state.all_positions()
-            self.state.normal_candidates[player_id] = candidates
+            candidates.reset()
+        return [candidates.choice()]
 
-        pos = random.choice(tuple(candidates))
+    def _update_candidates(self, player_id: str, pos: Position) -> None:
+        enemy_id = self.state.enemy_id(player_id)
+        if not enemy_id:
+            return
+        candidates = self.state.normal_candidates[player_id]
+        if not candidates:
+            candidates.reset()
         # If miss, remove this position to improve accuracy over time.
-        if pos not in self.state.bases[enemy_id]:
+        if not self.state.bases[enemy_id].mask & self.state.board.bit(pos):
             candidates.discard(pos)
         else:
             # Reset on hit to mimic recalibration.
-            self.state.normal_candidates[player_id] = self.state.all_positions()
-        return [pos]
+            candidates.reset()
 
     def _shot_precise(self, player_id: str) -> List[Position]:
         enemy_id = self.state.enemy_id(player_id)
         if not enemy_id:
             return []
-        enemy_bases = list(self.state.bases[enemy_id])
-        if enemy_bases and random.random() < 0.5:
-            return [random.choice(enemy_bases)]
+        board = self.state.board
+        enemy_mask = self.state.bases[enemy_id].mask
+        if enemy_mask and random.random() < 0.5:
+            return [random.choice(board.positions_of(enemy_mask))]
 
         # Miss: choose a random empty spot if possible
-        empty = list(self.state.all_positions() - self.state.bases[enemy_id])
-        if empty:
-            return [random.choice(empty)]
-        return [random.choice(tuple(self.state.all_positions()))]
+        empty = random_free_position(board, enemy_mask)
+        if empty is not None:
+            return [empty]
+        return [random.choice(board.positions)]
 
     def _shot_strong(self, player_id: str) -> List[Position]:
         enemy_id = self.state.enemy_id(player_id)
         if not enemy_id:
             return []
-        center = random.choice(tuple(self.state.all_positions()))
-        cr, cc = center
-        impacts = []
-        for dr in (-1, 0, 1):
-            for dc in (-1, 0, 1):
-                r, c = cr + dr, cc + dc
-                if 0 <= r < self.state.rows and 0 <= c < self.state.cols:
-                    impacts.append((r, c))
-        return impacts
+        board = self.state.board
+        center = random.randrange(board.size)
+        return board.positions_of(board.neighborhoods[center])
 
     def _apply_impacts(self, player_id: str, impacts: List[Position]) -> None:
         enemy_id = self.state.enemy_id(player_id)
         if not enemy_id:
             return
 
-        hits = 0
-        for pos in impacts:
-            if pos in self.state.bases[enemy_id]:
-                self.state.bases[enemy_id].remove(pos)
-                hits += 1
+        enemy = self.state.bases[enemy_id]
+        impact_mask = self.state.board.mask_of(impacts)
+        hits = (enemy.mask & impact_mask).bit_count()
         if hits:
+            enemy.mask &= ~impact_mask
             self.state.players[player_id].saldo += hits
 
         self.state.last_impacts = impacts
@@ -245,7 +431,7 @@ class GameManager:
         enemy_id = self.state.enemy_id(player_id)
         if not enemy_id:
             return
-        if not self.state.bases[enemy_id]:
+        if not self.state.bases[enemy_id].mask:
             self.state.phase = "ended"
             self.state.winner_id = player_id
             self.state.last_message = "Partida encerrada"
@@ -0,0 +1,140 @@
+"""Append-only action journal for restoring rooms after a restart.
+
+Every accepted game action is appended as one JSON line carrying its room
+code, the action with its outcome, and the state version it produced.
+`append` only buffers the record; a dedicated writer thread drains the
+buffer every JOURNAL_FLUSH_INTERVAL seconds with a single fsync per batch,
+so the event loop never waits on the disk. An action is acknowledged to
+players before it is durable; a crash loses at most the last flush window.
+
+Every JOURNAL_SNAPSHOT_INTERVAL seconds the file is rewritten as one
+snapshot per live room, which keeps replay on boot short. Replay skips
+records whose version a snapshot already covers.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from . import metrics
+from .config import env_float
+
+
+class Journal:
+    def __init__(
+        self,
+        path: str,
+        flush_interval: Optional[float] = None,
+        snapshot_interval: Optional[float] = None,
+    ) -> None:
+        self.path = path
+        self.flush_interval = (
+            env_float("JOURNAL_FLUSH_INTERVAL", 0.05) if flush_interval is None else flush_interval
+        )
+        self.snapshot_interval = (
+            env_float("JOURNAL_SNAPSHOT_INTERVAL", 60.0)
+            if snapshot_interval is None
+            else snapshot_interval
+        )
+        self.buffer: List[Dict] = []
+        # Records written since the last snapshot rewrite.
+        self.written = 0
+        self._file = None
+        # One thread keeps writes and rewrites in order.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="journal")
+
+    def append(self, record: Dict) -> None:
+        self.buffer.append(record)
+
+    def load(self) -> List[Dict]:
+        """Every complete record in the file, oldest first."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as handle:
+                lines = handle.read().split("\n")
+        except FileNotFoundError:
+            return []
+        records = []
+        for line in lines:
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # A torn write at the end of the file: nothing after it was acknowledged as durable.
+                break
+        return records
+
+    async def flush(self) -> None:
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+        started = time.perf_counter()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._write, batch)
+        metrics.JOURNAL_FLUSH_SECONDS.observe(time.perf_counter() - started)
+        self.written += len(batch)
+
+    async def compact(self, snapshots: Callable[[], Awaitable[List[Dict]]]) -> None:
+        """Rewrite the file as the given per-room snapshots."""
+        await self.flush()
+        records = await snapshots()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._rewrite, records)
+        self.written = 0
+
+    async def run(self, snapshots: Callable[[], Awaitable[List[Dict]]]) -> None:
+        next_snapshot = time.monotonic() + self.snapshot_interval
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if self.written and time.monotonic() >= next_snapshot:
+                await self.compact(snapshots)
+                next_snapshot = time.monotonic() + self.snapshot_interval
+
+    async def close(self) -> None:
+        await self.flush()
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+
+    def _encode(self, records: List[Dict]) -> str:
+        return "".join(
+            json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n"
+            for record in records
+        )
+
+    def _write(self, batch: List[Dict]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(self._encode(batch))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _rewrite(self, records: List[Dict]) -> None:
+        temp = self.path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as handle:
+            handle.write(self._encode(records))
+            handle.flush()
+            os.fsync(handle.fileno())
+        self._close()
+        os.replace(temp, self.path)
+        directory = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+    def _close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def create_journal(worker: int = 0, workers: int = 1) -> Optional[Journal]:
+    """Journal at JOURNAL_PATH, one file per worker; None when unset."""
+    path = os.getenv("JOURNAL_PATH", "")
+    if not path:
+        return None
+    if workers > 1:
+        path = f"{path}.{worker}"
+    return Journal(path)
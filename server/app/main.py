@@ -1,17 +1,54 @@
 from __future__ import annotations
 
 import asyncio
-import json
-from typing import Dict
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Optional, Tuple
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Header, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from .rooms import RoomManager, Room
-from .auth import verify_id_token
-from .ai import apply_ai, ai_should_act
+from .rooms import RoomManager, RoomReaper, Room
+from .outbox import Outbox
+from . import auth, codec, metrics, wire
+from .auth import session_active, verify_id_token_async
+from .ai import apply_ai_async, ai_should_act, plan_ahead
+from .coalesce import Coalescer
+from .config import env_float, env_int
+from .dispatch import ROUTES, Rejected, route
+from .game import validate_board
+from .journal import create_journal
+from .matchmaking import Matchmaker, Ticket
+from .ratelimit import Buckets, RateLimiter
+from .schema import POSITION, POSITIONS, optional
+from .scheduler import Scheduler, Timer
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    tasks = [asyncio.create_task(reaper.run())]
+    if auth.keystore is not None:
+        tasks.append(asyncio.create_task(auth.keystore.run()))
+    journal = rooms.journal
+    if journal is not None:
+        for room in rooms.restore(journal.load()):
+            schedule_timers(room)
+        # Start the new run from snapshots instead of the old log.
+        await journal.compact(rooms.snapshots)
+        tasks.append(asyncio.create_task(journal.run(rooms.snapshots)))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await scheduler.close()
+        if journal is not None:
+            await journal.close()
+
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -26,20 +63,88 @@ app.add_middleware(
 )
 
 rooms = RoomManager()
-lock = asyncio.Lock()
+rooms.journal = create_journal(rooms.worker_id, rooms.workers)
+reaper = RoomReaper(rooms)
+scheduler = Scheduler()
+AI_MOVE_DELAY = env_float("AI_MOVE_DELAY", 0.8)
+TURN_TIMEOUT = env_float("TURN_TIMEOUT", 60.0)
+limiter = RateLimiter(live=lambda code: code in rooms.rooms)
+# Frames larger than this are dropped unparsed.
+WS_MAX_MESSAGE_BYTES = env_int("WS_MAX_MESSAGE_BYTES", 8192)
+# Consecutive dropped messages after which a connection is closed.
+RATE_LIMIT_KICK = env_int("RATE_LIMIT_KICK", 200)
+matchmaker = Matchmaker()
+# Seconds between quick-match sweeps while anyone is queued.
+QUICK_MATCH_TICK = env_float("QUICK_MATCH_TICK", 1.0)
+match_timer: Optional[Timer] = None
+metrics.ACTIVE_ROOMS.callback = lambda: len(rooms.rooms)
+metrics.ACTIVE_SPECTATORS.callback = lambda: sum(len(room.spectators) for room in rooms.rooms.values())
+metrics.JOURNAL_PENDING.callback = lambda: len(rooms.journal.buffer) if rooms.journal else 0
+metrics.ACTIVE_AI_TASKS.callback = lambda: sum(1 for room in rooms.rooms.values() if room.ai_timer)
+metrics.QUICK_MATCH_WAITING.callback = lambda: len(matchmaker)
+
+
+def schedule_timers(room: Room) -> None:
+    """Arm the AI move and the turn deadline the room's state calls for."""
+    if room.ai_timer and not room.ai_timer.active:
+        room.ai_timer = None
+    if room.turn_timer and not room.turn_timer.active:
+        room.turn_timer = None
+
+    if room.ai_timer is None and ai_should_act(room):
+        room.ai_timer = scheduler.call_later(AI_MOVE_DELAY, run_ai_move, room.code)
 
+    state = room.game.state
+    turn_key = (state.turn_player_id, state.turn_number)
+    # No deadline while the turn player is away: auto-shots would keep an
+    # abandoned room's state changing, and the reaper would never free it.
+    turn_player = state.players.get(state.turn_player_id)
+    human_turn = (
+        state.phase == "battle"
+        and state.turn_player_id != room.ai_player_id
+        and turn_player is not None
+        and turn_player.connected
+    )
+    if room.turn_timer and (not human_turn or room.turn_timer.args[1] != turn_key):
+        room.turn_timer.cancel()
+        room.turn_timer = None
+    if human_turn and TURN_TIMEOUT > 0 and room.turn_timer is None:
+        room.turn_timer = scheduler.call_later(TURN_TIMEOUT, expire_turn, room.code, turn_key)
 
-async def schedule_ai(room_code: str, delay: float = 0.8) -> None:
-    await asyncio.sleep(delay)
-    async with lock:
-        room = rooms.get_room(room_code)
-        if not room or not ai_should_act(room):
-            if room:
-                room.ai_scheduled = False
+    # Think during the move delay, or during the human's turn, so the AI's
+    # move is usually decided before its timer fires.
+    plan_ahead(room)
+
+
+async def run_ai_move(room_code: str) -> None:
+    async with rooms.locked(room_code) as room:
+        if not room:
+            return
+        room.ai_timer = None
+        if ai_should_act(room):
+            await apply_ai_async(room)
+            await broadcast_room(room)
+        schedule_timers(room)
+
+
+async def expire_turn(room_code: str, turn_key: Tuple[Optional[str], int]) -> None:
+    async with rooms.locked(room_code) as room:
+        if not room:
             return
-        apply_ai(room)
-        room.ai_scheduled = False
-        await broadcast_room(room)
+        state = room.game.state
+        player = state.players.get(turn_key[0])
+        if (
+            state.phase == "battle"
+            and (state.turn_player_id, state.turn_number) == turn_key
+            and player is not None
+            and player.connected
+        ):
+            # The player let the clock run out: fire a normal shot for them.
+            room.turn_timer = None
+            _, impacts = room.game.shot(turn_key[0], "normal")
+            room.game.set_message("Tempo esgotado", impacts)
+            await broadcast_room(room)
+        schedule_timers(room)
 
 
 @app.get("/health")
@@ -52,182 +157,453 @@ async def auth_verify(authorization: str = Header(None)) -> Dict[str, str]:
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing token")
     token = authorization.replace("Bearer ", "").strip()
-    decoded = verify_id_token(token)
+    decoded = await verify_id_token_async(token)
     return {"uid": decoded.get("uid", "")}
 
 
-async def broadcast_room(room: Room) -> None:
-    state = room.game.serialize()
-    payload = {"type": "room_state", "data": state, "room_code": room.code}
-    for ws in list(room.connections.values()):
-        await ws.send_json(payload)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint(authorization: str = Header(None)) -> PlainTextResponse:
+    token = os.getenv("METRICS_TOKEN", "")
+    if token and authorization != f"Bearer {token}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(
+        metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+async def broadcast_room(room: Room, flush: bool = False) -> None:
+    """Send the room's state now or, if it just broadcast, at the next tick."""
+    coalescer.submit(room, flush)
+
+
+def send_room(room: Room) -> None:
+    started = time.perf_counter()
+    frame = room.state_frame()
+    version = room.game.state.version
+    patch, base_version = None, None
+    outboxes = list(room.connections.values())
+    if any(outbox.delta for outbox in outboxes):
+        patch, base_version = room.state_patch()
+    for outbox in outboxes:
+        if outbox.binary:
+            outbox.send_state(room.binary_frame(), version)
+        else:
+            outbox.send_state(frame, version, patch, base_version)
+    spectators = room.spectators
+    if spectators.viewers:
+        binary = room.binary_frame(spectator=True) if spectators.binary else None
+        spectators.publish(room.spectator_frame(), version, binary)
+    metrics.BROADCAST_FRAME_BYTES.observe(room.frame_bytes)
+    metrics.BROADCAST_SECONDS.observe(time.perf_counter() - started)
+
+
+coalescer = Coalescer(send_room)
+
+
+def board_options(message: Dict) -> Dict[str, int]:
+    return {
+        "rows": message.get("rows", 3),
+        "cols": message.get("cols", 5),
+        "max_bases": message.get("max_bases", 5),
+    }
+
+
+async def create_locked_room(options: Dict[str, int]) -> Room:
+    async with rooms.lock:
+        return rooms.create_room(**options)
+
+
+async def remove_room(room_code: str) -> None:
+    async with rooms.lock:
+        rooms.remove_room(room_code)
+
+
+def state_frame_for(room: Room, outbox: Outbox, spectator: bool = False):
+    """Current room_state frame in the encoding `outbox` speaks."""
+    if outbox.binary:
+        return room.binary_frame(spectator)
+    return room.spectator_frame() if spectator else room.state_frame()
+
+
+def send_joined(outbox: Outbox, room: Room, player_id: str) -> None:
+    payload = {"type": "joined", "player_id": player_id, "room_code": room.code}
+    if outbox.binary:
+        # Binary room_state frames name players by this index.
+        payload["player_index"] = room.player_indexes()[player_id]
+    outbox.send(payload)
+
+
+def redirect_to_owner(outbox: Outbox, code: str) -> bool:
+    """Point the client at the worker that owns `code`, if it is not us."""
+    url = rooms.redirect_url(code)
+    if url is None:
+        return False
+    outbox.send({"type": "redirect", "room_code": code, "url": url})
+    return True
+
+
+async def drop_connection(outbox: Outbox) -> None:
+    room_code, player_id = outbox.room_code, outbox.player_id
+    if not room_code or not player_id:
+        return
+    async with rooms.locked(room_code) as room:
+        # A reconnect may already have replaced this connection.
+        if room and room.connections.get(player_id) is outbox:
+            room.game.disconnect_player(player_id)
+            room.connections.pop(player_id, None)
+            await broadcast_room(room)
+            schedule_timers(room)
+
+
+async def evict_connection(outbox: Outbox) -> None:
+    await drop_connection(outbox)
+    try:
+        await asyncio.wait_for(outbox.ws.close(code=1013), outbox.timeout)
+    except Exception:
+        pass
+
+
+@dataclass
+class Connection:
+    """What one WebSocket has joined or watches; handlers read and update it."""
+
+    outbox: Outbox
+    player_id: Optional[str] = None
+    room_code: Optional[str] = None
+    # Room this connection is watching as a spectator, if any.
+    watching: Optional[Room] = None
+    # Verified token bound to this connection; in-game actions reuse it.
+    session: Optional[Dict] = None
+    ip: Optional[str] = None
+    buckets: Buckets = field(default_factory=dict)
+    # Messages dropped in a row by the rate limits.
+    drops: int = 0
+
+    @property
+    def uid(self) -> Optional[str]:
+        return self.session.get("uid") if self.session else None
+
+    def enter(self, room: Room, player_id: str) -> None:
+        # Sitting down anywhere ends a quick-match search.
+        matchmaker.cancel(self.outbox)
+        self.player_id = player_id
+        self.room_code = room.code
+        room.connections[player_id] = self.outbox
+        self.outbox.bind(room.code, player_id)
+        send_joined(self.outbox, room, player_id)
+
+    def stop_watching(self) -> None:
+        if self.watching:
+            self.watching.spectators.discard(self.outbox)
+            self.watching = None
+
+
+TOKEN = {"idToken": optional(str)}
+ENTRY = {**TOKEN, "name": optional(str), "delta": optional(bool)}
+BOARD = {"rows": optional(int), "cols": optional(int), "max_bases": optional(int)}
+ROOM_CODE = {"room_code": optional(str)}
+
+
+@route("create_room", {**ENTRY, **BOARD}, auth="verify", room="new", after="ai", entry=True)
+async def create_room(conn: Connection, message: Dict, room: Room) -> None:
+    conn.enter(room, room.game.add_player(message.get("name", "Jogador")))
+
+
+@route(
+    "create_ai_room",
+    {**ENTRY, **BOARD, "difficulty": optional(str)},
+    auth="verify",
+    room="new",
+    after="ai",
+    entry=True,
+)
+async def create_ai_room(conn: Connection, message: Dict, room: Room) -> None:
+    seat_against_ai(conn, room, message.get("name", "Jogador"), message.get("difficulty", "normal"))
+
+
+def seat_against_ai(conn: Connection, room: Room, name: str, difficulty: str) -> None:
+    room.ai_difficulty = difficulty
+    player_id = room.game.add_player(name)
+    room.ai_player_id = room.game.add_ai_player("CPU")
+    rooms.record(room, "ai", player_id=room.ai_player_id, difficulty=difficulty)
+    room.game.set_ready(player_id, True)
+    room.game.set_ready(room.ai_player_id, True)
+    conn.enter(room, player_id)
+
+
+@route("join_room", {**ENTRY, **ROOM_CODE}, auth="verify", room="code", after="ai", entry=True)
+async def join_room(conn: Connection, message: Dict, room: Room) -> None:
+    if room.is_full():
+        raise Rejected("Sala cheia")
+    conn.enter(room, room.game.add_player(message.get("name", "Jogador")))
+
+
+@route(
+    "reconnect",
+    {**ENTRY, **ROOM_CODE, "player_id": optional(str)},
+    auth="verify",
+    room="code",
+    missing="Reconexao invalida",
+    after="ai",
+    entry=True,
+)
+async def reconnect(conn: Connection, message: Dict, room: Room) -> None:
+    player_id = message.get("player_id")
+    if player_id not in room.game.state.players:
+        raise Rejected("Reconexao invalida")
+    conn.enter(room, player_id)
+    room.game.reconnect_player(player_id)
+
+
+# Spectators never take the room lock; they only read frames.
+@route("spectate", {**TOKEN, **ROOM_CODE}, auth="verify", room="code", lock=False)
+async def spectate(conn: Connection, message: Dict, room: Room) -> None:
+    conn.stop_watching()
+    conn.watching = room
+    conn.outbox.send({"type": "spectating", "room_code": room.code})
+    frame = state_frame_for(room, conn.outbox, spectator=True)
+    room.spectators.add(conn.outbox, frame, room.game.state.version)
+
+
+# Queued players are in no room; matching and the AI fallback run from
+# run_matchmaking, which seats them once an opponent or the timeout comes.
+@route("quick_match", {**ENTRY, "rating": optional(int)}, auth="verify", entry=True)
+async def quick_match(conn: Connection, message: Dict, room: None) -> None:
+    conn.stop_watching()
+    name = message.get("name", "Jogador")
+    pair = matchmaker.enqueue(conn.outbox, message.get("rating"), (conn, name))
+    if pair is None:
+        conn.outbox.send({"type": "queued"})
+        arm_matchmaking()
+        return
+    await start_match(pair)
+
+
+def arm_matchmaking() -> None:
+    global match_timer
+    if matchmaker and (match_timer is None or not match_timer.active):
+        match_timer = scheduler.call_later(QUICK_MATCH_TICK, run_matchmaking)
+
+
+async def run_matchmaking() -> None:
+    pairs, expired = matchmaker.sweep()
+    for pair in pairs:
+        await start_match(pair)
+    for ticket in expired:
+        await start_ai_match(ticket)
+    arm_matchmaking()
+
+
+async def start_match(pair: Tuple[Ticket, Ticket]) -> None:
+    """Seat both matched players in a new room, straight into placement.
+
+    If either connection closed meanwhile, the room is dropped and the
+    other player goes back to the queue.
+    """
+    code = (await create_locked_room(board_options({}))).code
+    now = time.monotonic()
+    async with rooms.locked(code) as room:
+        live = [ticket for ticket in pair if not ticket.data[0].outbox.closed]
+        if room and len(live) == len(pair):
+            game = room.game
+            for ticket in pair:
+                conn, name = ticket.data
+                conn.enter(room, game.add_player(name))
+                metrics.QUICK_MATCH_WAIT_SECONDS.observe(now - ticket.since)
+            for player_id in list(game.state.players):
+                game.set_ready(player_id, True)
+            schedule_timers(room)
+            await broadcast_room(room, flush=True)
+            return
+    await remove_room(code)
+    for ticket in live:
+        pair = matchmaker.requeue(ticket)
+        if pair is not None:
+            await start_match(pair)
+    arm_matchmaking()
+
+
+async def start_ai_match(ticket: Ticket) -> None:
+    """Nobody fit in time: play the waiting player against the AI."""
+    conn, name = ticket.data
+    room = await create_locked_room(board_options({}))
+    metrics.QUICK_MATCH_AI_FALLBACKS.inc()
+    async with rooms.locked(room.code) as room:
+        seat_against_ai(conn, room, name, "normal")
+        room.game.set_message("Nenhum oponente encontrado. Jogando contra a CPU")
+        await apply_ai_async(room)
+        schedule_timers(room)
+        await broadcast_room(room, flush=True)
+
+
+@route("leave_room")
+async def leave_room(conn: Connection, message: Dict, room: None) -> None:
+    conn.stop_watching()
+    matchmaker.cancel(conn.outbox)
+    if not conn.room_code or not conn.player_id:
+        return
+    empty = False
+    async with rooms.locked(conn.room_code) as room:
+        if room:
+            room.game.remove_player(conn.player_id)
+            room.connections.pop(conn.player_id, None)
+            schedule_timers(room)
+            await broadcast_room(room)
+            empty = room.is_empty()
+    if empty:
+        await remove_room(conn.room_code)
+    conn.room_code = None
+    conn.player_id = None
+    conn.outbox.bind(None, None)
+
+
+@route("sync", room="current")
+async def sync(conn: Connection, message: Dict, room: Room) -> None:
+    # Client detected a version gap: resend the full snapshot.
+    conn.outbox.send_state(state_frame_for(room, conn.outbox), room.game.state.version)
+
+
+@route("ready", {**TOKEN, "ready": optional(bool)}, auth="session", room="current", after="broadcast")
+async def ready(conn: Connection, message: Dict, room: Room) -> None:
+    game = room.game
+    game.set_message(game.set_ready(conn.player_id, message.get("ready", False)))
+
+
+@route("place_base", {**TOKEN, "pos": POSITION}, auth="session", room="current", after="broadcast")
+async def place_base(conn: Connection, message: Dict, room: Room) -> None:
+    game = room.game
+    game.set_message(game.place_base(conn.player_id, tuple(message["pos"])))
+
+
+@route("place_bases", {**TOKEN, "positions": POSITIONS}, auth="session", room="current", after="broadcast")
+async def place_bases(conn: Connection, message: Dict, room: Room) -> None:
+    game = room.game
+    game.set_message(game.place_bases(conn.player_id, [tuple(pos) for pos in message["positions"]]))
+
+
+@route("buy_base", {**TOKEN, "pos": POSITION}, auth="session", room="current", after="broadcast")
+async def buy_base(conn: Connection, message: Dict, room: Room) -> None:
+    game = room.game
+    game.set_message(game.buy_base(conn.player_id, tuple(message["pos"])))
+
+
+@route("shot", {**TOKEN, "shot_type": str}, auth="session", room="current", after="broadcast")
+async def shot(conn: Connection, message: Dict, room: Room) -> None:
+    game = room.game
+    game.set_message(*game.shot(conn.player_id, message["shot_type"]))
+
+
+async def dispatch(conn: Connection, message: Dict) -> None:
+    """Run `message` through its route's middleware and handler."""
+    outbox = conn.outbox
+    spec = ROUTES.get(message.get("type"))
+    if spec is None or spec.validate(message) is not None:
+        outbox.send({"type": "error", "message": "Mensagem invalida"})
+        return
+    if spec.entry:
+        outbox.delta = bool(message.get("delta", False))
+
+    code = None
+    if spec.room == "current":
+        if not conn.room_code or not conn.player_id:
+            outbox.send({"type": "error", "message": "Nao esta em sala"})
+            return
+        code = conn.room_code
+    elif spec.room == "code":
+        code = (message.get("room_code") or "").upper()
+        if redirect_to_owner(outbox, code):
+            return
+
+    if spec.auth == "verify" or (spec.auth == "session" and not session_active(conn.session)):
+        conn.session = await verify_id_token_async(message.get("idToken"))
+
+    try:
+        if spec.room is None:
+            await spec.handler(conn, message, None)
+            return
+        if spec.room == "new":
+            options = board_options(message)
+            error = validate_board(**options)
+            if error:
+                raise Rejected(error)
+            if not limiter.may_create(conn.uid):
+                raise Rejected("Limite de salas atingido")
+            code = (await create_locked_room(options)).code
+            limiter.created(conn.uid, code)
+        if not spec.lock:
+            room = rooms.get_room(code)
+            if not room:
+                raise Rejected(spec.missing)
+            await spec.handler(conn, message, room)
+            return
+        async with rooms.locked(code) as room:
+            if not room:
+                raise Rejected(spec.missing)
+            await spec.handler(conn, message, room)
+            if spec.after == "ai":
+                await apply_ai_async(room)
+                schedule_timers(room)
+                # The client is waiting for its first state after `joined`.
+                await broadcast_room(room, flush=True)
+            elif spec.after == "broadcast":
+                await broadcast_room(room)
+                schedule_timers(room)
+    except Rejected as exc:
+        outbox.send({"type": "error", "message": exc.message})
+
+
+def throttled(conn: Connection, raw, msg_type: Optional[str]) -> bool:
+    """Whether to drop a message; runs before validation, auth or locks."""
+    if len(raw) <= WS_MAX_MESSAGE_BYTES and limiter.allow(conn.buckets, conn.ip, conn.uid, msg_type):
+        conn.drops = 0
+        return False
+    metrics.WS_RATE_LIMITED.inc()
+    conn.drops += 1
+    if conn.drops == 1:
+        # One notice per burst; replying to every dropped message would let
+        # the flood through on the way out.
+        conn.outbox.send({"type": "error", "message": "Muitas mensagens"})
+    return True
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket) -> None:
-    await ws.accept()
-    player_id = None
-    room_code = None
+    binary = wire.SUBPROTOCOL in ws.scope.get("subprotocols", [])
+    await ws.accept(subprotocol=wire.SUBPROTOCOL if binary else None)
+    outbox = Outbox(ws, on_evict=evict_connection)
+    outbox.binary = binary
+    outbox.start()
+    metrics.ACTIVE_CONNECTIONS.inc()
+    conn = Connection(outbox, ip=ws.client.host if ws.client else None)
     try:
         while True:
-            raw = await ws.receive_text()
-            message = json.loads(raw)
-            msg_type = message.get("type")
-
-            async with lock:
-                if msg_type == "create_room":
-                    token = message.get("idToken")
-                    verify_id_token(token)
-                    name = message.get("name", "Jogador")
-                    room = rooms.create_room()
-                    player_id = room.game.add_player(name)
-                    room.connections[player_id] = ws
-                    room_code = room.code
-                    await ws.send_json(
-                        {"type": "joined", "player_id": player_id, "room_code": room_code}
-                    )
-                    apply_ai(room)
-                    await broadcast_room(room)
-                elif msg_type == "create_ai_room":
-                    token = message.get("idToken")
-                    verify_id_token(token)
-                    name = message.get("name", "Jogador")
-                    difficulty = message.get("difficulty", "normal")
-                    room = rooms.create_room()
-                    room.ai_difficulty = difficulty
-                    player_id = room.game.add_player(name)
-                    room.ai_player_id = room.game.add_ai_player("CPU")
-                    room.connections[player_id] = ws
-                    room_code = room.code
-                    room.game.set_ready(player_id, True)
-                    room.game.set_ready(room.ai_player_id, True)
-                    apply_ai(room)
-                    await ws.send_json(
-                        {"type": "joined", "player_id": player_id, "room_code": room_code}
-                    )
-                    await broadcast_room(room)
-                elif msg_type == "join_room":
-                    token = message.get("idToken")
-                    verify_id_token(token)
-                    name = message.get("name", "Jogador")
-                    code = (message.get("room_code") or "").upper()
-                    room = rooms.get_room(code)
-                    if not room:
-                        await ws.send_json({"type": "error", "message": "Sala inexistente"})
-                        continue
-                    if room.is_full():
-                        await ws.send_json({"type": "error", "message": "Sala cheia"})
-                        continue
-                    player_id = room.game.add_player(name)
-                    room.connections[player_id] = ws
-                    room_code = room.code
-                    await ws.send_json(
-                        {"type": "joined", "player_id": player_id, "room_code": room_code}
-                    )
-                    apply_ai(room)
-                    await broadcast_room(room)
-                elif msg_type == "reconnect":
-                    token = message.get("idToken")
-                    verify_id_token(token)
-                    code = (message.get("room_code") or "").upper()
-                    reconnect_id = message.get("player_id")
-                    room = rooms.get_room(code)
-                    if not room or reconnect_id not in room.game.state.players:
-                        await ws.send_json({"type": "error", "message": "Reconexao invalida"})
-                        continue
-                    player_id = reconnect_id
-                    room_code = room.code
-                    room.connections[player_id] = ws
-                    room.game.reconnect_player(player_id)
-                    await ws.send_json(
-                        {"type": "joined", "player_id": player_id, "room_code": room_code}
-                    )
-                    apply_ai(room)
-                    await broadcast_room(room)
-                elif msg_type == "leave_room":
-                    if room_code and player_id:
-                        room = rooms.get_room(room_code)
-                        if room:
-                            room.game.remove_player(player_id)
-                            room.connections.pop(player_id, None)
-                            await broadcast_room(room)
-                            if room.is_empty():
-                                rooms.remove_room(room_code)
-                            room_code = None
-                            player_id = None
-                elif msg_type == "ready":
-                    if not room_code or not player_id:
-                        await ws.send_json({"type": "error", "message": "Nao esta em sala"})
-                        continue
-                    token = message.get("idToken")
-                    verify_id_token(token)
-                    room = rooms.get_room(room_code)
-                    if not room:
-                        await ws.send_json({"type": "error", "message": "Sala inexistente"})
-                        continue
-                    ready = bool(message.get("ready", False))
-                    room.game.state.last_message = room.game.set_ready(player_id, ready)
-                    await broadcast_room(room)
-                    if ai_should_act(room) and not room.ai_scheduled:
-                        room.ai_scheduled = True
-                        room.ai_task = asyncio.create_task(schedule_ai(room.code))
-                elif msg_type == "place_base":
-                    if not room_code or not player_id:
-                        await ws.send_json({"type": "error", "message": "Nao esta em sala"})
-                        continue
-                    token = message.get("idToken")
-                    verify_id_token(token)
-                    room = rooms.get_room(room_code)
-                    if not room:
-                        await ws.send_json({"type": "error", "message": "Sala inexistente"})
-                        continue
-                    pos = tuple(message.get("pos", []))
-                    room.game.state.last_message = room.game.place_base(player_id, pos)
-                    await broadcast_room(room)
-                    if ai_should_act(room) and not room.ai_scheduled:
-                        room.ai_scheduled = True
-                        room.ai_task = asyncio.create_task(schedule_ai(room.code))
-                elif msg_type == "buy_base":
-                    if not room_code or not player_id:
-                        await ws.send_json({"type": "error", "message": "Nao esta em sala"})
-                        continue
-                    token = message.get("idToken")
-                    verify_id_token(token)
-                    room = rooms.get_room(room_code)
-                    if not room:
-                        await ws.send_json({"type": "error", "message": "Sala inexistente"})
-                        continue
-                    pos = tuple(message.get("pos", []))
-                    room.game.state.last_message = room.game.buy_base(player_id, pos)
-                    await broadcast_room(room)
-                    if ai_should_act(room) and not room.ai_scheduled:
-                        room.ai_scheduled = True
-                        room.ai_task = asyncio.create_task(schedule_ai(room.code))
-                elif msg_type == "shot":
-                    if not room_code or not player_id:
-                        await ws.send_json({"type": "error", "message": "Nao esta em sala"})
-                        continue
-                    token = message.get("idToken")
-                    verify_id_token(token)
-                    room = rooms.get_room(room_code)
-                    if not room:
-                        await ws.send_json({"type": "error", "message": "Sala inexistente"})
-                        continue
-                    shot_type = message.get("shot_type")
-                    msg, impacts = room.game.shot(player_id, shot_type)
-                    room.game.state.last_message = msg
-                    room.game.state.last_impacts = impacts
-                    await broadcast_room(room)
-                    if ai_should_act(room) and not room.ai_scheduled:
-                        room.ai_scheduled = True
-                        room.ai_task = asyncio.create_task(schedule_ai(room.code))
-                else:
-                    await ws.send_json({"type": "error", "message": "Mensagem invalida"})
+            raw = await (ws.receive_bytes() if binary else ws.receive_text())
+            started = time.perf_counter()
+            message = None
+            if len(raw) <= WS_MAX_MESSAGE_BYTES:
+                try:
+                    message = wire.decode(raw) if binary else codec.loads(raw)
+                except ValueError:
+                    pass
+            msg_type = message.get("type") if isinstance(message, dict) else None
+            if throttled(conn, raw, msg_type):
+                if conn.drops >= RATE_LIMIT_KICK:
+                    await ws.close(code=1008)
+                    break
+                continue
+            if not isinstance(message, dict):
+                outbox.send({"type": "error", "message": "Mensagem invalida"})
+                metrics.WS_MESSAGE_SECONDS.labels(None).observe(time.perf_counter() - started)
+                continue
+            try:
+                await dispatch(conn, message)
+            finally:
+                metrics.WS_MESSAGE_SECONDS.labels(msg_type).observe(time.perf_counter() - started)
     except WebSocketDisconnect:
-        if player_id and room_code:
-            async with lock:
-                room = rooms.get_room(room_code)
-                if room:
-                    room.game.disconnect_player(player_id)
-                    room.connections.pop(player_id, None)
-                    await broadcast_room(room)
+        pass
+    finally:
+        metrics.ACTIVE_CONNECTIONS.dec()
+        conn.stop_watching()
+        matchmaker.cancel(outbox)
+        await drop_connection(outbox)
+        await outbox.close()
@@ -0,0 +1,190 @@
+"""Quick-match queue.
+
+Waiting players are indexed twice: by rating bucket (rating //
+QUICK_MATCH_BUCKET), each bucket a FIFO of tickets with the non-empty
+buckets kept sorted for bisecting, and by wait time, one insertion-ordered
+dict over every ticket. Finding the closest opponent is a bisect plus a
+look at the oldest ticket of at most three buckets; timeouts pop from the
+front of the wait-time index.
+
+Two tickets match when their buckets are no further apart than either one
+accepts. A new ticket accepts its own bucket only, and every
+QUICK_MATCH_WIDEN seconds of waiting lets it reach one bucket further each
+way. `sweep` retries waiting tickets, oldest (widest) first, and returns
+those that waited QUICK_MATCH_TIMEOUT seconds so the caller can seat them
+against the AI instead.
+
+The queue is per worker, and ratings are whatever the client reports,
+clamped to MIN_RATING..MAX_RATING.
+"""
+from __future__ import annotations
+
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from .config import env_float, env_int
+
+QUICK_MATCH_BUCKET = env_int("QUICK_MATCH_BUCKET", 100)
+QUICK_MATCH_WIDEN = env_float("QUICK_MATCH_WIDEN", 5.0)
+QUICK_MATCH_TIMEOUT = env_float("QUICK_MATCH_TIMEOUT", 30.0)
+DEFAULT_RATING = 1000
+MIN_RATING = 0
+MAX_RATING = 4000
+
+
+class Ticket:
+    __slots__ = ("key", "rating", "bucket", "since", "data")
+
+    def __init__(self, key: Hashable, rating: int, bucket: int, since: float, data: Any) -> None:
+        self.key = key
+        self.rating = rating
+        self.bucket = bucket
+        self.since = since
+        # Whatever the caller needs to seat the player once matched.
+        self.data = data
+
+
+Pair = Tuple[Ticket, Ticket]
+
+
+class Matchmaker:
+    def __init__(
+        self,
+        bucket_width: Optional[int] = None,
+        widen: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self.bucket_width = max(1, QUICK_MATCH_BUCKET if bucket_width is None else bucket_width)
+        self.widen = QUICK_MATCH_WIDEN if widen is None else widen
+        self.timeout = QUICK_MATCH_TIMEOUT if timeout is None else timeout
+        self.buckets: Dict[int, Dict[Hashable, Ticket]] = {}
+        # Sorted ids of the non-empty buckets.
+        self.keys: List[int] = []
+        # Every waiting ticket, oldest first.
+        self.waiting: Dict[Hashable, Ticket] = {}
+
+    def __len__(self) -> int:
+        return len(self.waiting)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.waiting
+
+    def reach(self, ticket: Ticket, now: float) -> float:
+        """How many buckets away `ticket` accepts an opponent at `now`."""
+        if self.widen <= 0:
+            return float("inf")
+        return (now - ticket.since) // self.widen
+
+    def enqueue(
+        self,
+        key: Hashable,
+        rating: Optional[int],
+        data: Any = None,
+        now: Optional[float] = None,
+    ) -> Optional[Pair]:
+        """Queue `key`, or return (opponent, ticket) if someone already fits.
+
+        Queueing a key again replaces its ticket and restarts its wait.
+        """
+        now = time.monotonic() if now is None else now
+        self.cancel(key)
+        rating = DEFAULT_RATING if rating is None else min(max(rating, MIN_RATING), MAX_RATING)
+        ticket = Ticket(key, rating, rating // self.bucket_width, now, data)
+        opponent = self._nearest(ticket, now)
+        if opponent is not None:
+            self._remove(opponent)
+            return opponent, ticket
+        self._add(ticket)
+        return None
+
+    def requeue(self, ticket: Ticket, now: Optional[float] = None) -> Optional[Pair]:
+        """Put a matched ticket back, keeping its wait, after its opponent left."""
+        if ticket.key in self.waiting:
+            # The player already queued again.
+            return None
+        now = time.monotonic() if now is None else now
+        opponent = self._nearest(ticket, now)
+        if opponent is not None:
+            self._remove(opponent)
+            return opponent, ticket
+        self._add(ticket)
+        # Rare, so restoring wait-time order by sorting is cheap enough.
+        self.waiting = dict(sorted(self.waiting.items(), key=lambda item: item[1].since))
+        return None
+
+    def cancel(self, key: Hashable) -> Optional[Ticket]:
+        ticket = self.waiting.get(key)
+        if ticket is not None:
+            self._remove(ticket)
+        return ticket
+
+    def sweep(self, now: Optional[float] = None) -> Tuple[List[Pair], List[Ticket]]:
+        """Pair tickets whose ranges have widened; drop and return timed-out ones."""
+        now = time.monotonic() if now is None else now
+        expired: List[Ticket] = []
+        if self.timeout > 0:
+            while self.waiting:
+                ticket = next(iter(self.waiting.values()))
+                if now - ticket.since < self.timeout:
+                    break
+                self._remove(ticket)
+                expired.append(ticket)
+        pairs: List[Pair] = []
+        for ticket in list(self.waiting.values()):
+            if self.reach(ticket, now) < 1:
+                # Younger tickets reach no further, and they were already
+                # checked against everyone when they were queued.
+                break
+            if self.waiting.get(ticket.key) is not ticket:
+                continue
+            opponent = self._nearest(ticket, now)
+            if opponent is not None:
+                self._remove(ticket)
+                self._remove(opponent)
+                pairs.append((ticket, opponent))
+        return pairs, expired
+
+    def _nearest(self, ticket: Ticket, now: float) -> Optional[Ticket]:
+        """Closest acceptable waiting opponent, oldest first on ties."""
+        keys = self.keys
+        index = bisect_left(keys, ticket.bucket)
+        above = index
+        if index < len(keys) and keys[index] == ticket.bucket:
+            opponent = self._oldest(ticket.bucket, ticket)
+            if opponent is not None:
+                return opponent
+            above += 1
+        candidates = []
+        if index > 0:
+            candidates.append(self._oldest(keys[index - 1], ticket))
+        if above < len(keys):
+            candidates.append(self._oldest(keys[above], ticket))
+        candidates.sort(key=lambda other: (abs(other.bucket - ticket.bucket), other.since))
+        reach = self.reach(ticket, now)
+        for other in candidates:
+            if abs(other.bucket - ticket.bucket) <= max(reach, self.reach(other, now)):
+                return other
+        return None
+
+    def _oldest(self, bucket: int, exclude: Ticket) -> Optional[Ticket]:
+        for other in self.buckets[bucket].values():
+            if other is not exclude:
+                return other
+        return None
+
+    def _add(self, ticket: Ticket) -> None:
+        queue = self.buckets.get(ticket.bucket)
+        if queue is None:
+            queue = self.buckets[ticket.bucket] = {}
+            insort(self.keys, ticket.bucket)
+        queue[ticket.key] = ticket
+        self.waiting[ticket.key] = ticket
+
+    def _remove(self, ticket: Ticket) -> None:
+        del self.waiting[ticket.key]
+        queue = self.buckets[ticket.bucket]
+        del queue[ticket.key]
+        if not queue:
+            del self.buckets[ticket.bucket]
+            del self.keys[bisect_left(self.keys, ticket.bucket)]
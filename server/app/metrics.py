@@ -0,0 +1,241 @@
+"""In-process metrics rendered in the Prometheus text format.
+
+Histograms keep preallocated bucket counters and label sets are fixed up
+front, so recording a sample is a bisect plus a few integer adds.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+WAIT_BUCKETS = (0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+SIZE_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 65536, 262144)
+MESSAGE_TYPES = (
+    "create_room",
+    "create_ai_room",
+    "quick_match",
+    "join_room",
+    "reconnect",
+    "leave_room",
+    "spectate",
+    "sync",
+    "ready",
+    "place_base",
+    "place_bases",
+    "buy_base",
+    "shot",
+)
+OTHER = "other"
+
+
+def _format(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Counter that is either incremented or read from a callback at scrape time."""
+
+    __slots__ = ("name", "help", "value", "callback")
+
+    def __init__(self, name: str, help: str, callback: Optional[Callable[[], float]] = None) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.callback = callback
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def render(self) -> List[str]:
+        value = self.callback() if self.callback else self.value
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {value}",
+        ]
+
+
+class Gauge:
+    """Gauge that is either set directly or read from a callback at scrape time."""
+
+    __slots__ = ("name", "help", "value", "callback")
+
+    def __init__(self, name: str, help: str, callback: Optional[Callable[[], float]] = None) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0
+        self.callback = callback
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: int = 1) -> None:
+        self.value -= amount
+
+    def render(self) -> List[str]:
+        value = self.callback() if self.callback else self.value
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {value}",
+        ]
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str = "") -> List[str]:
+        prefix = labels + "," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{_format(bound)}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+
+class HistogramFamily:
+    """Histogram with an optional label whose values are fixed up front.
+
+    Unknown label values are folded into "other" so clients cannot grow the
+    series count.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        label: Optional[str] = None,
+        values: Iterable[str] = (),
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.label = label
+        self.children: Dict[str, Histogram] = {}
+        if label:
+            for value in tuple(values) + (OTHER,):
+                self.children[value] = Histogram(buckets)
+        else:
+            self.children[""] = Histogram(buckets)
+
+    def labels(self, value: Optional[str]) -> Histogram:
+        child = self.children.get(value) if isinstance(value, str) else None
+        return child if child is not None else self.children[OTHER]
+
+    def observe(self, value: float) -> None:
+        self.children[""].observe(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, child in self.children.items():
+            labels = f'{self.label}="{value}"' if self.label else ""
+            lines.extend(child.render(self.name, labels))
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: List[object] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())  # type: ignore[attr-defined]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+WS_MESSAGE_SECONDS = registry.register(
+    HistogramFamily(
+        "cannon_ws_message_seconds",
+        "Time to handle one WebSocket message, by message type.",
+        label="type",
+        values=MESSAGE_TYPES,
+    )
+)
+ROOM_LOCK_WAIT_SECONDS = registry.register(
+    HistogramFamily("cannon_room_lock_wait_seconds", "Time spent waiting for a room lock.")
+)
+ROOM_LOCK_HOLD_SECONDS = registry.register(
+    HistogramFamily("cannon_room_lock_hold_seconds", "Time a room lock was held.")
+)
+BROADCAST_SECONDS = registry.register(
+    HistogramFamily("cannon_broadcast_seconds", "Time spent in broadcast_room.")
+)
+BROADCAST_FRAME_BYTES = registry.register(
+    HistogramFamily(
+        "cannon_broadcast_frame_bytes", "Size of broadcast room_state frames.", buckets=SIZE_BUCKETS
+    )
+)
+AUTH_VERIFY_SECONDS = registry.register(
+    HistogramFamily("cannon_auth_verify_seconds", "Uncached ID-token verification time.")
+)
+AUTH_CACHE_HITS = registry.register(
+    Counter("cannon_auth_cache_hits_total", "Verified-token cache hits.")
+)
+AUTH_CACHE_MISSES = registry.register(
+    Counter("cannon_auth_cache_misses_total", "Verified-token cache misses.")
+)
+ACTIVE_ROOMS = registry.register(Gauge("cannon_active_rooms", "Rooms currently in memory."))
+ACTIVE_CONNECTIONS = registry.register(
+    Gauge("cannon_active_connections", "Open WebSocket connections.")
+)
+ACTIVE_SPECTATORS = registry.register(
+    Gauge("cannon_active_spectators", "Connections watching a room as spectators.")
+)
+ACTIVE_AI_TASKS = registry.register(Gauge("cannon_active_ai_tasks", "Pending AI move tasks."))
+AI_PLAN_HITS = registry.register(
+    Counter("cannon_ai_plan_hits_total", "Hard AI moves served by a decision planned ahead.")
+)
+AI_PLAN_MISSES = registry.register(
+    Counter("cannon_ai_plan_misses_total", "Hard AI moves that had to be planned on demand.")
+)
+AI_FALLBACKS = registry.register(
+    Counter("cannon_ai_fallbacks_total", "Hard AI decisions that missed the deadline.")
+)
+JOURNAL_FLUSH_SECONDS = registry.register(
+    HistogramFamily("cannon_journal_flush_seconds", "Time to write and fsync one journal batch.")
+)
+JOURNAL_PENDING = registry.register(
+    Gauge("cannon_journal_pending_records", "Journal records waiting for the next flush.")
+)
+WS_RATE_LIMITED = registry.register(
+    Counter("cannon_ws_rate_limited_total", "WebSocket messages dropped by rate limits or size.")
+)
+BROADCASTS_COALESCED = registry.register(
+    Counter("cannon_broadcasts_coalesced_total", "Room broadcasts merged into a pending tick.")
+)
+QUICK_MATCH_WAITING = registry.register(
+    Gauge("cannon_quick_match_waiting", "Players waiting in the quick-match queue.")
+)
+QUICK_MATCH_WAIT_SECONDS = registry.register(
+    HistogramFamily(
+        "cannon_quick_match_wait_seconds", "Queue time of quick-matched players.", WAIT_BUCKETS
+    )
+)
+QUICK_MATCH_AI_FALLBACKS = registry.register(
+    Counter("cannon_quick_match_ai_fallbacks_total", "Quick-match players seated against the AI.")
+)
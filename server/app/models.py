@@ -1,12 +1,199 @@
 from __future__ import annotations
 
+import random
+from collections.abc import MutableSet
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Set, Tuple
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 
 Position = Tuple[int, int]
 
 
+class BoardGeometry:
+    """Precomputed bit layout for a rows x cols board.
+
+    Cell (r, c) is bit r * cols + c. Per-cell bits and the 3x3 neighbourhood
+    masks used by strong shots are built once per board size.
+    """
+
+    def __init__(self, rows: int, cols: int) -> None:
+        self.rows = rows
+        self.cols = cols
+        self.size = rows * cols
+        self.full = (1 << self.size) - 1
+        self.positions: Tuple[Position, ...] = tuple(
+            (r, c) for r in range(rows) for c in range(cols)
+        )
+        self.neighborhoods: Tuple[int, ...] = tuple(
+            self._neighborhood(r, c) for r, c in self.positions
+        )
+
+    def _neighborhood(self, cr: int, cc: int) -> int:
+        mask = 0
+        for r in range(max(cr - 1, 0), min(cr + 2, self.rows)):
+            for c in range(max(cc - 1, 0), min(cc + 2, self.cols)):
+                mask |= 1 << (r * self.cols + c)
+        return mask
+
+    def contains(self, pos: Position) -> bool:
+        try:
+            r, c = pos
+        except (TypeError, ValueError):
+            return False
+        return (
+            isinstance(r, int)
+            and isinstance(c, int)
+            and 0 <= r < self.rows
+            and 0 <= c < self.cols
+        )
+
+    def index(self, pos: Position) -> int:
+        if not self.contains(pos):
+            raise ValueError(f"Position off board: {pos!r}")
+        return pos[0] * self.cols + pos[1]
+
+    def bit(self, pos: Position) -> int:
+        return 1 << self.index(pos)
+
+    def mask_of(self, positions: Iterable[Position]) -> int:
+        mask = 0
+        for pos in positions:
+            mask |= self.bit(pos)
+        return mask
+
+    def positions_of(self, mask: int) -> List[Position]:
+        positions = []
+        while mask:
+            low = mask & -mask
+            positions.append(self.positions[low.bit_length() - 1])
+            mask ^= low
+        return positions
+
+
+@lru_cache(maxsize=None)
+def geometry(rows: int, cols: int) -> BoardGeometry:
+    return BoardGeometry(rows, cols)
+
+
+class Board(MutableSet):
+    """Set of positions stored as an integer bitmask."""
+
+    __slots__ = ("geometry", "mask")
+
+    def __init__(self, geometry: BoardGeometry, positions: Iterable[Position] = (), mask: int = 0) -> None:
+        self.geometry = geometry
+        self.mask = mask | geometry.mask_of(positions)
+
+    def _from_iterable(self, iterable: Iterable[Position]) -> "Board":
+        return Board(self.geometry, iterable)
+
+    def __contains__(self, pos: object) -> bool:
+        if not self.geometry.contains(pos):  # type: ignore[arg-type]
+            return False
+        return bool(self.mask & self.geometry.bit(pos))  # type: ignore[arg-type]
+
+    def __iter__(self) -> Iterator[Position]:
+        return iter(self.geometry.positions_of(self.mask))
+
+    def __len__(self) -> int:
+        return self.mask.bit_count()
+
+    def add(self, pos: Position) -> None:
+        self.mask |= self.geometry.bit(pos)
+
+    def discard(self, pos: Position) -> None:
+        if self.geometry.contains(pos):
+            self.mask &= ~self.geometry.bit(pos)
+
+    def __repr__(self) -> str:
+        return f"Board({set(self)!r})"
+
+
+class CandidatePool(MutableSet):
+    """Position set with O(1) random pick, discard and reset.
+
+    `items` is a permutation of every cell index and the first `size`
+    entries are the live ones; `where` maps a cell index to its slot.
+    Discarding swaps the cell past the live region, so reset only has to
+    restore `size`.
+    """
+
+    __slots__ = ("geometry", "items", "where", "size")
+
+    def __init__(self, geometry: BoardGeometry, positions: Optional[Iterable[Position]] = None) -> None:
+        self.geometry = geometry
+        self.items = list(range(geometry.size))
+        self.where = list(range(geometry.size))
+        self.size = geometry.size
+        if positions is not None:
+            self.size = 0
+            for pos in positions:
+                self.add(pos)
+
+    def _from_iterable(self, iterable: Iterable[Position]) -> "CandidatePool":
+        return CandidatePool(self.geometry, iterable)
+
+    def _swap(self, i: int, j: int) -> None:
+        items, where = self.items, self.where
+        items[i], items[j] = items[j], items[i]
+        where[items[i]] = i
+        where[items[j]] = j
+
+    def __contains__(self, pos: object) -> bool:
+        if not self.geometry.contains(pos):  # type: ignore[arg-type]
+            return False
+        return self.where[self.geometry.index(pos)] < self.size  # type: ignore[arg-type]
+
+    def __iter__(self) -> Iterator[Position]:
+        positions = self.geometry.positions
+        return (positions[idx] for idx in self.items[: self.size])
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, pos: Position) -> None:
+        slot = self.where[self.geometry.index(pos)]
+        if slot >= self.size:
+            self._swap(slot, self.size)
+            self.size += 1
+
+    def discard(self, pos: Position) -> None:
+        if not self.geometry.contains(pos):
+            return
+        slot = self.where[self.geometry.index(pos)]
+        if slot < self.size:
+            self.size -= 1
+            self._swap(slot, self.size)
+
+    def choice(self, rng=random) -> Position:
+        if not self.size:
+            raise IndexError("Cannot choose from an empty pool")
+        return self.geometry.positions[self.items[rng.randrange(self.size)]]
+
+    def reset(self) -> None:
+        self.size = self.geometry.size
+
+    def __repr__(self) -> str:
+        return f"CandidatePool({set(self)!r})"
+
+
+class BoardMap(dict):
+    """player_id -> position set; plain sets assigned to it are converted."""
+
+    def __init__(self, geometry: BoardGeometry, items: Optional[Dict] = None, kind: type = Board) -> None:
+        super().__init__()
+        self.geometry = geometry
+        self.kind = kind
+        for key, value in (items or {}).items():
+            self[key] = value
+
+    def __setitem__(self, key: str, value: Iterable[Position]) -> None:
+        if not isinstance(value, self.kind):
+            value = self.kind(self.geometry, value)
+        super().__setitem__(key, value)
+
+
 @dataclass
 class Player:
     player_id: str
@@ -24,16 +211,26 @@ class GameState:
     max_bases: int = 5
     phase: str = "lobby"  # lobby | placement | battle | ended
     turn_player_id: Optional[str] = None
+    # Incremented whenever a turn starts; tells turn deadlines apart.
+    turn_number: int = 0
     winner_id: Optional[str] = None
     players: Dict[str, Player] = field(default_factory=dict)
-    bases: Dict[str, Set[Position]] = field(default_factory=dict)
-    normal_candidates: Dict[str, Set[Position]] = field(default_factory=dict)
+    bases: Dict[str, Board] = field(default_factory=dict)
+    normal_candidates: Dict[str, CandidatePool] = field(default_factory=dict)
     last_impacts: List[Position] = field(default_factory=list)
     last_message: str = ""
     last_shooter_id: Optional[str] = None
+    # Bumped by GameManager on every mutation; keys cached room_state frames.
+    version: int = 0
+    board: BoardGeometry = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.board = geometry(self.rows, self.cols)
+        self.bases = BoardMap(self.board, self.bases)
+        self.normal_candidates = BoardMap(self.board, self.normal_candidates, kind=CandidatePool)
 
     def all_positions(self) -> Set[Position]:
-        return {(r, c) for r in range(self.rows) for c in range(self.cols)}
+        return set(self.board.positions)
 
     def enemy_id(self, player_id: str) -> Optional[str]:
         for pid in self.players:
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, Union
+
+from .codec import dumps
+from .config import env_float
+from .wire import encode_message
+
+SEND_TIMEOUT = env_float("WS_SEND_TIMEOUT", 5.0)
+
+
+class Outbox:
+    """Outbound mailbox for one WebSocket, drained by its own writer task.
+
+    Regular messages are delivered in order. Room state is latest-wins: a
+    new snapshot replaces one the client has not received yet, so a slow
+    client only ever gets the newest state and never blocks the sender.
+    State frames arrive pre-encoded so every recipient shares one string.
+    Connections that opted into the delta protocol get a room_patch instead
+    of the full snapshot whenever they already hold its base version.
+    Connections on the binary subprotocol get binary state frames, and their
+    regular messages are encoded with the binary opcodes.
+    """
+
+    def __init__(
+        self,
+        ws,
+        on_evict: Optional[Callable[["Outbox"], Awaitable[None]]] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self.ws = ws
+        self.on_evict = on_evict
+        self.timeout = SEND_TIMEOUT if timeout is None else timeout
+        self.room_code: Optional[str] = None
+        self.player_id: Optional[str] = None
+        self.closed = False
+        self.delta = False
+        self.binary = False
+        # Version of the last state frame handed to the socket.
+        self.version: Optional[int] = None
+        self._messages: Deque[Dict] = deque()
+        self._state: Optional[Tuple[Union[str, bytes], Optional[int]]] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def bind(self, room_code: Optional[str], player_id: Optional[str]) -> None:
+        self.room_code = room_code
+        self.player_id = player_id
+
+    def send(self, payload: Dict) -> None:
+        if self.closed:
+            return
+        self._messages.append(payload)
+        self._wakeup.set()
+
+    def send_state(
+        self,
+        frame: Union[str, bytes],
+        version: Optional[int] = None,
+        patch: Optional[str] = None,
+        base_version: Optional[int] = None,
+    ) -> None:
+        if self.closed:
+            return
+        # A pending frame means the client is still at self.version, so a
+        # patch is only safe when nothing is queued ahead of it.
+        if (
+            self.delta
+            and patch is not None
+            and self._state is None
+            and self.version is not None
+            and self.version == base_version
+        ):
+            frame = patch
+        self._state = (frame, version)
+        self._wakeup.set()
+
+    def pending(self) -> int:
+        return len(self._messages) + (1 if self._state is not None else 0)
+
+    async def close(self) -> None:
+        self.closed = True
+        if self._task and self._task is not asyncio.current_task():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def _next(self) -> Optional[Union[Dict, str, bytes]]:
+        if self._messages:
+            return self._messages.popleft()
+        if self._state is None:
+            return None
+        (frame, self.version), self._state = self._state, None
+        return frame
+
+    async def _run(self) -> None:
+        while not self.closed:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            payload = self._next()
+            while payload is not None:
+                if isinstance(payload, str):
+                    send = self.ws.send_text(payload)
+                elif isinstance(payload, bytes):
+                    send = self.ws.send_bytes(payload)
+                elif self.binary:
+                    send = self.ws.send_bytes(encode_message(payload))
+                else:
+                    send = self.ws.send_text(dumps(payload))
+                try:
+                    await asyncio.wait_for(send, self.timeout)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    await self._evict()
+                    return
+                payload = self._next()
+
+    async def _evict(self) -> None:
+        self.closed = True
+        self._messages.clear()
+        self._state = None
+        if self.on_evict:
+            await self.on_evict(self)
@@ -0,0 +1,168 @@
+"""Token-bucket flood protection for the WebSocket endpoint.
+
+Every message type falls in a budget class with its own rate and burst.
+A message is let through only if the sender's connection, its IP and,
+once a token was verified, its uid each still have a token left for that
+class. Uid and IP buckets are the connection budget scaled up, since one
+uid may have a few tabs open and one IP may be a NAT shared by many
+players. Checks run as soon as a frame is decoded, before validation,
+token checks or room locks, so a flooding client costs a few dict lookups
+and some float math per message.
+
+Separately, each uid may only own MAX_ROOMS_PER_UID live rooms at a time.
+"""
+from __future__ import annotations
+
+import os
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from .config import env_float, env_int
+
+CLASSES = {
+    "create_room": "create",
+    "create_ai_room": "create",
+    "quick_match": "create",
+    "join_room": "join",
+    "reconnect": "join",
+    "spectate": "join",
+    "ready": "action",
+    "place_base": "action",
+    "place_bases": "action",
+    "buy_base": "action",
+    "shot": "action",
+}
+# Everything else (sync, leave_room, unknown or unparsable messages).
+OTHER = "other"
+# (messages per second, burst) per connection for each class.
+DEFAULT_BUDGETS = {
+    "create": (0.2, 3),
+    "join": (1.0, 5),
+    "action": (10.0, 20),
+    OTHER: (5.0, 10),
+}
+# Seconds between sweeps of idle uid and IP buckets.
+SWEEP_INTERVAL = 60.0
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float, now: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def take(self, now: float) -> bool:
+        tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if tokens < 1.0:
+            self.tokens = tokens
+            return False
+        self.tokens = tokens - 1.0
+        return True
+
+    def full(self, now: float) -> bool:
+        return self.tokens + (now - self.stamp) * self.rate >= self.burst
+
+
+Buckets = Dict[str, TokenBucket]
+
+
+def _budgets_from_env() -> Dict[str, Tuple[float, float]]:
+    return {
+        kind: (
+            env_float(f"RATE_LIMIT_{kind.upper()}", rate),
+            env_float(f"RATE_LIMIT_{kind.upper()}_BURST", float(burst)),
+        )
+        for kind, (rate, burst) in DEFAULT_BUDGETS.items()
+    }
+
+
+class RateLimiter:
+    """Per-connection, per-uid and per-IP budgets plus the per-uid room cap.
+
+    Connection buckets live on the connection itself (`local`), so they go
+    away with it; uid and IP buckets are swept once they have refilled.
+    """
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, Tuple[float, float]]] = None,
+        uid_scale: Optional[float] = None,
+        ip_scale: Optional[float] = None,
+        max_rooms: Optional[int] = None,
+        enabled: Optional[bool] = None,
+        live: Callable[[str], bool] = lambda code: True,
+    ) -> None:
+        self.budgets = _budgets_from_env() if budgets is None else budgets
+        self.uid_scale = env_float("RATE_LIMIT_UID_SCALE", 3.0) if uid_scale is None else uid_scale
+        self.ip_scale = env_float("RATE_LIMIT_IP_SCALE", 20.0) if ip_scale is None else ip_scale
+        self.max_rooms = env_int("MAX_ROOMS_PER_UID", 5) if max_rooms is None else max_rooms
+        if enabled is None:
+            enabled = os.getenv("RATE_LIMITS", "1").lower() not in {"0", "false", "no"}
+        self.enabled = enabled
+        # Whether a room code still names a live room.
+        self.live = live
+        self.by_uid: Dict[Tuple[str, str], TokenBucket] = {}
+        self.by_ip: Dict[Tuple[str, str], TokenBucket] = {}
+        self.rooms: Dict[str, Set[str]] = {}
+        self._next_sweep = time.monotonic() + SWEEP_INTERVAL
+
+    def _take(self, table: Dict, key, kind: str, scale: float, now: float) -> bool:
+        bucket = table.get(key)
+        if bucket is None:
+            rate, burst = self.budgets[kind]
+            bucket = table[key] = TokenBucket(rate * scale, burst * scale, now)
+        return bucket.take(now)
+
+    def allow(
+        self,
+        local: Buckets,
+        ip: Optional[str],
+        uid: Optional[str],
+        msg_type: Optional[str],
+        now: Optional[float] = None,
+    ) -> bool:
+        """Spend one token of `msg_type`'s class from every bucket that applies."""
+        if not self.enabled:
+            return True
+        now = time.monotonic() if now is None else now
+        if now >= self._next_sweep:
+            self.sweep(now)
+        kind = CLASSES.get(msg_type, OTHER) if isinstance(msg_type, str) else OTHER
+        if not self._take(local, kind, kind, 1.0, now):
+            return False
+        if ip and not self._take(self.by_ip, (ip, kind), kind, self.ip_scale, now):
+            return False
+        if uid and not self._take(self.by_uid, (uid, kind), kind, self.uid_scale, now):
+            return False
+        return True
+
+    def sweep(self, now: float) -> None:
+        """Drop refilled uid and IP buckets and rooms that are gone."""
+        for table in (self.by_uid, self.by_ip):
+            for key in [key for key, bucket in table.items() if bucket.full(now)]:
+                del table[key]
+        for uid in list(self.rooms):
+            self._owned(uid)
+        self._next_sweep = now + SWEEP_INTERVAL
+
+    def _owned(self, uid: str) -> Set[str]:
+        owned = {code for code in self.rooms.get(uid, ()) if self.live(code)}
+        if owned:
+            self.rooms[uid] = owned
+        else:
+            self.rooms.pop(uid, None)
+        return owned
+
+    def may_create(self, uid: Optional[str]) -> bool:
+        """Whether `uid` owns fewer live rooms than the cap."""
+        if not self.enabled or not uid or self.max_rooms <= 0:
+            return True
+        return len(self._owned(uid)) < self.max_rooms
+
+    def created(self, uid: Optional[str], code: str) -> None:
+        if self.enabled and uid:
+            self.rooms.setdefault(uid, set()).add(code)
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
+import os
 import random
 import string
+import time
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
-from typing import Dict, Optional
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
 import asyncio
 
+from . import metrics
+from .codec import dumps
+from .config import env_float, env_int
+from .delta import diff_state
+from .fanout import Fanout
 from .game import GameManager
+from .journal import Journal
+from .scheduler import Timer
+from .store import RoomStore, create_store, owner_of
+from .wire import encode_state
 
 
 def _generate_code(length: int = 5) -> str:
@@ -23,8 +35,104 @@ class Room:
     max_players: int = 2
     ai_player_id: Optional[str] = None
     ai_difficulty: str = "normal"
-    ai_scheduled: bool = False
-    ai_task: Optional[asyncio.Task] = None
+    ai_model: Optional[object] = field(default=None, repr=False)
+    ai_plan: Optional[Tuple[object, asyncio.Future]] = field(default=None, repr=False)
+    ai_timer: Optional[Timer] = None
+    turn_timer: Optional[Timer] = None
+    idle_since: float = field(default_factory=time.monotonic, repr=False)
+    _seen_version: int = field(default=-1, repr=False)
+    _frame: Optional[str] = field(default=None, repr=False)
+    _frame_version: int = field(default=-1, repr=False)
+    frame_bytes: int = field(default=0, repr=False)
+    _snapshot: Optional[Dict] = field(default=None, repr=False)
+    _prev_snapshot: Optional[Dict] = field(default=None, repr=False)
+    _patch: Optional[str] = field(default=None, repr=False)
+    _patch_version: int = field(default=-1, repr=False)
+    spectators: Fanout = field(default_factory=Fanout, repr=False)
+    _spectator_frame: Optional[str] = field(default=None, repr=False)
+    _spectator_version: int = field(default=-1, repr=False)
+    # Loop time of the last broadcast, and the phase and turn it carried.
+    broadcast_at: float = field(default=float("-inf"), repr=False)
+    _sent_turn: Optional[Tuple] = field(default=None, repr=False)
+    # Binary room_state frames keyed by spectator flag, with their version.
+    _binary_frames: Dict[bool, Tuple[int, bytes]] = field(default_factory=dict, repr=False)
+
+    def state_frame(self) -> str:
+        """Encoded room_state frame, built once per state version."""
+        version = self.game.state.version
+        if self._frame is None or self._frame_version != version:
+            data = self.game.serialize()
+            payload = {"type": "room_state", "data": data, "room_code": self.code}
+            self._frame = dumps(payload)
+            self.frame_bytes = len(self._frame.encode("utf-8"))
+            self._frame_version = version
+            self._prev_snapshot, self._snapshot = self._snapshot, data
+        return self._frame
+
+    def state_patch(self) -> Tuple[Optional[str], Optional[int]]:
+        """Encoded room_patch from the previous frame to the current one.
+
+        Returns the frame and the version it applies on top of, or
+        (None, None) when there is no earlier frame to diff against.
+        """
+        self.state_frame()
+        if self._prev_snapshot is None:
+            return None, None
+        base_version = self._prev_snapshot["version"]
+        if self._patch is None or self._patch_version != self._frame_version:
+            payload = {
+                "type": "room_patch",
+                "room_code": self.code,
+                "base_version": base_version,
+                "version": self._frame_version,
+                "changes": diff_state(self._prev_snapshot, self._snapshot),
+            }
+            self._patch = dumps(payload)
+            self._patch_version = self._frame_version
+        return self._patch, base_version
+
+    def spectator_frame(self) -> str:
+        """Read-only room_state for spectators, built once per state version.
+
+        Base positions stay hidden while the match is on; spectators see how
+        many bases each player has left.
+        """
+        self.state_frame()
+        version = self._frame_version
+        if self._spectator_frame is None or self._spectator_version != version:
+            data = dict(self._snapshot)
+            if data["phase"] != "ended":
+                data["base_counts"] = {pid: len(bases) for pid, bases in data["bases"].items()}
+                data["bases"] = {}
+            payload = {"type": "room_state", "data": data, "room_code": self.code, "spectator": True}
+            self._spectator_frame = dumps(payload)
+            self._spectator_version = version
+        return self._spectator_frame
+
+    def player_indexes(self) -> Dict[str, int]:
+        """Compact player numbers for the binary protocol, in join order."""
+        return {player_id: index for index, player_id in enumerate(self.game.state.players)}
+
+    def binary_frame(self, spectator: bool = False) -> bytes:
+        """Binary room_state frame, built once per state version."""
+        version = self.game.state.version
+        cached = self._binary_frames.get(spectator)
+        if cached is None or cached[0] != version:
+            frame = encode_state(self.code, self.game, self.player_indexes(), spectator)
+            cached = self._binary_frames[spectator] = (version, frame)
+        return cached[1]
+
+    def turn_changed(self) -> bool:
+        """Whether the phase or turn moved since the last broadcast."""
+        state = self.game.state
+        return (state.phase, state.turn_player_id, state.turn_number) != self._sent_turn
+
+    def mark_sent(self) -> None:
+        state = self.game.state
+        self._sent_turn = (state.phase, state.turn_player_id, state.turn_number)
+
+    def __post_init__(self) -> None:
+        self._seen_version = self.game.state.version
 
     def is_full(self) -> bool:
         return len(self.game.state.players) >= self.max_players
@@ -33,24 +141,245 @@ class Room:
         return len(self.connections) == 0
 
     def all_disconnected(self) -> bool:
-        return all(not p.connected for p in self.game.state.players.values())
+        # The AI never disconnects, so only human players count.
+        return all(
+            not p.connected
+            for pid, p in self.game.state.players.items()
+            if pid != self.ai_player_id
+        )
+
+    def idle_for(self, now: float) -> float:
+        """Seconds since the game state last changed, as seen by `now`."""
+        version = self.game.state.version
+        if version != self._seen_version:
+            self._seen_version = version
+            self.idle_since = now
+        return now - self.idle_since
+
+    def cancel_timers(self) -> None:
+        for timer in (self.ai_timer, self.turn_timer):
+            if timer:
+                timer.cancel()
+        self.ai_timer = None
+        self.turn_timer = None
+        if self.ai_plan:
+            self.ai_plan[1].cancel()
+            self.ai_plan = None
 
 
 class RoomManager:
-    def __init__(self) -> None:
-        self.rooms: Dict[str, Room] = {}
+    """This worker's rooms, kept in a RoomStore.
+
+    With several workers (WORKER_COUNT), each one only creates codes that hash
+    to its own WORKER_ID, and `redirect_url` points joins for other codes at
+    the owner's entry in WORKER_URLS.
+    """
+
+    def __init__(
+        self,
+        store: Optional[RoomStore] = None,
+        worker_id: Optional[int] = None,
+        workers: Optional[int] = None,
+        urls: Optional[List[str]] = None,
+        journal: Optional[Journal] = None,
+    ) -> None:
+        self.worker_id = env_int("WORKER_ID", 0) if worker_id is None else worker_id
+        self.workers = env_int("WORKER_COUNT", 1) if workers is None else workers
+        if urls is None:
+            urls = [url.strip() for url in os.getenv("WORKER_URLS", "").split(",") if url.strip()]
+        self.urls = urls
+        self.store = create_store(self.worker_id) if store is None else store
+        self.rooms: Dict[str, Room] = self.store.rooms  # type: ignore[assignment]
+        self.locks: Dict[str, asyncio.Lock] = {}
+        # Directory lock: only guards creating/removing rooms, never game actions.
+        self.lock = asyncio.Lock()
+        self.journal = journal
+
+    def owns(self, code: str) -> bool:
+        return owner_of(code, self.workers) == self.worker_id
+
+    def redirect_url(self, code: str) -> Optional[str]:
+        """URL of the worker that owns `code`, if that is not this worker."""
+        if self.owns(code):
+            return None
+        owner = owner_of(code, self.workers)
+        if owner >= len(self.urls):
+            return None
+        # A shared directory can tell a dead code apart without the extra hop.
+        if self.store.shared and not self.store.exists(code):
+            return None
+        return self.urls[owner]
 
-    def create_room(self) -> Room:
+    def create_room(self, rows: int = 3, cols: int = 5, max_bases: int = 5) -> Room:
         while True:
             code = _generate_code()
-            if code not in self.rooms:
+            if self.owns(code) and self.store.claim(code, self.worker_id):
                 break
-        room = Room(code=code)
+        room = Room(code=code, game=GameManager(rows=rows, cols=cols, max_bases=max_bases))
         self.rooms[code] = room
+        self.locks[code] = asyncio.Lock()
+        self._watch(room)
+        self.record(room, "room", rows=rows, cols=cols, max_bases=max_bases)
         return room
 
     def get_room(self, code: str) -> Optional[Room]:
         return self.rooms.get(code)
 
+    def get_lock(self, code: str) -> Optional[asyncio.Lock]:
+        return self.locks.get(code)
+
     def remove_room(self, code: str) -> None:
-        self.rooms.pop(code, None)
+        room = self.rooms.pop(code, None)
+        self.locks.pop(code, None)
+        if room:
+            self.store.release(code)
+            room.cancel_timers()
+            room.spectators.close()
+            self.record(room, "remove")
+
+    def record(self, room: Room, op: str, **data) -> None:
+        """Append an action on `room` to the journal, if there is one."""
+        if self.journal:
+            self.journal.append(
+                {"room": room.code, "op": op, "v": room.game.state.version, **data}
+            )
+
+    def _watch(self, room: Room) -> None:
+        room.game.recorder = lambda op, data: self.record(room, op, **data)
+
+    async def snapshots(self) -> List[Dict]:
+        """One journal snapshot record per live room."""
+        records = []
+        for index, room in enumerate(list(self.rooms.values())):
+            if index and index % 500 == 0:
+                # Let other rooms run; replay skips anything a snapshot covers.
+                await asyncio.sleep(0)
+            if self.rooms.get(room.code) is not room:
+                continue
+            records.append(
+                {
+                    "room": room.code,
+                    "op": "snapshot",
+                    "v": room.game.state.version,
+                    "game": room.game.snapshot(),
+                    "ai_player_id": room.ai_player_id,
+                    "ai_difficulty": room.ai_difficulty,
+                }
+            )
+        return records
+
+    def restore(self, records: Iterable[Dict]) -> List[Room]:
+        """Rebuild rooms from journal records.
+
+        Human players come back disconnected until they reconnect with their
+        old player_id.
+        """
+        restored: Dict[str, Room] = {}
+        for record in records:
+            code, op = record["room"], record["op"]
+            if op == "snapshot":
+                restored[code] = Room(
+                    code=code,
+                    game=GameManager.restore(record["game"]),
+                    ai_player_id=record["ai_player_id"],
+                    ai_difficulty=record["ai_difficulty"],
+                )
+            elif op == "room":
+                game = GameManager(record["rows"], record["cols"], record["max_bases"])
+                restored[code] = Room(code=code, game=game)
+            elif op == "remove":
+                restored.pop(code, None)
+            elif code in restored:
+                room = restored[code]
+                if op == "ai":
+                    room.ai_player_id = record["player_id"]
+                    room.ai_difficulty = record["difficulty"]
+                elif record["v"] > room.game.state.version:
+                    room.game.replay(op, record)
+                    room.game.state.version = record["v"]
+        for code, room in restored.items():
+            for player_id, player in room.game.state.players.items():
+                if player_id != room.ai_player_id:
+                    player.connected = False
+            room._seen_version = room.game.state.version
+            self.store.claim(code, self.worker_id)
+            self.rooms[code] = room
+            self.locks[code] = asyncio.Lock()
+            self._watch(room)
+        return list(restored.values())
+
+    @asynccontextmanager
+    async def locked(self, code: str) -> AsyncIterator[Optional[Room]]:
+        """Hold the room's own lock; yields None if the room is gone."""
+        lock = self.locks.get(code)
+        if lock is None:
+            yield None
+            return
+        started = time.perf_counter()
+        async with lock:
+            acquired = time.perf_counter()
+            metrics.ROOM_LOCK_WAIT_SECONDS.observe(acquired - started)
+            try:
+                # The room may have been removed while we waited for the lock.
+                if self.locks.get(code) is not lock:
+                    yield None
+                else:
+                    yield self.rooms.get(code)
+            finally:
+                metrics.ROOM_LOCK_HOLD_SECONDS.observe(time.perf_counter() - acquired)
+
+
+class RoomReaper:
+    """Background sweeper that frees idle, ended and abandoned rooms.
+
+    Idleness is measured from the last state change. Each state has its own
+    TTL: `ended` for finished games, `abandoned` once every human player is
+    disconnected, and `lobby` for rooms still waiting to start.
+    """
+
+    def __init__(
+        self,
+        manager: RoomManager,
+        lobby_ttl: Optional[float] = None,
+        abandoned_ttl: Optional[float] = None,
+        ended_ttl: Optional[float] = None,
+        interval: Optional[float] = None,
+    ) -> None:
+        self.manager = manager
+        self.lobby_ttl = env_float("ROOM_LOBBY_TTL", 1800.0) if lobby_ttl is None else lobby_ttl
+        self.abandoned_ttl = (
+            env_float("ROOM_ABANDONED_TTL", 120.0) if abandoned_ttl is None else abandoned_ttl
+        )
+        self.ended_ttl = env_float("ROOM_ENDED_TTL", 300.0) if ended_ttl is None else ended_ttl
+        self.interval = env_float("ROOM_REAPER_INTERVAL", 30.0) if interval is None else interval
+
+    def expired(self, room: Room, now: float) -> bool:
+        idle = room.idle_for(now)
+        phase = room.game.state.phase
+        if phase == "ended" and idle >= self.ended_ttl:
+            return True
+        if room.all_disconnected() and idle >= self.abandoned_ttl:
+            return True
+        return phase == "lobby" and idle >= self.lobby_ttl
+
+    async def sweep(self, now: Optional[float] = None) -> List[str]:
+        now = time.monotonic() if now is None else now
+        candidates = [
+            code for code, room in list(self.manager.rooms.items()) if self.expired(room, now)
+        ]
+        reaped = []
+        for code in candidates:
+            async with self.manager.locked(code) as room:
+                # Re-check under the room lock: an action may have just landed.
+                if not room or not self.expired(room, now):
+                    continue
+                room.cancel_timers()
+            async with self.manager.lock:
+                self.manager.remove_room(code)
+            reaped.append(code)
+        return reaped
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.sweep()
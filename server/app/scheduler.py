@@ -0,0 +1,146 @@
+"""Single-task timer scheduler backed by an indexed binary heap.
+
+Every pending delay (AI move, turn deadline) is one heap entry instead of a
+sleeping task. Entries know their heap slot, so cancelling is O(log n).
+Callbacks are coroutine functions; each due entry runs as its own task so a
+slow room never holds up the timers of other rooms.
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+from typing import Any, Awaitable, Callable, List, Optional, Set
+
+
+class Timer:
+    __slots__ = ("scheduler", "when", "seq", "callback", "args", "index")
+
+    def __init__(
+        self,
+        scheduler: "Scheduler",
+        when: float,
+        seq: int,
+        callback: Callable[..., Awaitable[Any]],
+        args: tuple,
+    ) -> None:
+        self.scheduler = scheduler
+        self.when = when
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        # Slot in the heap, or -1 once fired or cancelled.
+        self.index = -1
+
+    @property
+    def active(self) -> bool:
+        return self.index >= 0
+
+    def cancel(self) -> None:
+        self.scheduler.cancel(self)
+
+    def _key(self) -> tuple:
+        return (self.when, self.seq)
+
+
+class Scheduler:
+    def __init__(self) -> None:
+        self._heap: List[Timer] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def call_later(self, delay: float, callback: Callable[..., Awaitable[Any]], *args: Any) -> Timer:
+        loop = asyncio.get_running_loop()
+        timer = Timer(self, loop.time() + max(delay, 0.0), next(self._seq), callback, args)
+        self._push(timer)
+        self._ensure_running(loop)
+        if timer.index == 0 and self._wakeup is not None:
+            self._wakeup.set()
+        return timer
+
+    def cancel(self, timer: Optional[Timer]) -> None:
+        if timer is None or timer.index < 0:
+            return
+        self._remove(timer.index)
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        wakeup = self._wakeup
+        while True:
+            now = loop.time()
+            while self._heap and self._heap[0].when <= now:
+                timer = self._heap[0]
+                self._remove(0)
+                task = asyncio.create_task(timer.callback(*timer.args))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            wakeup.clear()
+            timeout = self._heap[0].when - now if self._heap else None
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _ensure_running(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self._wakeup = asyncio.Event()
+        self._task = loop.create_task(self.run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    # Indexed heap helpers.
+    def _push(self, timer: Timer) -> None:
+        timer.index = len(self._heap)
+        self._heap.append(timer)
+        self._sift_up(timer.index)
+
+    def _remove(self, index: int) -> None:
+        heap = self._heap
+        timer = heap[index]
+        last = heap.pop()
+        if last is not timer:
+            heap[index] = last
+            last.index = index
+            self._sift_down(index)
+            self._sift_up(last.index)
+        timer.index = -1
+
+    def _swap(self, i: int, j: int) -> None:
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        heap[i].index = i
+        heap[j].index = j
+
+    def _sift_up(self, index: int) -> None:
+        heap = self._heap
+        while index > 0:
+            parent = (index - 1) // 2
+            if heap[index]._key() >= heap[parent]._key():
+                break
+            self._swap(index, parent)
+            index = parent
+
+    def _sift_down(self, index: int) -> None:
+        heap = self._heap
+        size = len(heap)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and heap[child]._key() < heap[smallest]._key():
+                    smallest = child
+            if smallest == index:
+                return
+            self._swap(index, smallest)
+            index = smallest
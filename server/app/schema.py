@@ -0,0 +1,72 @@
+"""Lightweight validation for incoming WebSocket messages.
+
+A schema maps field names to a spec: a type (or tuple of types) the value
+must be an instance of, POSITION for a [row, col] pair of ints, POSITIONS
+for a non-empty list of such pairs, or `optional(spec)` for fields that may be missing or null. A null
+optional field is removed from the message, so handlers reading it with
+`message.get(name, default)` get their default. Schemas are
+compiled once, at handler registration, into a list of checks, so
+validating a message costs one dict lookup and one call per field. Fields a
+schema does not name are ignored.
+"""
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Check = Callable[[Any], bool]
+
+
+class optional:
+    def __init__(self, spec: Any) -> None:
+        self.spec = spec
+
+
+def _position(value: Any) -> bool:
+    return (
+        isinstance(value, (list, tuple))
+        and len(value) == 2
+        and all(type(part) is int for part in value)
+    )
+
+
+def _positions(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(_position(pos) for pos in value)
+
+
+POSITION = _position
+POSITIONS = _positions
+
+
+def _check(spec: Any) -> Check:
+    if spec is POSITION or spec is POSITIONS:
+        return spec
+    kinds = spec if isinstance(spec, tuple) else (spec,)
+    if bool not in kinds and int in kinds:
+        # bool is an int subclass, but `true` is not a board size.
+        return lambda value: isinstance(value, kinds) and not isinstance(value, bool)
+    return lambda value: isinstance(value, kinds)
+
+
+def compile_schema(fields: Dict[str, Any]) -> Callable[[Dict], Optional[str]]:
+    """Validator returning the first invalid field name, or None if valid.
+
+    Drops null optional fields from the message it checks.
+    """
+    checks: List[Tuple[str, Check, bool]] = []
+    for name, spec in fields.items():
+        required = not isinstance(spec, optional)
+        checks.append((name, _check(spec if required else spec.spec), required))
+
+    def validate(message: Dict) -> Optional[str]:
+        for name, check, required in checks:
+            value = message.get(name)
+            if value is None:
+                if required:
+                    return name
+                message.pop(name, None)
+                continue
+            if not check(value):
+                return name
+        return None
+
+    return validate
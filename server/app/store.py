@@ -0,0 +1,107 @@
+"""Room storage backends and worker affinity.
+
+A live room holds sockets, locks and timers, so it only ever exists in the
+memory of the worker process that owns it. What a store can share is the
+code directory: which room codes exist and which worker owns them. Room
+codes hash to their owning worker, so any worker can tell where a code
+lives without asking anyone.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import time
+import zlib
+from typing import Dict, Optional
+
+
+def owner_of(code: str, workers: int) -> int:
+    """Index of the worker that owns `code` out of `workers`."""
+    if workers <= 1:
+        return 0
+    return zlib.crc32(code.encode("utf-8")) % workers
+
+
+class RoomStore:
+    """Where a RoomManager keeps its rooms.
+
+    `rooms` holds this worker's live rooms. `claim` reserves a code before a
+    room is created under it and `release` frees it again; `exists` answers
+    for rooms on any worker the store can see, which is only every worker
+    when the store is `shared`.
+    """
+
+    shared = False
+
+    def __init__(self) -> None:
+        self.rooms: Dict[str, object] = {}
+
+    def claim(self, code: str, worker: int) -> bool:
+        raise NotImplementedError
+
+    def release(self, code: str) -> None:
+        raise NotImplementedError
+
+    def exists(self, code: str) -> bool:
+        raise NotImplementedError
+
+
+class MemoryRoomStore(RoomStore):
+    """Process-local store; the default for a single worker."""
+
+    def claim(self, code: str, worker: int) -> bool:
+        return code not in self.rooms
+
+    def release(self, code: str) -> None:
+        pass
+
+    def exists(self, code: str) -> bool:
+        return code in self.rooms
+
+
+class SharedRoomStore(RoomStore):
+    """Code directory in a SQLite file shared by the workers on one host.
+
+    A local stand-in for a networked directory such as Redis: claims are
+    atomic across processes, so two workers can never hand out the same
+    code, and `exists` sees rooms owned by every worker. On start the worker
+    drops rows left behind by its previous run.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, worker: int = 0) -> None:
+        super().__init__()
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS rooms "
+            "(code TEXT PRIMARY KEY, worker INTEGER NOT NULL, created REAL NOT NULL)"
+        )
+        self.db.execute("DELETE FROM rooms WHERE worker = ?", (worker,))
+
+    def claim(self, code: str, worker: int) -> bool:
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO rooms (code, worker, created) VALUES (?, ?, ?)",
+            (code, worker, time.time()),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, code: str) -> None:
+        self.db.execute("DELETE FROM rooms WHERE code = ?", (code,))
+
+    def exists(self, code: str) -> bool:
+        row = self.db.execute("SELECT 1 FROM rooms WHERE code = ?", (code,)).fetchone()
+        return row is not None
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def create_store(worker: int = 0) -> RoomStore:
+    """Store selected by ROOM_STORE: empty for memory, else a SQLite path."""
+    path = os.getenv("ROOM_STORE", "")
+    if not path:
+        return MemoryRoomStore()
+    return SharedRoomStore(path, worker)
@@ -0,0 +1,250 @@
+"""Compact binary WebSocket protocol.
+
+Clients opt in by offering the SUBPROTOCOL in `Sec-WebSocket-Protocol`;
+everyone else keeps speaking JSON text. Every binary frame starts with a
+one-byte opcode.
+
+Client actions sent during a match are fixed-size: `ready` carries one
+byte, `place_base`/`buy_base` a big-endian u16 row and column,
+`place_bases` a u16 count followed by that many row/column pairs and `shot`
+the shot type's index in SHOT_TYPES. Any bytes after the fixed part are an
+optional UTF-8 `idToken`. The rare room-entry messages (`create_room`,
+`join_room`, ...) carry the JSON object of the text protocol minus `type`.
+
+`room_state` is packed: bases and last impacts are bitmasks over the board
+(cell r * cols + c, little-endian, ceil(rows * cols / 8) bytes) and players
+are referred to by their compact per-room index instead of their id. Other
+server messages are the opcode followed by the JSON object minus `type`.
+"""
+from __future__ import annotations
+
+import struct
+from typing import Dict, List, Optional
+
+from .codec import dumps, loads
+from .models import geometry
+
+SUBPROTOCOL = "cannon.bin.v1"
+
+CLIENT_OPCODES = {
+    "create_room": 0x01,
+    "create_ai_room": 0x02,
+    "join_room": 0x03,
+    "reconnect": 0x04,
+    "spectate": 0x05,
+    "leave_room": 0x06,
+    "sync": 0x07,
+    "ready": 0x08,
+    "place_base": 0x09,
+    "buy_base": 0x0A,
+    "shot": 0x0B,
+    "place_bases": 0x0C,
+    "quick_match": 0x0D,
+}
+SERVER_OPCODES = {
+    "room_state": 0x80,
+    "joined": 0x81,
+    "error": 0x82,
+    "redirect": 0x83,
+    "spectating": 0x84,
+    "queued": 0x85,
+}
+CLIENT_TYPES = {code: name for name, code in CLIENT_OPCODES.items()}
+SERVER_TYPES = {code: name for name, code in SERVER_OPCODES.items()}
+
+PHASES = ("lobby", "placement", "battle", "ended")
+SHOT_TYPES = ("normal", "precise", "strong")
+# Player index meaning "nobody" (no turn yet, no winner).
+NO_PLAYER = 0xFF
+
+# Header flags.
+SPECTATOR = 0x01
+HIDDEN_BASES = 0x02
+# Player flags.
+READY = 0x01
+PLACEMENT_READY = 0x02
+CONNECTED = 0x04
+
+_HEADER = struct.Struct(">BIHHHBBBBBB")
+_PLAYER = struct.Struct(">BBi")
+_POSITION = struct.Struct(">HH")
+_COUNT = struct.Struct(">H")
+
+
+def _json(payload: Dict) -> bytes:
+    return dumps(payload).encode("utf-8")
+
+
+def _text(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _COUNT.pack(len(data)) + data
+
+
+def _mask_bytes(mask: int, size: int) -> bytes:
+    return mask.to_bytes((size + 7) // 8, "little")
+
+
+def _token(body: bytes, message: Dict) -> Dict:
+    if body:
+        message["idToken"] = body.decode("utf-8")
+    return message
+
+
+def decode(frame: bytes) -> Dict:
+    """Client frame as the message dict the JSON protocol would produce.
+
+    Raises ValueError for frames that cannot be parsed.
+    """
+    if not frame:
+        raise ValueError("Empty frame")
+    opcode, body = frame[0], frame[1:]
+    msg_type = CLIENT_TYPES.get(opcode)
+    if msg_type is None:
+        return {"type": None}
+    try:
+        if msg_type == "ready":
+            return _token(body[1:], {"type": msg_type, "ready": bool(body[0])})
+        if msg_type in ("place_base", "buy_base"):
+            row, col = _POSITION.unpack_from(body)
+            return _token(body[_POSITION.size:], {"type": msg_type, "pos": [row, col]})
+        if msg_type == "place_bases":
+            (count,) = _COUNT.unpack_from(body)
+            end = _COUNT.size + count * _POSITION.size
+            if len(body) < end:
+                raise ValueError(f"Malformed {msg_type} frame")
+            positions = [list(pos) for pos in _POSITION.iter_unpack(body[_COUNT.size:end])]
+            return _token(body[end:], {"type": msg_type, "positions": positions})
+        if msg_type == "shot":
+            shot_type = SHOT_TYPES[body[0]] if body[0] < len(SHOT_TYPES) else None
+            return _token(body[1:], {"type": msg_type, "shot_type": shot_type})
+    except (IndexError, struct.error, UnicodeDecodeError) as exc:
+        raise ValueError(f"Malformed {msg_type} frame") from exc
+    message = loads(body) if body else {}
+    if not isinstance(message, dict):
+        raise ValueError(f"Malformed {msg_type} frame")
+    message["type"] = msg_type
+    return message
+
+
+def encode_message(payload: Dict) -> bytes:
+    """Opcode plus JSON body for a server message other than room_state."""
+    body = {key: value for key, value in payload.items() if key != "type"}
+    return bytes((SERVER_OPCODES[payload["type"]],)) + _json(body)
+
+
+def encode_state(
+    room_code: str,
+    game,
+    indexes: Dict[str, int],
+    spectator: bool = False,
+) -> bytes:
+    """Packed room_state for `game`, naming players by `indexes`.
+
+    Spectator frames hide base positions until the match ends and send
+    each player's base count instead.
+    """
+    state = game.state
+    board = geometry(state.rows, state.cols)
+    hidden = spectator and state.phase != "ended"
+    flags = (SPECTATOR if spectator else 0) | (HIDDEN_BASES if hidden else 0)
+    code = room_code.encode("ascii")
+    parts: List[bytes] = [
+        _HEADER.pack(
+            SERVER_OPCODES["room_state"],
+            state.version,
+            state.rows,
+            state.cols,
+            state.max_bases,
+            PHASES.index(state.phase),
+            _index(indexes, state.turn_player_id),
+            _index(indexes, state.winner_id),
+            _index(indexes, state.last_shooter_id),
+            flags,
+            len(state.players),
+        ),
+        bytes((len(code),)) + code,
+    ]
+    for player_id, player in state.players.items():
+        player_flags = (
+            (READY if player.ready else 0)
+            | (PLACEMENT_READY if player.placement_ready else 0)
+            | (CONNECTED if player.connected else 0)
+        )
+        parts.append(_PLAYER.pack(indexes[player_id], player_flags, player.saldo))
+        parts.append(_text(player.name))
+        bases = state.bases.get(player_id)
+        if hidden:
+            parts.append(_COUNT.pack(len(bases) if bases is not None else 0))
+        else:
+            parts.append(_mask_bytes(bases.mask if bases is not None else 0, board.size))
+    parts.append(_mask_bytes(board.mask_of(state.last_impacts), board.size))
+    parts.append(_text(state.last_message))
+    return b"".join(parts)
+
+
+def _index(indexes: Dict[str, int], player_id: Optional[str]) -> int:
+    return NO_PLAYER if player_id is None else indexes[player_id]
+
+
+def decode_state(frame: bytes) -> Dict:
+    """Unpack a room_state frame; used by tools and tests, not the server."""
+    (
+        _, version, rows, cols, max_bases, phase, turn, winner, shooter, flags, count,
+    ) = _HEADER.unpack_from(frame)
+    offset = _HEADER.size
+    code_length = frame[offset]
+    room_code = frame[offset + 1:offset + 1 + code_length].decode("ascii")
+    offset += 1 + code_length
+    board = geometry(rows, cols)
+    mask_size = (board.size + 7) // 8
+
+    def text() -> str:
+        nonlocal offset
+        (length,) = _COUNT.unpack_from(frame, offset)
+        offset += _COUNT.size
+        value = frame[offset:offset + length].decode("utf-8")
+        offset += length
+        return value
+
+    def mask() -> int:
+        nonlocal offset
+        value = int.from_bytes(frame[offset:offset + mask_size], "little")
+        offset += mask_size
+        return value
+
+    players, bases, base_counts = [], {}, {}
+    for _ in range(count):
+        index, player_flags, saldo = _PLAYER.unpack_from(frame, offset)
+        offset += _PLAYER.size
+        players.append({
+            "index": index,
+            "name": text(),
+            "saldo": saldo,
+            "ready": bool(player_flags & READY),
+            "placement_ready": bool(player_flags & PLACEMENT_READY),
+            "connected": bool(player_flags & CONNECTED),
+        })
+        if flags & HIDDEN_BASES:
+            (base_counts[index],) = _COUNT.unpack_from(frame, offset)
+            offset += _COUNT.size
+        else:
+            bases[index] = board.positions_of(mask())
+    data = {
+        "room_code": room_code,
+        "version": version,
+        "rows": rows,
+        "cols": cols,
+        "max_bases": max_bases,
+        "phase": PHASES[phase],
+        "turn_player": None if turn == NO_PLAYER else turn,
+        "winner": None if winner == NO_PLAYER else winner,
+        "last_shooter": None if shooter == NO_PLAYER else shooter,
+        "spectator": bool(flags & SPECTATOR),
+        "players": players,
+        "bases": bases,
+        "last_impacts": board.positions_of(mask()),
+        "message": text(),
+    }
+    if flags & HIDDEN_BASES:
+        data["base_counts"] = base_counts
+    return data
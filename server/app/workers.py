@@ -0,0 +1,67 @@
+"""Run several game server workers on one host.
+
+Each worker is its own uvicorn process on its own port, started with
+WORKER_ID, WORKER_COUNT and WORKER_URLS so joins for a room code are
+redirected to the worker that owns it. All workers share one SQLite code
+directory (ROOM_STORE), so codes stay unique host-wide.
+
+Usage:
+    python -m server.app.workers --workers 4 --port 8000 --url "ws://localhost:{port}/ws"
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Sequence
+
+
+def worker_envs(workers: int, port: int, url: str, store: str) -> List[Dict[str, str]]:
+    """Environment overrides for each worker; `url` may use {port} and {worker}."""
+    urls = [url.format(port=port + index, worker=index) for index in range(workers)]
+    return [
+        {
+            "WORKER_ID": str(index),
+            "WORKER_COUNT": str(workers),
+            "WORKER_URLS": ",".join(urls),
+            "ROOM_STORE": store,
+            "PORT": str(port + index),
+        }
+        for index in range(workers)
+    ]
+
+
+def main(argv: Sequence[str] = ()) -> int:
+    parser = argparse.ArgumentParser(description="Run N room-affine server workers")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000, help="port of worker 0; worker i uses port + i")
+    parser.add_argument(
+        "--url", default="ws://localhost:{port}/ws", help="public WebSocket URL template per worker"
+    )
+    parser.add_argument("--store", default="rooms.sqlite3", help="shared room directory file")
+    args = parser.parse_args(list(argv) or None)
+
+    app_path = f"{__package__}.main:app"
+    processes = []
+    for overrides in worker_envs(args.workers, args.port, args.url, args.store):
+        env = {**os.environ, **overrides}
+        command = [
+            sys.executable, "-m", "uvicorn", app_path,
+            "--host", args.host, "--port", overrides["PORT"],
+        ]
+        processes.append(subprocess.Popen(command, env=env))
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+    return max((process.returncode or 0) for process in processes)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
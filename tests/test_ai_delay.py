@@ -1,7 +1,7 @@
 import asyncio
 
 from server.app.game import GameManager
-from server.app.rooms import Room
+from server.app.rooms import Room, RoomReaper
 from server.app.ai import ai_should_act
 
 
@@ -21,3 +21,83 @@ def test_ai_should_act_in_placement():
     room.game.state.phase = "placement"
     room.game.state.players[room.ai_player_id].placement_ready = False
     assert ai_should_act(room) is True
+
+
+def _battle_room(manager):
+    room = manager.create_room()
+    game = room.game
+    human = game.add_player("P1")
+    room.ai_player_id = game.add_ai_player("CPU")
+    game.set_ready(human, True)
+    game.set_ready(room.ai_player_id, True)
+    for pos in [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1)]:
+        game.place_base(human, pos)
+        game.place_base(room.ai_player_id, pos)
+    return room, human
+
+
+def test_expired_turn_auto_plays_normal_shot(monkeypatch):
+    from server.app import main
+
+    monkeypatch.setattr(main, "TURN_TIMEOUT", 0.01)
+    monkeypatch.setattr(main, "AI_MOVE_DELAY", 60)
+
+    async def run():
+        room, human = _battle_room(main.rooms)
+        room.game.state.turn_player_id = human
+        main.schedule_timers(room)
+        await asyncio.sleep(0.05)
+        result = room.game.state.last_message, room.game.state.turn_player_id
+        main.rooms.remove_room(room.code)
+        await main.scheduler.close()
+        return result, room.ai_player_id
+
+    (message, turn), ai_id = asyncio.run(run())
+    assert message == "Tempo esgotado"
+    assert turn == ai_id
+
+
+def test_ai_move_runs_from_scheduler(monkeypatch):
+    from server.app import main
+
+    monkeypatch.setattr(main, "TURN_TIMEOUT", 0)
+    monkeypatch.setattr(main, "AI_MOVE_DELAY", 0.01)
+
+    async def run():
+        room, human = _battle_room(main.rooms)
+        room.game.state.turn_player_id = room.ai_player_id
+        main.schedule_timers(room)
+        assert room.ai_timer is not None
+        await asyncio.sleep(0.05)
+        turn = room.game.state.turn_player_id
+        main.rooms.remove_room(room.code)
+        await main.scheduler.close()
+        return turn, human
+
+    turn, human = asyncio.run(run())
+    assert turn == human
+
+
+def test_abandoned_battle_is_reaped_instead_of_auto_played(monkeypatch):
+    from server.app import main
+
+    monkeypatch.setattr(main, "TURN_TIMEOUT", 0.01)
+    monkeypatch.setattr(main, "AI_MOVE_DELAY", 0.01)
+
+    async def run():
+        room, human = _battle_room(main.rooms)
+        room.game.state.turn_player_id = human
+        room.game.disconnect_player(human)
+        main.schedule_timers(room)
+        reaper = RoomReaper(main.rooms, abandoned_ttl=0.5)
+        await reaper.sweep(now=0.0)
+        # Several turn deadlines' worth of time; none may fire.
+        await asyncio.sleep(0.1)
+        reaped = await reaper.sweep(now=1.0)
+        await main.scheduler.close()
+        return room, reaped
+
+    room, reaped = asyncio.run(run())
+    assert reaped == [room.code]
+    assert room.turn_timer is None
+    assert room.game.state.last_message != "Tempo esgotado"
@@ -0,0 +1,211 @@
+import asyncio
+import random
+import time
+
+from server.app import ai, metrics
+from server.app.ai import (
+    HardAI,
+    _sample,
+    apply_ai,
+    apply_ai_async,
+    choose_shot,
+    hard_tables,
+    pick_cell,
+    plan,
+    plan_ahead,
+)
+from server.app.game import GameManager
+from server.app.rooms import Room
+
+
+def _hard_room(rows=3, cols=5, max_bases=5):
+    room = Room(code="TEST", game=GameManager(rows=rows, cols=cols, max_bases=max_bases))
+    game = room.game
+    human = game.add_player("A")
+    room.ai_player_id = game.add_ai_player("CPU")
+    room.ai_difficulty = "hard"
+    game.set_ready(human, True)
+    game.set_ready(room.ai_player_id, True)
+    return room, human
+
+
+def test_tables_group_cells_by_strong_exposure():
+    tables = hard_tables(3, 5)
+    assert tables.exposure[0] == 4
+    assert tables.exposure[1] == 6
+    assert tables.exposure[6] == 9
+    assert [count for count, _ in tables.classes] == [4, 6, 9]
+    assert sum(mask.bit_count() for _, mask in tables.classes) == 15
+
+
+def test_hard_placement_fills_least_exposed_cells_first():
+    room, _ = _hard_room(max_bases=4)
+    apply_ai(room)
+    bases = room.game.state.bases[room.ai_player_id]
+    assert set(bases) == {(0, 0), (0, 4), (2, 0), (2, 4)}
+
+
+def test_strong_when_bases_are_dense_precise_when_sparse():
+    room, human = _hard_room()
+    state = room.game.state
+    model = HardAI()
+    state.bases[human] = {(0, 0), (0, 1), (1, 1), (1, 2), (2, 2)}
+    state.phase = "battle"
+    state.players[room.ai_player_id].saldo = 3
+    assert choose_shot(model.view(state, room.ai_player_id)) == "strong"
+
+    state.bases[human] = {(2, 4)}
+    assert choose_shot(model.view(state, room.ai_player_id)) == "precise"
+
+    state.players[room.ai_player_id].saldo = 0
+    assert choose_shot(model.view(state, room.ai_player_id)) == "normal"
+
+
+def test_impacts_clear_cells_until_the_enemy_buys():
+    room, human = _hard_room()
+    state = room.game.state
+    ai_id = room.ai_player_id
+    state.bases[human] = {(2, 4), (2, 3)}
+    model = HardAI()
+    model.observe(state, ai_id)
+    model.after_shot(state, ai_id, [(0, 0), (0, 1)])
+    assert model.cleared == state.board.mask_of([(0, 0), (0, 1)])
+
+    state.bases[human].add((0, 0))
+    state.turn_number += 2
+    model.observe(state, ai_id)
+    assert model.cleared == 0
+
+
+def test_enemy_normal_misses_become_safe_cells():
+    room, human = _hard_room()
+    state = room.game.state
+    ai_id = room.ai_player_id
+    state.phase = "battle"
+    state.bases[ai_id] = {(0, 0)}
+    state.players[ai_id].saldo = 2
+    model = HardAI()
+    model.observe(state, ai_id)
+    state.last_shooter_id = human
+    state.last_impacts = [(1, 2)]
+    state.turn_number += 2
+    model.observe(state, ai_id)
+    view = model.view(state, ai_id)
+    assert pick_cell(view, state.bases[ai_id].mask) == (1, 2)
+
+    state.bases[ai_id] = set()
+    state.turn_number += 2
+    model.observe(state, ai_id)
+    assert model.ruled_out == 0
+
+
+def test_buys_a_base_when_down_to_the_last_one():
+    room, human = _hard_room()
+    state = room.game.state
+    ai_id = room.ai_player_id
+    state.phase = "battle"
+    state.turn_player_id = ai_id
+    state.bases[ai_id] = {(1, 1)}
+    state.bases[human] = {(0, 0), (2, 4)}
+    state.players[ai_id].saldo = 2
+    state.players[human].saldo = 1
+    apply_ai(room)
+    assert state.last_message == "Base comprada"
+    assert len(state.bases[ai_id]) == 2
+    assert state.turn_player_id == human
+
+
+def test_sampling_stays_within_budget():
+    board = hard_tables(50, 50).board
+    mask = board.full & ~1
+    assert _sample(board, mask, 0) == (0, 1)
+
+
+def test_hard_games_finish():
+    random.seed(7)
+    for rows, cols, max_bases in [(3, 5, 5), (8, 10, 7)]:
+        room, human = _hard_room(rows, cols, max_bases)
+        game = room.game
+        apply_ai(room)
+        for col in range(max_bases):
+            game.place_base(human, divmod(col, cols))
+        for _ in range(2000):
+            if game.state.phase != "battle":
+                break
+            if game.state.turn_player_id == human:
+                game.shot(human, "normal")
+            else:
+                apply_ai(room)
+        assert game.state.phase == "ended"
+
+
+def _ai_turn_room():
+    room, human = _hard_room()
+    game = room.game
+    apply_ai(room)
+    for pos in [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1)]:
+        game.place_base(human, pos)
+    return room, human
+
+
+def test_plan_made_during_human_turn_is_reused_after_a_miss():
+    room, human = _ai_turn_room()
+    state = room.game.state
+    state.turn_player_id = human
+    ai_id = room.ai_player_id
+    hits = metrics.AI_PLAN_HITS.value
+
+    async def run():
+        plan_ahead(room)
+        view, future = room.ai_plan
+        await future
+        # The human misses: nothing the AI decision reads has changed.
+        state.last_shooter_id = human
+        state.last_impacts = [(1, 4)]
+        state.turn_player_id = ai_id
+        state.turn_number += 1
+        return await apply_ai_async(room), view
+
+    acted, view = asyncio.run(run())
+    assert acted is True
+    assert metrics.AI_PLAN_HITS.value == hits + 1
+    assert room.ai_plan is None
+    assert state.turn_player_id == human
+
+
+def test_plan_is_discarded_when_the_state_moved_on():
+    room, human = _ai_turn_room()
+    state = room.game.state
+    state.turn_player_id = human
+    misses = metrics.AI_PLAN_MISSES.value
+
+    async def run():
+        plan_ahead(room)
+        await room.ai_plan[1]
+        # The human bought a base instead: the enemy count changed.
+        state.bases[human].add((2, 4))
+        state.turn_player_id = room.ai_player_id
+        state.turn_number += 1
+        return await apply_ai_async(room)
+
+    assert asyncio.run(run()) is True
+    assert metrics.AI_PLAN_MISSES.value == misses + 1
+
+
+def test_slow_decision_falls_back_to_saldo_rule(monkeypatch):
+    room, human = _ai_turn_room()
+    state = room.game.state
+    state.turn_player_id = room.ai_player_id
+    state.players[room.ai_player_id].saldo = 3
+    fallbacks = metrics.AI_FALLBACKS.value
+
+    def slow_plan(view):
+        time.sleep(0.2)
+        return plan(view)
+
+    monkeypatch.setattr(ai, "plan", slow_plan)
+    monkeypatch.setattr(ai, "AI_DECISION_TIMEOUT", 0.01)
+    assert asyncio.run(apply_ai_async(room)) is True
+    assert metrics.AI_FALLBACKS.value == fallbacks + 1
+    # The saldo rule fires a strong shot with 3 saldo.
+    assert len(state.last_impacts) > 1
@@ -25,3 +25,19 @@ def test_cors_preflight_allows_vercel():
         "https://cannon-blitz-online.vercel.app",
         "*",
     )
+
+
+def test_metrics_exposes_prometheus_text():
+    client.get("/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE cannon_ws_message_seconds histogram" in response.text
+    assert "cannon_active_rooms " in response.text
+
+
+def test_metrics_token_required_when_configured(monkeypatch):
+    monkeypatch.setenv("METRICS_TOKEN", "secret")
+    assert client.get("/metrics").status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
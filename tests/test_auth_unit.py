@@ -15,3 +15,137 @@ def test_verify_token_missing_raises(monkeypatch):
     from server.app.auth import verify_id_token
     with pytest.raises(ValueError):
         verify_id_token("")
+
+
+def test_token_cache_respects_exp():
+    from server.app.auth import TokenCache
+    cache = TokenCache(max_size=10, max_ttl=3600)
+    cache.put("tok", {"uid": "u1", "exp": 100}, now=50)
+    assert cache.get("tok", now=60) == {"uid": "u1", "exp": 100}
+    assert cache.get("tok", now=100) is None
+    assert len(cache) == 0
+
+
+def test_token_cache_evicts_least_recently_used():
+    from server.app.auth import TokenCache
+    cache = TokenCache(max_size=2, max_ttl=3600)
+    cache.put("a", {"uid": "a", "exp": 1000}, now=0)
+    cache.put("b", {"uid": "b", "exp": 1000}, now=0)
+    cache.get("a", now=1)
+    cache.put("c", {"uid": "c", "exp": 1000}, now=1)
+    assert cache.get("b", now=2) is None
+    assert cache.get("a", now=2) is not None
+
+
+def test_verify_token_uses_cache(monkeypatch):
+    import time
+    from server.app import auth
+    monkeypatch.delenv("AUTH_DISABLED", raising=False)
+    monkeypatch.setattr(auth, "_init_admin", lambda: None)
+    calls = []
+
+    def fake_verify(token):
+        calls.append(token)
+        return {"uid": "u1", "exp": time.time() + 600}
+
+    monkeypatch.setattr(auth.auth, "verify_id_token", fake_verify)
+    auth.token_cache.clear()
+    assert auth.verify_id_token("tok")["uid"] == "u1"
+    assert auth.verify_id_token("tok")["uid"] == "u1"
+    assert calls == ["tok"]
+    auth.token_cache.clear()
+
+
+def test_session_active_checks_exp():
+    from server.app.auth import session_active
+    assert session_active(None) is False
+    assert session_active({"uid": "u"}) is True
+    assert session_active({"uid": "u", "exp": 10}, now=5) is True
+    assert session_active({"uid": "u", "exp": 10}, now=10) is False
+
+
+def _write_keystore(tmp_path):
+    import datetime
+    import json
+
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "test")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(1)
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    path = tmp_path / "keys.json"
+    pem = cert.public_bytes(serialization.Encoding.PEM).decode("utf-8")
+    path.write_text(json.dumps({"kid-1": pem}))
+    return key, path
+
+
+def _sign(key, project_id, **claims):
+    import time
+
+    import jwt
+    now = int(time.time())
+    payload = {
+        "aud": project_id,
+        "iss": "https://securetoken.google.com/" + project_id,
+        "sub": "user-1",
+        "iat": now,
+        "exp": now + 600,
+    }
+    payload.update(claims)
+    return jwt.encode(payload, key, algorithm="RS256", headers={"kid": "kid-1"})
+
+
+def test_keystore_file_verifies_offline(monkeypatch, tmp_path):
+    from server.app import auth
+    key, path = _write_keystore(tmp_path)
+    monkeypatch.delenv("AUTH_DISABLED", raising=False)
+    monkeypatch.setenv("AUTH_PROJECT_ID", "demo-project")
+    monkeypatch.setattr(auth, "keystore", auth.KeyStore(str(path)))
+    auth.token_cache.clear()
+    decoded = auth.verify_id_token(_sign(key, "demo-project"))
+    assert decoded["uid"] == "user-1"
+    auth.token_cache.clear()
+
+
+def test_keystore_rejects_wrong_audience(monkeypatch, tmp_path):
+    import jwt
+    from server.app import auth
+    key, path = _write_keystore(tmp_path)
+    monkeypatch.delenv("AUTH_DISABLED", raising=False)
+    monkeypatch.setenv("AUTH_PROJECT_ID", "demo-project")
+    monkeypatch.setattr(auth, "keystore", auth.KeyStore(str(path)))
+    auth.token_cache.clear()
+    with pytest.raises(jwt.InvalidTokenError):
+        auth.verify_id_token(_sign(key, "other-project"))
+
+
+def test_async_verify_runs_off_loop(monkeypatch):
+    import asyncio
+    import threading
+    import time
+    from server.app import auth
+    monkeypatch.delenv("AUTH_DISABLED", raising=False)
+    threads = []
+
+    def fake_uncached(token):
+        threads.append(threading.current_thread())
+        return {"uid": "u1", "exp": time.time() + 600}
+
+    monkeypatch.setattr(auth, "_verify_uncached", fake_uncached)
+    auth.token_cache.clear()
+    decoded = asyncio.run(auth.verify_id_token_async("tok"))
+    assert decoded["uid"] == "u1"
+    assert threads and threads[0] is not threading.main_thread()
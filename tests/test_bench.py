@@ -0,0 +1,15 @@
+from tools.bench import BENCHMARKS, compare, run
+
+
+def test_every_benchmark_runs():
+    results = run(iterations=20, repeats=1)
+    assert set(results) == set(BENCHMARKS)
+    for row in results.values():
+        assert row["ops_per_sec"] > 0
+
+
+def test_compare_flags_only_large_drops():
+    baseline = {"a": {"ops_per_sec": 1000.0}, "b": {"ops_per_sec": 1000.0}}
+    results = {"a": {"ops_per_sec": 700.0}, "b": {"ops_per_sec": 900.0}, "c": {"ops_per_sec": 1.0}}
+    regressions = compare(results, baseline, threshold=0.2)
+    assert list(regressions) == ["a"]
@@ -0,0 +1,60 @@
+import asyncio
+
+from server.app import metrics
+from server.app.coalesce import Coalescer
+from server.app.rooms import Room
+
+
+def _lobby_room():
+    room = Room(code="TEST")
+    a = room.game.add_player("A")
+    b = room.game.add_player("B")
+    return room, a, b
+
+
+def _recorder():
+    sent = []
+    return sent, Coalescer(lambda room: sent.append(room.game.state.version), tick=0.02)
+
+
+def test_lone_change_is_sent_at_once_and_bursts_share_one_frame():
+    room, a, _ = _lobby_room()
+    sent, coalescer = _recorder()
+    coalesced = metrics.BROADCASTS_COALESCED.value
+
+    async def run():
+        coalescer.submit(room)
+        assert sent == [room.game.state.version]
+        for message in ("one", "two", "three"):
+            room.game.set_message(message)
+            coalescer.submit(room)
+        assert len(sent) == 1
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert sent[-1] == room.game.state.version
+    assert len(sent) == 2
+    assert metrics.BROADCASTS_COALESCED.value == coalesced + 2
+
+
+def test_turn_changes_and_explicit_flushes_skip_the_tick():
+    room, a, b = _lobby_room()
+    sent, coalescer = _recorder()
+
+    async def run():
+        coalescer.submit(room)
+        room.game.set_message("waiting")
+        coalescer.submit(room)
+        assert len(sent) == 1
+        # Both ready: the phase moves to placement.
+        room.game.set_ready(a, True)
+        room.game.set_ready(b, True)
+        coalescer.submit(room)
+        assert sent[-1] == room.game.state.version
+        assert coalescer.dirty == {}
+        room.game.set_message("now")
+        coalescer.submit(room, flush=True)
+        assert sent[-1] == room.game.state.version
+
+    asyncio.run(run())
+    assert len(sent) == 3
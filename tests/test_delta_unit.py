@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+from server.app.delta import diff_state
+from server.app.outbox import Outbox
+from server.app.rooms import Room
+
+
+def _battle_room():
+    room = Room(code="TEST")
+    player_a = room.game.add_player("A")
+    player_b = room.game.add_player("B")
+    room.game.set_ready(player_a, True)
+    room.game.set_ready(player_b, True)
+    return room, player_a, player_b
+
+
+def test_diff_reports_only_changed_fields():
+    room, player_a, _ = _battle_room()
+    old = room.game.serialize()
+    room.game.place_base(player_a, (0, 0))
+    room.game.set_message("Base colocada")
+    changes = diff_state(old, room.game.serialize())
+    assert changes["bases"] == {player_a: {"added": [[0, 0]], "removed": []}}
+    assert changes["message"] == "Base colocada"
+    assert "phase" not in changes
+    assert "players" not in changes
+
+
+def test_diff_reports_player_field_changes():
+    room, player_a, _ = _battle_room()
+    old = room.game.serialize()
+    room.game.state.players[player_a].saldo = 2
+    changes = diff_state(old, room.game.serialize())
+    assert changes["players"] == {player_a: {"saldo": 2}}
+
+
+def test_state_patch_chains_versions():
+    room, player_a, _ = _battle_room()
+    assert room.state_patch() == (None, None)
+    base = room.game.state.version
+    room.game.place_base(player_a, (1, 1))
+    patch, base_version = room.state_patch()
+    payload = json.loads(patch)
+    assert base_version == base
+    assert payload["type"] == "room_patch"
+    assert payload["version"] == room.game.state.version
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_text(self, frame):
+        self.sent.append(frame)
+
+    async def send_json(self, payload):
+        self.sent.append(payload)
+
+
+def test_outbox_sends_patch_when_client_has_base():
+    async def run():
+        outbox = Outbox(FakeSocket())
+        outbox.delta = True
+        outbox.start()
+        outbox.send_state("full-1", 1)
+        await asyncio.sleep(0.01)
+        outbox.send_state("full-2", 2, "patch-2", 1)
+        await asyncio.sleep(0.01)
+        await outbox.close()
+        return outbox.ws.sent
+
+    assert asyncio.run(run()) == ["full-1", "patch-2"]
+
+
+def test_outbox_sends_full_snapshot_on_gap():
+    async def run():
+        outbox = Outbox(FakeSocket())
+        outbox.delta = True
+        outbox.send_state("full-1", 1)
+        outbox.send_state("full-2", 2, "patch-2", 1)
+        outbox.start()
+        await asyncio.sleep(0.01)
+        await outbox.close()
+        return outbox.ws.sent
+
+    assert asyncio.run(run()) == ["full-2"]
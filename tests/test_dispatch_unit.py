@@ -0,0 +1,42 @@
+from server.app import codec, metrics
+from server.app.dispatch import ROUTES
+from server.app.main import app  # noqa: F401  registers the handlers
+from server.app.schema import POSITION, compile_schema, optional
+
+
+def test_every_message_type_has_a_route():
+    assert set(ROUTES) == set(metrics.MESSAGE_TYPES)
+
+
+def test_schema_reports_the_first_invalid_field():
+    validate = compile_schema({"pos": POSITION, "rows": optional(int), "name": optional(str)})
+    assert validate({"pos": [1, 2]}) is None
+    assert validate({"pos": [1, 2], "rows": None, "name": "A"}) is None
+    assert validate({}) == "pos"
+    assert validate({"pos": [1]}) == "pos"
+    assert validate({"pos": [1, "2"]}) == "pos"
+    assert validate({"pos": [True, 2]}) == "pos"
+    assert validate({"pos": [1, 2], "rows": True}) == "rows"
+    assert validate({"pos": [1, 2], "name": 5}) == "name"
+
+
+def test_null_optional_fields_fall_back_to_defaults():
+    validate = compile_schema({"name": optional(str), "ready": optional(bool)})
+    message = {"type": "create_room", "name": None, "ready": None}
+    assert validate(message) is None
+    assert message == {"type": "create_room"}
+    assert message.get("name", "Jogador") == "Jogador"
+
+
+def test_codec_round_trips_compact_text():
+    payload = {"type": "room_state", "data": {"bases": {"a": [(0, 1)]}, "message": "Sua vez"}}
+    text = codec.dumps(payload)
+    assert text == '{"type":"room_state","data":{"bases":{"a":[[0,1]]},"message":"Sua vez"}}'
+    assert codec.loads(text) == {
+        "type": "room_state",
+        "data": {"bases": {"a": [[0, 1]]}, "message": "Sua vez"},
+    }
+
+
+def test_codec_handles_integers_wider_than_64_bits():
+    assert codec.dumps({"mask": 1 << 100}) == '{"mask":%d}' % (1 << 100)
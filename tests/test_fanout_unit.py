@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+from server.app.main import broadcast_room
+from server.app.outbox import Outbox
+from server.app.rooms import Room
+
+
+class RecordingOutbox:
+    binary = False
+
+    def __init__(self):
+        self.frames = []
+
+    def send_state(self, frame, version=None, patch=None, base_version=None):
+        self.frames.append((frame, version))
+
+
+def _battle_room():
+    room = Room(code="TEST")
+    game = room.game
+    a = game.add_player("A")
+    b = game.add_player("B")
+    game.set_ready(a, True)
+    game.set_ready(b, True)
+    for pos in [(0, 0), (0, 1)]:
+        game.place_base(a, pos)
+        game.place_base(b, pos)
+    return room, a, b
+
+
+def test_spectator_frame_hides_bases_until_the_end():
+    room, a, b = _battle_room()
+    frame = room.spectator_frame()
+    assert room.spectator_frame() is frame
+    data = json.loads(frame)["data"]
+    assert data["bases"] == {}
+    assert data["base_counts"] == {a: 2, b: 2}
+
+    room.game.remove_player(b)
+    data = json.loads(room.spectator_frame())["data"]
+    assert data["phase"] == "ended"
+    assert len(data["bases"][a]) == 2
+
+
+def test_broadcast_leaves_spectator_fan_out_to_background_task():
+    room, _, _ = _battle_room()
+    viewers = [RecordingOutbox() for _ in range(10000)]
+
+    async def run():
+        for viewer in viewers:
+            room.spectators.add(viewer, room.spectator_frame(), room.game.state.version)
+        room.game.set_message("tick")
+        await broadcast_room(room)
+        # The broadcast itself only published the frame.
+        assert all(len(viewer.frames) == 1 for viewer in viewers)
+        await asyncio.sleep(0.05)
+        room.spectators.close()
+
+    asyncio.run(run())
+    version = room.game.state.version
+    assert all(viewer.frames[-1] == (room.spectator_frame(), version) for viewer in viewers)
+
+
+def test_slow_viewer_only_gets_newest_frame():
+    class FakeSocket:
+        def __init__(self):
+            self.sent = []
+
+        async def send_text(self, frame):
+            self.sent.append(frame)
+
+    room, _, _ = _battle_room()
+
+    async def run():
+        ws = FakeSocket()
+        outbox = Outbox(ws)
+        room.spectators.add(outbox, room.spectator_frame(), room.game.state.version)
+        for message in ("one", "two", "three"):
+            room.game.set_message(message)
+            room.spectators.publish(room.spectator_frame(), room.game.state.version)
+        outbox.start()
+        await asyncio.sleep(0.01)
+        await outbox.close()
+        room.spectators.close()
+        return ws.sent
+
+    sent = asyncio.run(run())
+    assert json.loads(sent[-1])["data"]["message"] == "three"
+    assert len(sent) <= 2
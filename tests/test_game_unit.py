@@ -6,3 +6,113 @@ def test_add_ai_player_creates_player():
     ai_id = game.add_ai_player("CPU")
     assert ai_id in game.state.players
     assert game.state.players[ai_id].name == "CPU"
+
+
+def test_version_bumps_on_mutation():
+    game = GameManager()
+    start = game.state.version
+    player_id = game.add_player("A")
+    assert game.state.version > start
+    before = game.state.version
+    game.set_ready(player_id, True)
+    assert game.state.version > before
+
+
+def test_serialize_includes_version():
+    game = GameManager()
+    game.add_player("A")
+    assert game.serialize()["version"] == game.state.version
+
+
+def _battle_game():
+    game = GameManager()
+    player_a = game.add_player("A")
+    player_b = game.add_player("B")
+    game.set_ready(player_a, True)
+    game.set_ready(player_b, True)
+    for pos in [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1)]:
+        game.place_base(player_a, pos)
+    for pos in [(2, 0), (2, 1), (2, 2), (1, 2), (1, 3)]:
+        game.place_base(player_b, pos)
+    game.state.turn_player_id = player_a
+    return game, player_a, player_b
+
+
+def test_place_base_rejects_off_board_position():
+    game = GameManager()
+    player_a = game.add_player("A")
+    game.add_player("B")
+    game.state.phase = "placement"
+    assert game.place_base(player_a, (3, 0)) == "Posicao invalida"
+    assert game.place_base(player_a, ()) == "Posicao invalida"
+    assert len(game.state.bases[player_a]) == 0
+
+
+def test_place_bases_is_all_or_nothing():
+    game = GameManager()
+    player_a = game.add_player("A")
+    game.add_player("B")
+    game.state.phase = "placement"
+    game.place_base(player_a, (0, 0))
+    version = game.state.version
+    assert game.place_bases(player_a, [(1, 0), (1, 1), (1, 0)]) == "Posicao ocupada"
+    assert game.place_bases(player_a, [(1, 0), (0, 0)]) == "Posicao ocupada"
+    assert game.place_bases(player_a, [(1, 0), (3, 0)]) == "Posicao invalida"
+    assert game.place_bases(player_a, [(1, c) for c in range(5)]) == "Limite de bases atingido"
+    assert set(game.state.bases[player_a]) == {(0, 0)}
+    assert game.state.version == version
+
+
+def test_place_bases_starts_battle_in_one_update():
+    game = GameManager()
+    player_a = game.add_player("A")
+    player_b = game.add_player("B")
+    game.set_ready(player_a, True)
+    game.set_ready(player_b, True)
+    assert game.place_bases(player_a, [(0, c) for c in range(5)]) == "Bases colocadas"
+    assert game.state.players[player_a].placement_ready
+    version = game.state.version
+    assert game.place_bases(player_b, [(2, c) for c in range(5)]) == "Bases colocadas"
+    assert game.state.phase == "battle"
+    assert game.state.turn_player_id in (player_a, player_b)
+    assert game.state.version == version + 1
+
+
+def test_strong_shot_hits_whole_neighborhood():
+    game, player_a, player_b = _battle_game()
+    game.state.players[player_a].saldo = 3
+    game._shot_strong = lambda pid: [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3)]
+    game.shot(player_a, "strong")
+    assert set(game.state.bases[player_b]) == {(2, 0)}
+    assert game.state.players[player_a].saldo == 4
+
+
+def test_serialize_bases_are_position_lists():
+    game, player_a, _ = _battle_game()
+    bases = game.serialize()["bases"][player_a]
+    assert sorted(map(tuple, bases)) == [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1)]
+
+
+def test_validate_board_limits():
+    from server.app.game import validate_board
+    assert validate_board(3, 5, 5) is None
+    assert validate_board(20, 30, 40) is None
+    assert validate_board(0, 5, 5) == "Tabuleiro invalido"
+    assert validate_board(3, 5, 16) == "Tabuleiro invalido"
+    assert validate_board("3", 5, 5) == "Tabuleiro invalido"
+
+
+def test_large_board_game_places_and_shoots():
+    game = GameManager(rows=30, cols=40, max_bases=12)
+    player_a = game.add_player("A")
+    player_b = game.add_player("B")
+    game.set_ready(player_a, True)
+    game.set_ready(player_b, True)
+    for i in range(12):
+        game.place_base(player_a, (0, i))
+        game.place_base(player_b, (29, 39 - i))
+    assert game.state.phase == "battle"
+    game.state.turn_player_id = player_a
+    message, impacts = game.shot(player_a, "normal")
+    assert message == "Tiro efetuado"
+    assert game.state.board.contains(impacts[0])
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import random
+
+from server.app.ai import apply_ai
+from server.app.game import GameManager
+from server.app.journal import Journal
+from server.app.rooms import RoomManager
+from server.app.store import MemoryRoomStore
+
+
+def _manager(journal):
+    return RoomManager(store=MemoryRoomStore(), worker_id=0, workers=1, urls=[], journal=journal)
+
+
+def _play(manager, shots=6):
+    room = manager.create_room()
+    game = room.game
+    human = game.add_player("Ana")
+    room.ai_player_id = game.add_ai_player("CPU")
+    room.ai_difficulty = "hard"
+    manager.record(room, "ai", player_id=room.ai_player_id, difficulty="hard")
+    game.set_ready(human, True)
+    game.set_ready(room.ai_player_id, True)
+    apply_ai(room)
+    for pos in [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1)]:
+        game.place_base(human, pos)
+    for _ in range(shots):
+        if game.state.phase != "battle":
+            break
+        if game.state.turn_player_id == human:
+            game.set_message(*game.shot(human, "normal"))
+        else:
+            apply_ai(room)
+    return room, human
+
+
+def _comparable(game):
+    # Messages and versions from set_message are not journaled.
+    snapshot = game.snapshot()
+    snapshot.pop("last_message")
+    snapshot.pop("version")
+    return snapshot
+
+
+def test_replay_rebuilds_the_game_from_recorded_outcomes():
+    random.seed(3)
+    records = []
+    game = GameManager()
+    game.recorder = lambda op, data: records.append((op, data))
+    a = game.add_player("A")
+    b = game.add_player("B")
+    game.set_ready(a, True)
+    game.set_ready(b, True)
+    for pos in [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1)]:
+        game.place_base(a, pos)
+    for pos in [(2, 0), (2, 1), (2, 2), (1, 2), (1, 3)]:
+        game.place_base(b, pos)
+    while game.state.phase == "battle":
+        shooter = game.state.turn_player_id
+        saldo = game.state.players[shooter].saldo
+        if saldo == 2 and len(game.state.bases[shooter]) == 1:
+            game.buy_base(shooter, (2, 4) if shooter == a else (0, 4))
+        else:
+            game.shot(shooter, "strong" if saldo >= 3 else "precise" if saldo else "normal")
+
+    copy = GameManager()
+    for op, data in records:
+        copy.replay(op, data)
+    assert _comparable(copy) == _comparable(game)
+
+
+def test_replay_applies_batched_placement_and_first_turn():
+    records = []
+    game = GameManager()
+    game.recorder = lambda op, data: records.append((op, data))
+    a = game.add_player("A")
+    b = game.add_player("B")
+    game.set_ready(a, True)
+    game.set_ready(b, True)
+    game.place_bases(a, [(0, c) for c in range(5)])
+    game.place_bases(b, [(2, c) for c in range(5)])
+
+    copy = GameManager()
+    for op, data in json.loads(json.dumps(records)):
+        copy.replay(op, data)
+    assert _comparable(copy) == _comparable(game)
+    assert copy.state.turn_player_id == game.state.turn_player_id
+
+
+def test_snapshot_round_trip():
+    random.seed(4)
+    room, _ = _play(_manager(None))
+    restored = GameManager.restore(room.game.snapshot())
+    assert restored.snapshot() == room.game.snapshot()
+    assert restored.serialize() == room.game.serialize()
+
+
+def test_rooms_survive_a_restart(tmp_path):
+    random.seed(5)
+    path = str(tmp_path / "journal.jsonl")
+
+    async def first_run():
+        journal = Journal(path, flush_interval=0.01, snapshot_interval=3600)
+        manager = _manager(journal)
+        room, human = _play(manager)
+        gone = manager.create_room()
+        manager.remove_room(gone.code)
+        await journal.close()
+        return room, human, gone.code
+
+    room, human, gone = asyncio.run(first_run())
+    manager = _manager(Journal(path))
+    restored = {r.code: r for r in manager.restore(manager.journal.load())}
+    assert set(restored) == {room.code}
+    again = restored[room.code]
+    assert _comparable(again.game) == _comparable(room.game)
+    assert again.ai_player_id == room.ai_player_id
+    assert again.ai_difficulty == "hard"
+    assert again.game.state.players[human].connected is False
+    assert manager.get_lock(room.code) is not None
+
+
+def test_compaction_keeps_only_snapshots_and_later_actions(tmp_path):
+    random.seed(6)
+    path = str(tmp_path / "journal.jsonl")
+
+    async def run():
+        journal = Journal(path, flush_interval=0.01, snapshot_interval=3600)
+        manager = _manager(journal)
+        room, human = _play(manager, shots=2)
+        await journal.compact(manager.snapshots)
+        compacted = journal.load()
+        _play_more(room, human)
+        await journal.close()
+        return room, compacted
+
+    room, compacted = asyncio.run(run())
+    assert [record["op"] for record in compacted] == ["snapshot"]
+    manager = _manager(Journal(path))
+    (again,) = manager.restore(manager.journal.load())
+    assert _comparable(again.game) == _comparable(room.game)
+
+
+def _play_more(room, human):
+    game = room.game
+    for _ in range(4):
+        if game.state.phase != "battle":
+            break
+        if game.state.turn_player_id == human:
+            game.shot(human, "normal")
+        else:
+            apply_ai(room)
+
+
+def test_torn_last_line_is_ignored(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"room":"A","op":"room","v":0,"rows":3,"cols":5,"max_bases":5}\n{"room":"A","op"')
+    assert Journal(str(path)).load() == [
+        {"room": "A", "op": "room", "v": 0, "rows": 3, "cols": 5, "max_bases": 5}
+    ]
+
+
+def test_append_does_not_touch_the_disk(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = Journal(str(path))
+    journal.append({"room": "A", "op": "remove", "v": 0})
+    assert not path.exists()
+    asyncio.run(journal.close())
+    assert len(Journal(str(path)).load()) == 1
@@ -0,0 +1,49 @@
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+from server.app import main
+from server.app.main import app
+from server.app.ratelimit import RateLimiter
+from tools.loadgen import percentile, run_load
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def server_url(monkeypatch):
+    monkeypatch.setenv("AUTH_DISABLED", "1")
+    # The generator's clients all come from one IP with one uid.
+    monkeypatch.setattr(main, "limiter", RateLimiter(enabled=False))
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"ws://127.0.0.1:{port}/ws"
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+def test_percentile_picks_nearest_rank():
+    samples = [float(value) for value in range(1, 101)]
+    assert percentile(samples, 50) == 51.0
+    assert percentile(samples, 99) == 99.0
+    assert percentile([], 99) == 0.0
+
+
+def test_pair_plays_a_full_game(server_url):
+    result = asyncio.run(run_load(server_url, clients=2, timeout=10))
+    assert result["games"] == 1
+    assert result["errors"] == 0
+    assert result["latency_by_type"]["shot"]["count"] > 0
+    assert result["latency"]["p50_ms"] > 0
@@ -0,0 +1,129 @@
+import asyncio
+import random
+import time
+
+from server.app.matchmaking import MAX_RATING, Matchmaker
+from server.app.outbox import Outbox
+
+
+def test_same_bucket_pairs_immediately():
+    queue = Matchmaker(bucket_width=100, widen=5.0, timeout=30.0)
+    assert queue.enqueue("a", 1010, now=0.0) is None
+    first, second = queue.enqueue("b", 1090, now=1.0)
+    assert (first.key, second.key) == ("a", "b")
+    assert len(queue) == 0
+    assert queue.keys == []
+
+
+def test_range_widens_with_wait_time():
+    queue = Matchmaker(bucket_width=100, widen=5.0, timeout=30.0)
+    queue.enqueue("a", 1000, now=0.0)
+    assert queue.enqueue("b", 1250, now=1.0) is None
+    # Two buckets apart: "a" reaches that far after 10 seconds.
+    assert queue.sweep(now=6.0) == ([], [])
+    pairs, expired = queue.sweep(now=10.0)
+    assert [(x.key, y.key) for x, y in pairs] == [("a", "b")]
+    assert expired == []
+    assert len(queue) == 0
+
+
+def test_new_ticket_meets_a_widened_neighbour_on_arrival():
+    queue = Matchmaker(bucket_width=100, widen=5.0, timeout=30.0)
+    queue.enqueue("a", 1000, now=0.0)
+    assert queue.enqueue("b", 1150, now=2.0) is None
+    queue.cancel("b")
+    first, second = queue.enqueue("c", 1150, now=5.0)
+    assert (first.key, second.key) == ("a", "c")
+
+
+def test_closest_and_then_oldest_opponent_wins():
+    queue = Matchmaker(bucket_width=100, widen=10.0, timeout=60.0)
+    queue.enqueue("far", 1300, now=0.0)
+    queue.enqueue("near", 900, now=1.0)
+    queue.enqueue("near-too", 1100, now=2.0)
+    first, second = queue.enqueue("me", 1000, now=12.0)
+    assert first.key == "near"
+
+
+def test_cancel_and_requeue_replace_the_ticket():
+    queue = Matchmaker(bucket_width=100, widen=5.0, timeout=30.0)
+    queue.enqueue("a", 1000, now=0.0)
+    assert queue.enqueue("a", 1000, now=1.0) is None
+    assert len(queue) == 1
+    assert queue.cancel("a").since == 1.0
+    assert "a" not in queue
+    assert queue.cancel("a") is None
+
+
+def test_missing_and_out_of_range_ratings_are_normalised():
+    queue = Matchmaker(bucket_width=100, widen=5.0, timeout=30.0)
+    queue.enqueue("a", None, now=0.0)
+    queue.enqueue("b", 10**12, now=0.0)
+    queue.enqueue("c", -50, now=0.0)
+    assert queue.waiting["a"].rating == 1000
+    assert queue.waiting["b"].rating == MAX_RATING
+    assert queue.waiting["c"].bucket == 0
+
+
+def test_requeued_ticket_keeps_its_wait_time():
+    queue = Matchmaker(bucket_width=100, widen=5.0, timeout=30.0)
+    queue.enqueue("a", 1000, now=0.0)
+    first, _ = queue.enqueue("b", 1000, now=1.0)
+    queue.enqueue("c", 3000, now=2.0)
+    assert queue.requeue(first, now=3.0) is None
+    assert list(queue.waiting) == ["a", "c"]
+    assert queue.waiting["a"].since == 0.0
+    _, expired = queue.sweep(now=30.0)
+    assert [ticket.key for ticket in expired] == ["a"]
+
+
+def test_survivor_is_requeued_when_the_opponent_left(monkeypatch):
+    from server.app import main
+    from server.app.main import Connection
+
+    class Socket:
+        async def send_text(self, frame):
+            return None
+
+    monkeypatch.setattr(main, "matchmaker", Matchmaker(bucket_width=100, widen=5.0, timeout=30.0))
+
+    async def run():
+        gone, stays = Connection(Outbox(Socket())), Connection(Outbox(Socket()))
+        gone.outbox.closed = True
+        main.matchmaker.enqueue(gone.outbox, 1000, (gone, "A"))
+        pair = main.matchmaker.enqueue(stays.outbox, 1000, (stays, "B"))
+        before = set(main.rooms.rooms)
+        await main.start_match(pair)
+        await main.scheduler.close()
+        return before, stays
+
+    before, stays = asyncio.run(run())
+    assert set(main.rooms.rooms) == before
+    assert stays.room_code is None
+    assert stays.outbox in main.matchmaker
+
+
+def test_timed_out_tickets_are_returned_for_the_ai():
+    queue = Matchmaker(bucket_width=100, widen=0.0, timeout=30.0)
+    queue.enqueue("a", 1000, now=0.0)
+    pairs, expired = queue.sweep(now=30.0)
+    assert pairs == []
+    assert [ticket.key for ticket in expired] == ["a"]
+    assert len(queue) == 0
+
+
+def test_thousands_of_enqueues_per_second():
+    rng = random.Random(5)
+    queue = Matchmaker(bucket_width=100, widen=5.0, timeout=30.0)
+    started = time.perf_counter()
+    matched = 0
+    for index in range(20000):
+        if queue.enqueue(index, rng.randint(0, 3000), now=index / 5000) is not None:
+            matched += 2
+        if index % 5000 == 0:
+            queue.sweep(now=index / 5000)
+    elapsed = time.perf_counter() - started
+    assert matched + len(queue) == 20000
+    # Same-bucket tickets pair on arrival, so at most one waits per bucket.
+    assert len(queue) == len(queue.keys)
+    assert 20000 / elapsed > 2000
@@ -0,0 +1,29 @@
+from server.app.metrics import Counter, HistogramFamily, Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    family = HistogramFamily("demo_seconds", "Demo.", buckets=(0.1, 1.0))
+    family.observe(0.05)
+    family.observe(0.5)
+    family.observe(5.0)
+    lines = family.render()
+    assert 'demo_seconds_bucket{le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{le="+Inf"} 3' in lines
+    assert "demo_seconds_count 3" in lines
+
+
+def test_unknown_label_values_fold_into_other():
+    family = HistogramFamily("demo_seconds", "Demo.", label="type", values=("shot",))
+    family.labels("shot").observe(0.01)
+    family.labels("spam-1").observe(0.01)
+    family.labels(["not", "hashable"]).observe(0.01)
+    assert family.children["shot"].count == 1
+    assert family.children["other"].count == 2
+    assert set(family.children) == {"shot", "other"}
+
+
+def test_registry_renders_counter_callback():
+    registry = Registry()
+    registry.register(Counter("demo_total", "Demo.", callback=lambda: 7))
+    assert "demo_total 7" in registry.render()
@@ -0,0 +1,60 @@
+from server.app.models import Board, GameState, geometry
+
+
+def test_geometry_is_cached_per_size():
+    assert geometry(3, 5) is geometry(3, 5)
+    assert geometry(3, 5).full == (1 << 15) - 1
+
+
+def test_neighborhood_mask_is_clipped_at_corner():
+    board = geometry(3, 5)
+    corner = board.index((0, 0))
+    assert board.positions_of(board.neighborhoods[corner]) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+
+
+def test_board_behaves_like_a_set():
+    board = Board(geometry(3, 5), [(0, 0), (2, 4)])
+    assert (2, 4) in board
+    assert (1, 1) not in board
+    assert (9, 9) not in board
+    assert len(board) == 2
+    board.discard((0, 0))
+    assert set(board) == {(2, 4)}
+    assert board == {(2, 4)}
+
+
+def test_state_converts_assigned_sets_to_boards():
+    state = GameState()
+    state.bases["p1"] = {(0, 0)}
+    assert isinstance(state.bases["p1"], Board)
+    assert state.bases["p1"].mask == 1
+
+
+def test_candidate_pool_discard_and_reset():
+    from server.app.models import CandidatePool
+    pool = CandidatePool(geometry(3, 5))
+    assert len(pool) == 15
+    pool.discard((1, 1))
+    pool.discard((1, 1))
+    assert len(pool) == 14
+    assert (1, 1) not in pool
+    pool.reset()
+    assert len(pool) == 15
+    assert (1, 1) in pool
+
+
+def test_candidate_pool_choice_only_returns_live_positions():
+    import random
+    from server.app.models import CandidatePool
+    pool = CandidatePool(geometry(3, 5), [(0, 0), (2, 4)])
+    rng = random.Random(7)
+    picks = {pool.choice(rng) for _ in range(50)}
+    assert picks == {(0, 0), (2, 4)}
+
+
+def test_state_converts_assigned_candidates_to_pool():
+    from server.app.models import CandidatePool
+    state = GameState()
+    state.normal_candidates["p1"] = {(0, 0)}
+    assert isinstance(state.normal_candidates["p1"], CandidatePool)
+    assert list(state.normal_candidates["p1"]) == [(0, 0)]
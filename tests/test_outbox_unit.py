@@ -0,0 +1,82 @@
+import asyncio
+
+from server.app.outbox import Outbox
+from server.app.rooms import Room
+
+
+class FakeSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+
+    async def send_json(self, payload):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.sent.append(payload)
+
+    async def send_text(self, frame):
+        await self.send_json(frame)
+
+
+def test_outbox_keeps_only_newest_state():
+    async def run():
+        ws = FakeSocket()
+        outbox = Outbox(ws)
+        outbox.send_state("state-1")
+        outbox.send_state("state-2")
+        outbox.send_state("state-3")
+        outbox.start()
+        await asyncio.sleep(0.01)
+        await outbox.close()
+        return ws.sent
+
+    assert asyncio.run(run()) == ["state-3"]
+
+
+def test_outbox_sends_messages_before_state():
+    async def run():
+        ws = FakeSocket()
+        outbox = Outbox(ws)
+        outbox.send({"type": "joined"})
+        outbox.send_state("state")
+        outbox.start()
+        await asyncio.sleep(0.01)
+        await outbox.close()
+        return ws.sent
+
+    assert asyncio.run(run()) == ['{"type":"joined"}', "state"]
+
+
+def test_slow_consumer_is_evicted():
+    evicted = []
+
+    async def on_evict(outbox):
+        evicted.append(outbox)
+
+    async def run():
+        outbox = Outbox(FakeSocket(delay=1.0), on_evict=on_evict, timeout=0.01)
+        outbox.start()
+        outbox.send_state("state")
+        await asyncio.sleep(0.05)
+        return outbox
+
+    outbox = asyncio.run(run())
+    assert evicted == [outbox]
+    assert outbox.closed
+
+
+def test_broadcast_does_not_wait_for_slow_client():
+    from server.app.main import broadcast_room
+
+    async def run():
+        room = Room(code="TEST")
+        player_id = room.game.add_player("A")
+        slow = Outbox(FakeSocket(delay=1.0), timeout=5.0)
+        slow.start()
+        room.connections[player_id] = slow
+        await asyncio.wait_for(broadcast_room(room), 0.1)
+        sent = list(slow.ws.sent)
+        await slow.close()
+        return sent
+
+    assert asyncio.run(run()) == []
@@ -0,0 +1,62 @@
+from server.app.ratelimit import RateLimiter, TokenBucket
+
+BUDGETS = {"create": (0.5, 2), "join": (1.0, 2), "action": (2.0, 4), "other": (1.0, 2)}
+
+
+def _limiter(**options):
+    return RateLimiter(budgets=BUDGETS, uid_scale=2, ip_scale=3, max_rooms=2, enabled=True, **options)
+
+
+def test_bucket_refills_at_its_rate_up_to_the_burst():
+    bucket = TokenBucket(rate=2.0, burst=2, now=0.0)
+    assert bucket.take(0.0) and bucket.take(0.0)
+    assert not bucket.take(0.0)
+    assert bucket.take(0.5)
+    assert not bucket.take(0.5)
+    assert bucket.full(100.0)
+
+
+def test_message_classes_have_separate_budgets():
+    limiter = _limiter()
+    local = {}
+    assert all(limiter.allow(local, None, None, "shot", now=0.0) for _ in range(4))
+    assert not limiter.allow(local, None, None, "place_base", now=0.0)
+    assert limiter.allow(local, None, None, "join_room", now=0.0)
+    assert limiter.allow(local, None, None, "bogus", now=0.0)
+
+
+def test_connections_from_one_ip_share_a_scaled_budget():
+    limiter = _limiter()
+    allowed = sum(limiter.allow({}, "10.0.0.1", None, "join_room", now=0.0) for _ in range(10))
+    assert allowed == 6
+    assert limiter.allow({}, "10.0.0.2", None, "join_room", now=0.0)
+
+
+def test_uid_budget_spans_connections():
+    limiter = _limiter()
+    allowed = sum(limiter.allow({}, None, "u1", "shot", now=0.0) for _ in range(20))
+    assert allowed == 8
+
+
+def test_room_cap_counts_only_live_rooms():
+    live = {"AAAAA", "BBBBB"}
+    limiter = _limiter(live=lambda code: code in live)
+    limiter.created("u1", "AAAAA")
+    limiter.created("u1", "BBBBB")
+    assert not limiter.may_create("u1")
+    assert limiter.may_create("u2")
+    live.discard("AAAAA")
+    assert limiter.may_create("u1")
+
+
+def test_sweep_forgets_idle_buckets_and_dead_rooms():
+    limiter = _limiter(live=lambda code: False)
+    limiter.allow({}, "10.0.0.1", "u1", "shot", now=0.0)
+    limiter.created("u1", "AAAAA")
+    limiter.sweep(now=100.0)
+    assert limiter.by_ip == {} and limiter.by_uid == {} and limiter.rooms == {}
+
+
+def test_disabled_limiter_lets_everything_through():
+    limiter = RateLimiter(budgets=BUDGETS, enabled=False)
+    assert all(limiter.allow({}, "ip", "uid", "shot", now=0.0) for _ in range(100))
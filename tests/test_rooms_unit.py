@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+from server.app.rooms import Room, RoomManager
+from server.app.scheduler import Scheduler
+
+
+def test_create_room_registers_lock():
+    manager = RoomManager()
+    room = manager.create_room()
+    assert manager.get_lock(room.code) is not None
+
+
+def test_remove_room_drops_lock():
+    manager = RoomManager()
+    room = manager.create_room()
+    manager.remove_room(room.code)
+    assert manager.get_room(room.code) is None
+    assert manager.get_lock(room.code) is None
+
+
+def test_locked_unknown_room_yields_none():
+    manager = RoomManager()
+
+    async def run():
+        async with manager.locked("NOPE") as room:
+            return room
+
+    assert asyncio.run(run()) is None
+
+
+def test_room_locks_are_independent():
+    manager = RoomManager()
+    room_a = manager.create_room()
+    room_b = manager.create_room()
+
+    async def run():
+        async with manager.locked(room_a.code):
+            async with asyncio.timeout(1):
+                async with manager.locked(room_b.code) as locked_b:
+                    return locked_b
+
+    assert asyncio.run(run()) is room_b
+
+
+def test_locked_room_removed_while_waiting_yields_none():
+    manager = RoomManager()
+    room = manager.create_room()
+
+    async def run():
+        lock = manager.get_lock(room.code)
+        await lock.acquire()
+
+        async def waiter():
+            async with manager.locked(room.code) as locked:
+                return locked
+
+        task = asyncio.create_task(waiter())
+        await asyncio.sleep(0)
+        manager.remove_room(room.code)
+        lock.release()
+        return await task
+
+    assert asyncio.run(run()) is None
+
+
+def test_state_frame_cached_per_version():
+    room = Room(code="TEST")
+    room.game.add_player("A")
+    frame = room.state_frame()
+    assert room.state_frame() is frame
+    assert json.loads(frame)["type"] == "room_state"
+
+
+def test_state_frame_invalidated_on_mutation():
+    room = Room(code="TEST")
+    room.game.add_player("A")
+    frame = room.state_frame()
+    room.game.set_message("Novo")
+    refreshed = room.state_frame()
+    assert refreshed is not frame
+    assert json.loads(refreshed)["data"]["message"] == "Novo"
+
+
+def _reaper(manager):
+    from server.app.rooms import RoomReaper
+    return RoomReaper(manager, lobby_ttl=100, abandoned_ttl=10, ended_ttl=20, interval=1)
+
+
+def test_reaper_frees_ended_rooms_after_ttl():
+    manager = RoomManager()
+    room = manager.create_room()
+    room.game.add_player("A")
+    room.game.state.phase = "ended"
+    reaper = _reaper(manager)
+    assert asyncio.run(reaper.sweep(now=1000)) == []
+    assert asyncio.run(reaper.sweep(now=1019)) == []
+    assert asyncio.run(reaper.sweep(now=1020)) == [room.code]
+    assert manager.get_room(room.code) is None
+
+
+def test_reaper_keeps_active_battle():
+    manager = RoomManager()
+    room = manager.create_room()
+    room.game.add_player("A")
+    room.game.add_player("B")
+    room.game.state.phase = "battle"
+    reaper = _reaper(manager)
+    asyncio.run(reaper.sweep(now=0))
+    assert asyncio.run(reaper.sweep(now=99)) == []
+
+
+def test_reaper_frees_abandoned_ai_room_and_cancels_task():
+    manager = RoomManager()
+    room = manager.create_room()
+    human = room.game.add_player("A")
+    room.ai_player_id = room.game.add_ai_player("CPU")
+    room.game.state.phase = "battle"
+    room.game.disconnect_player(human)
+    reaper = _reaper(manager)
+
+    async def run():
+        scheduler = Scheduler()
+
+        async def never():
+            raise AssertionError("AI move should have been cancelled")
+
+        timer = scheduler.call_later(60, never)
+        room.ai_timer = timer
+        await reaper.sweep(now=0)
+        reaped = await reaper.sweep(now=10)
+        await scheduler.close()
+        return reaped, timer.active, len(scheduler)
+
+    reaped, active, pending = asyncio.run(run())
+    assert reaped == [room.code]
+    assert not active
+    assert pending == 0
+    assert manager.get_lock(room.code) is None
+
+
+def test_reaper_idle_clock_resets_on_state_change():
+    manager = RoomManager()
+    room = manager.create_room()
+    player = room.game.add_player("A")
+    reaper = _reaper(manager)
+    asyncio.run(reaper.sweep(now=0))
+    room.game.set_ready(player, True)
+    assert asyncio.run(reaper.sweep(now=90)) == []
+    assert asyncio.run(reaper.sweep(now=189)) == []
+    assert asyncio.run(reaper.sweep(now=190)) == [room.code]
@@ -0,0 +1,63 @@
+import asyncio
+import random
+
+from server.app.scheduler import Scheduler
+
+
+def test_timers_fire_in_deadline_order():
+    fired = []
+
+    async def record(name):
+        fired.append(name)
+
+    async def run():
+        scheduler = Scheduler()
+        scheduler.call_later(0.03, record, "late")
+        scheduler.call_later(0.01, record, "early")
+        scheduler.call_later(0.02, record, "middle")
+        await asyncio.sleep(0.08)
+        await scheduler.close()
+
+    asyncio.run(run())
+    assert fired == ["early", "middle", "late"]
+
+
+def test_cancelled_timer_never_fires():
+    fired = []
+
+    async def record(name):
+        fired.append(name)
+
+    async def run():
+        scheduler = Scheduler()
+        timer = scheduler.call_later(0.01, record, "cancelled")
+        scheduler.call_later(0.02, record, "kept")
+        timer.cancel()
+        assert not timer.active
+        await asyncio.sleep(0.05)
+        await scheduler.close()
+        return len(scheduler)
+
+    assert asyncio.run(run()) == 0
+    assert fired == ["kept"]
+
+
+def test_heap_stays_ordered_under_random_cancels():
+    async def noop():
+        return None
+
+    async def run():
+        scheduler = Scheduler()
+        rng = random.Random(3)
+        timers = [scheduler.call_later(rng.uniform(10, 20), noop) for _ in range(500)]
+        for timer in rng.sample(timers, 250):
+            timer.cancel()
+        heap = scheduler._heap
+        ordered = all(
+            heap[(i - 1) // 2]._key() <= heap[i]._key() for i in range(1, len(heap))
+        )
+        slots = all(timer.index == i for i, timer in enumerate(heap))
+        await scheduler.close()
+        return len(scheduler), ordered, slots
+
+    assert asyncio.run(run()) == (250, True, True)
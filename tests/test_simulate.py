@@ -0,0 +1,34 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from tools.simulate import run, simulate_batch
+
+
+def test_every_game_ends_with_a_winner():
+    winner, shots = simulate_batch("easy", "hard", np.arange(200, dtype=np.uint64))
+    assert set(winner.tolist()) <= {0, 1}
+    assert shots.min() >= 3
+
+
+def test_results_do_not_depend_on_batch_split():
+    seeds = np.arange(100, dtype=np.uint64)
+    winner, shots = simulate_batch("normal", "hard", seeds)
+    first = simulate_batch("normal", "hard", seeds[:37])
+    second = simulate_batch("normal", "hard", seeds[37:])
+    assert winner.tolist() == first[0].tolist() + second[0].tolist()
+    assert shots.tolist() == first[1].tolist() + second[1].tolist()
+
+
+def test_report_is_reproducible_per_seed():
+    report = run([("easy", "easy")], games=300, seed=5, chunk=100)
+    again = run([("easy", "easy")], games=300, seed=5, chunk=150)
+    assert report == again
+    row = report["easy-vs-easy"]
+    assert row["games"] == 300
+    assert row["win_rate_a"] + row["win_rate_b"] == pytest.approx(1.0)
+
+
+def test_custom_board_size():
+    winner, _ = simulate_batch("hard", "hard", np.arange(50, dtype=np.uint64), rows=8, cols=10, max_bases=7)
+    assert (winner >= 0).all()
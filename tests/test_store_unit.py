@@ -0,0 +1,65 @@
+from server.app.rooms import RoomManager
+from server.app.store import MemoryRoomStore, SharedRoomStore, owner_of
+from server.app.workers import worker_envs
+
+
+def test_codes_hash_to_a_stable_owner():
+    assert owner_of("ABCDE", 1) == 0
+    assert owner_of("ABCDE", 4) == owner_of("ABCDE", 4)
+    owners = {owner_of(f"C{i:04d}", 4) for i in range(200)}
+    assert owners == {0, 1, 2, 3}
+
+
+def test_worker_only_creates_codes_it_owns():
+    manager = RoomManager(store=MemoryRoomStore(), worker_id=2, workers=3, urls=[])
+    for _ in range(20):
+        room = manager.create_room()
+        assert owner_of(room.code, 3) == 2
+        assert manager.owns(room.code)
+
+
+def test_redirect_points_at_the_owner():
+    urls = ["ws://w0/ws", "ws://w1/ws"]
+    manager = RoomManager(store=MemoryRoomStore(), worker_id=0, workers=2, urls=urls)
+    other = RoomManager(store=MemoryRoomStore(), worker_id=1, workers=2, urls=urls)
+    code = other.create_room().code
+    assert manager.redirect_url(code) == "ws://w1/ws"
+    assert other.redirect_url(code) is None
+
+
+def test_shared_store_claims_are_exclusive(tmp_path):
+    path = str(tmp_path / "rooms.sqlite3")
+    first = SharedRoomStore(path, worker=0)
+    second = SharedRoomStore(path, worker=1)
+    assert first.claim("ABCDE", 0) is True
+    assert second.claim("ABCDE", 1) is False
+    assert second.exists("ABCDE")
+    first.release("ABCDE")
+    assert not second.exists("ABCDE")
+
+
+def test_shared_store_forgets_codes_from_previous_run(tmp_path):
+    path = str(tmp_path / "rooms.sqlite3")
+    SharedRoomStore(path, worker=0).claim("ABCDE", 0)
+    SharedRoomStore(path, worker=1).claim("FGHIJ", 1)
+    restarted = SharedRoomStore(path, worker=0)
+    assert not restarted.exists("ABCDE")
+    assert restarted.exists("FGHIJ")
+
+
+def test_shared_store_skips_redirect_for_dead_codes(tmp_path):
+    path = str(tmp_path / "rooms.sqlite3")
+    urls = ["ws://w0/ws", "ws://w1/ws"]
+    manager = RoomManager(store=SharedRoomStore(path, 0), worker_id=0, workers=2, urls=urls)
+    other = RoomManager(store=SharedRoomStore(path, 1), worker_id=1, workers=2, urls=urls)
+    room = other.create_room()
+    assert manager.redirect_url(room.code) == "ws://w1/ws"
+    other.remove_room(room.code)
+    assert manager.redirect_url(room.code) is None
+
+
+def test_worker_envs_give_each_worker_its_port_and_id():
+    envs = worker_envs(3, 8000, "ws://host:{port}/ws", "rooms.sqlite3")
+    assert [env["WORKER_ID"] for env in envs] == ["0", "1", "2"]
+    assert envs[2]["PORT"] == "8002"
+    assert envs[0]["WORKER_URLS"] == "ws://host:8000/ws,ws://host:8001/ws,ws://host:8002/ws"
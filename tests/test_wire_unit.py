@@ -0,0 +1,94 @@
+import struct
+
+import pytest
+
+from server.app import wire
+from server.app.rooms import Room
+
+
+def _battle_room():
+    room = Room(code="TEST")
+    game = room.game
+    a = game.add_player("A")
+    b = game.add_player("B")
+    game.set_ready(a, True)
+    game.set_ready(b, True)
+    for pos in [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1)]:
+        game.place_base(a, pos)
+    for pos in [(2, 0), (2, 1), (2, 2), (1, 2), (1, 3)]:
+        game.place_base(b, pos)
+    return room, a, b
+
+
+def test_client_actions_decode_to_text_protocol_messages():
+    assert wire.decode(bytes([0x08, 1])) == {"type": "ready", "ready": True}
+    assert wire.decode(bytes([0x09]) + struct.pack(">HH", 2, 4)) == {
+        "type": "place_base",
+        "pos": [2, 4],
+    }
+    assert wire.decode(bytes([0x0C]) + struct.pack(">HHHHH", 2, 0, 1, 3, 4) + b"tok") == {
+        "type": "place_bases",
+        "positions": [[0, 1], [3, 4]],
+        "idToken": "tok",
+    }
+    assert wire.decode(bytes([0x0B, 2]) + b"tok") == {
+        "type": "shot",
+        "shot_type": "strong",
+        "idToken": "tok",
+    }
+    assert wire.decode(bytes([0x03]) + b'{"room_code":"ABCDE"}') == {
+        "type": "join_room",
+        "room_code": "ABCDE",
+    }
+    assert wire.decode(bytes([0x7F])) == {"type": None}
+
+
+def test_truncated_frames_are_rejected():
+    with pytest.raises(ValueError):
+        wire.decode(b"")
+    with pytest.raises(ValueError):
+        wire.decode(bytes([0x09, 0]))
+    with pytest.raises(ValueError):
+        wire.decode(bytes([0x0C]) + struct.pack(">HHH", 2, 0, 1))
+
+
+def test_state_round_trips_with_bitmask_bases():
+    room, a, b = _battle_room()
+    state = room.game.state
+    room.game.shot(state.turn_player_id, "normal")
+    data = wire.decode_state(room.binary_frame())
+    indexes = room.player_indexes()
+    assert data["version"] == state.version
+    assert data["phase"] == state.phase
+    assert data["turn_player"] == indexes[state.turn_player_id]
+    assert [p["name"] for p in data["players"]] == ["A", "B"]
+    assert set(data["bases"][indexes[a]]) == set(state.bases[a])
+    assert set(data["bases"][indexes[b]]) == set(state.bases[b])
+    assert set(data["last_impacts"]) == set(state.last_impacts)
+    assert data["message"] == state.last_message
+
+
+def test_spectator_frame_hides_bases_until_the_end():
+    room, a, b = _battle_room()
+    data = wire.decode_state(room.binary_frame(spectator=True))
+    assert data["spectator"] is True
+    assert data["bases"] == {}
+    assert data["base_counts"] == {0: 5, 1: 5}
+
+    room.game.remove_player(b)
+    data = wire.decode_state(room.binary_frame(spectator=True))
+    assert "base_counts" not in data
+    assert len(data["bases"][0]) == 5
+
+
+def test_binary_frame_is_much_smaller_than_json():
+    room, _, _ = _battle_room()
+    assert len(room.binary_frame()) * 5 < len(room.state_frame().encode("utf-8"))
+
+
+def test_frames_are_cached_per_version():
+    room, _, _ = _battle_room()
+    assert room.binary_frame() is room.binary_frame()
+    first = room.binary_frame()
+    room.game.set_message("x")
+    assert room.binary_frame() is not first
@@ -0,0 +1,287 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from server.app import main, metrics, wire
+from server.app.main import app, rooms
+from server.app.matchmaking import Matchmaker
+from server.app.ratelimit import RateLimiter
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("AUTH_DISABLED", "1")
+    # Every test client shares one IP and uid; start each test with fresh budgets.
+    monkeypatch.setattr(main, "limiter", RateLimiter(live=lambda code: code in rooms.rooms))
+    return TestClient(app)
+
+
+def _receive_type(ws, msg_type):
+    while True:
+        message = ws.receive_json()
+        if message["type"] == msg_type:
+            return message
+
+
+def test_create_and_join_room(client):
+    with client.websocket_connect("/ws") as host:
+        host.send_json({"type": "create_room", "name": "A", "idToken": "t"})
+        joined = _receive_type(host, "joined")
+        code = joined["room_code"]
+        assert rooms.get_lock(code) is not None
+
+        with client.websocket_connect("/ws") as guest:
+            guest.send_json(
+                {"type": "join_room", "name": "B", "room_code": code, "idToken": "t"}
+            )
+            _receive_type(guest, "joined")
+            state = _receive_type(guest, "room_state")
+            assert len(state["data"]["players"]) == 2
+
+
+def test_join_unknown_room_errors(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "join_room", "name": "B", "room_code": "ZZZZZ", "idToken": "t"})
+        assert _receive_type(ws, "error")["message"] == "Sala inexistente"
+
+
+def test_action_outside_room_errors(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "ready", "ready": True, "idToken": "t"})
+        assert _receive_type(ws, "error")["message"] == "Nao esta em sala"
+
+
+def test_leave_room_removes_room_and_lock(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "create_room", "name": "A", "idToken": "t"})
+        code = _receive_type(ws, "joined")["room_code"]
+        _receive_type(ws, "room_state")
+        ws.send_json({"type": "leave_room"})
+        ws.send_json({"type": "unknown"})
+        _receive_type(ws, "error")
+        assert rooms.get_room(code) is None
+        assert rooms.get_lock(code) is None
+
+
+def test_delta_client_receives_patches(client):
+    with client.websocket_connect("/ws") as host:
+        host.send_json({"type": "create_room", "name": "A", "idToken": "t", "delta": True})
+        player_id = _receive_type(host, "joined")["player_id"]
+        _receive_type(host, "room_state")
+
+        host.send_json({"type": "ready", "ready": True, "idToken": "t"})
+        patch = _receive_type(host, "room_patch")
+        assert patch["changes"]["players"] == {player_id: {"ready": True}}
+
+        host.send_json({"type": "sync"})
+        assert _receive_type(host, "room_state")["data"]["version"] == patch["version"]
+
+
+def test_actions_reuse_connection_session(client, monkeypatch):
+    from server.app import main
+    calls = []
+
+    async def counting_verify(token):
+        calls.append(token)
+        return {"uid": "test-user"}
+
+    monkeypatch.setattr(main, "verify_id_token_async", counting_verify)
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "create_room", "name": "A", "idToken": "t"})
+        _receive_type(ws, "room_state")
+        ws.send_json({"type": "ready", "ready": True, "idToken": "t"})
+        ws.send_json({"type": "ready", "ready": False})
+        _receive_type(ws, "room_state")
+    assert calls == ["t"]
+
+
+def test_create_room_with_custom_board(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json(
+            {"type": "create_room", "name": "A", "idToken": "t", "rows": 8, "cols": 10, "max_bases": 7}
+        )
+        state = _receive_type(ws, "room_state")["data"]
+        assert (state["rows"], state["cols"], state["max_bases"]) == (8, 10, 7)
+
+
+def test_create_room_rejects_invalid_board(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "create_room", "name": "A", "idToken": "t", "rows": 0})
+        assert _receive_type(ws, "error")["message"] == "Tabuleiro invalido"
+
+
+def test_ws_messages_are_timed_per_type(client):
+    from server.app import metrics
+    histogram = metrics.WS_MESSAGE_SECONDS.children["create_room"]
+    before = histogram.count
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "create_room", "name": "A", "idToken": "t"})
+        _receive_type(ws, "room_state")
+    assert histogram.count == before + 1
+
+
+def test_join_for_another_workers_room_redirects(client, monkeypatch):
+    monkeypatch.setattr(rooms, "workers", 2)
+    monkeypatch.setattr(rooms, "urls", ["ws://w0/ws", "ws://w1/ws"])
+    code = next(c for c in (f"ZZ{i:03d}" for i in range(100)) if not rooms.owns(c))
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "join_room", "name": "B", "room_code": code, "idToken": "t"})
+        message = _receive_type(ws, "redirect")
+        assert message["room_code"] == code
+        assert message["url"] == rooms.urls[1 - rooms.worker_id]
+
+
+def test_spectator_gets_read_only_view(client):
+    room = rooms.create_room()
+    player = room.game.add_player("A")
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "spectate", "room_code": room.code, "idToken": "t"})
+        assert _receive_type(ws, "spectating")["room_code"] == room.code
+        state = _receive_type(ws, "room_state")
+        assert state["spectator"] is True
+        assert state["data"]["bases"] == {}
+        assert state["data"]["base_counts"] == {player: 0}
+        ws.send_json({"type": "shot", "shot_type": "normal", "idToken": "t"})
+        assert _receive_type(ws, "error")["message"] == "Nao esta em sala"
+    assert len(room.spectators) == 0
+    rooms.remove_room(room.code)
+
+
+def test_place_bases_broadcasts_once(client):
+    with client.websocket_connect("/ws") as host:
+        host.send_json({"type": "create_room", "name": "A", "idToken": "t"})
+        joined = _receive_type(host, "joined")
+        with client.websocket_connect("/ws") as guest:
+            guest.send_json(
+                {"type": "join_room", "name": "B", "room_code": joined["room_code"], "idToken": "t"}
+            )
+            _receive_type(guest, "joined")
+            host.send_json({"type": "ready", "ready": True, "idToken": "t"})
+            guest.send_json({"type": "ready", "ready": True, "idToken": "t"})
+            while _receive_type(host, "room_state")["data"]["phase"] != "placement":
+                pass
+            positions = [[0, c] for c in range(5)]
+            host.send_json({"type": "place_bases", "positions": positions, "idToken": "t"})
+            state = _receive_type(host, "room_state")["data"]
+            assert state["bases"][joined["player_id"]] == positions
+            assert state["message"] == "Bases colocadas"
+            host.send_json({"type": "place_bases", "positions": [], "idToken": "t"})
+            assert _receive_type(host, "error")["message"] == "Mensagem invalida"
+
+
+def test_quick_match_pairs_two_players_in_one_room(client, monkeypatch):
+    monkeypatch.setattr(main, "matchmaker", Matchmaker(bucket_width=100, widen=5.0, timeout=30.0))
+    with client.websocket_connect("/ws") as first, client.websocket_connect("/ws") as second:
+        first.send_json({"type": "quick_match", "name": "A", "rating": 1200, "idToken": "t"})
+        assert first.receive_json()["type"] == "queued"
+        second.send_json({"type": "quick_match", "name": "B", "rating": 1250, "idToken": "t"})
+        code = _receive_type(first, "joined")["room_code"]
+        assert _receive_type(second, "joined")["room_code"] == code
+        state = _receive_type(second, "room_state")["data"]
+        assert [player["name"] for player in state["players"]] == ["A", "B"]
+        assert state["phase"] == "placement"
+        assert len(main.matchmaker) == 0
+        rooms.remove_room(code)
+
+
+def test_quick_match_falls_back_to_the_ai(client, monkeypatch):
+    monkeypatch.setattr(main, "matchmaker", Matchmaker(timeout=0.05))
+    monkeypatch.setattr(main, "QUICK_MATCH_TICK", 0.02)
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "quick_match", "name": "A", "idToken": "t"})
+        assert ws.receive_json()["type"] == "queued"
+        joined = _receive_type(ws, "joined")
+        state = _receive_type(ws, "room_state")["data"]
+        assert [player["name"] for player in state["players"]] == ["A", "CPU"]
+        assert state["message"] == "Nenhum oponente encontrado. Jogando contra a CPU"
+        rooms.remove_room(joined["room_code"])
+
+
+def test_leaving_the_queue_cancels_the_search(client, monkeypatch):
+    monkeypatch.setattr(main, "matchmaker", Matchmaker())
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "quick_match", "name": "A", "idToken": "t"})
+        assert ws.receive_json()["type"] == "queued"
+        ws.send_json({"type": "leave_room"})
+        ws.send_json({"type": "unknown"})
+        _receive_type(ws, "error")
+        assert len(main.matchmaker) == 0
+
+
+def test_null_name_gets_the_default_and_binary_frames_still_encode(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "create_room", "name": None, "delta": None, "idToken": "t"})
+        code = _receive_type(ws, "joined")["room_code"]
+        state = _receive_type(ws, "room_state")["data"]
+        assert state["players"][0]["name"] == "Jogador"
+        with client.websocket_connect("/ws", subprotocols=[wire.SUBPROTOCOL]) as viewer:
+            body = json.dumps({"room_code": code, "idToken": "t"}).encode()
+            viewer.send_bytes(bytes([wire.CLIENT_OPCODES["spectate"]]) + body)
+            assert viewer.receive_bytes()[0] == wire.SERVER_OPCODES["spectating"]
+            assert wire.decode_state(viewer.receive_bytes())["players"][0]["name"] == "Jogador"
+        rooms.remove_room(code)
+
+
+def test_binary_subprotocol_is_negotiated(client):
+    with client.websocket_connect("/ws", subprotocols=[wire.SUBPROTOCOL]) as ws:
+        assert ws.accepted_subprotocol == wire.SUBPROTOCOL
+        ws.send_bytes(bytes([wire.CLIENT_OPCODES["create_room"]]) + b'{"name":"A","idToken":"t"}')
+        frame = ws.receive_bytes()
+        assert frame[0] == wire.SERVER_OPCODES["joined"]
+        joined = json.loads(frame[1:])
+        assert joined["player_index"] == 0
+        frame = ws.receive_bytes()
+        assert frame[0] == wire.SERVER_OPCODES["room_state"]
+        state = wire.decode_state(frame)
+        assert state["room_code"] == joined["room_code"]
+        assert state["players"][0]["name"] == "A"
+
+        ws.send_bytes(bytes([wire.CLIENT_OPCODES["ready"], 1]))
+        state = wire.decode_state(ws.receive_bytes())
+        assert state["players"][0]["ready"] is True
+        rooms.remove_room(joined["room_code"])
+
+
+def test_malformed_messages_are_rejected_before_game_state(client):
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text("{not json")
+        assert _receive_type(ws, "error")["message"] == "Mensagem invalida"
+        ws.send_json(["create_room"])
+        assert _receive_type(ws, "error")["message"] == "Mensagem invalida"
+
+        ws.send_json({"type": "create_room", "name": "A", "idToken": "t"})
+        code = _receive_type(ws, "joined")["room_code"]
+        _receive_type(ws, "room_state")
+        room = rooms.get_room(code)
+        version = room.game.state.version
+        ws.send_json({"type": "place_base", "pos": "0,0", "idToken": "t"})
+        assert _receive_type(ws, "error")["message"] == "Mensagem invalida"
+        ws.send_json({"type": "ready", "ready": "yes", "idToken": "t"})
+        assert _receive_type(ws, "error")["message"] == "Mensagem invalida"
+        assert room.game.state.version == version
+        rooms.remove_room(code)
+
+
+def test_flood_is_dropped_before_game_work(client, monkeypatch):
+    monkeypatch.setattr(main, "limiter", RateLimiter(max_rooms=1, live=lambda code: code in rooms.rooms))
+    with client.websocket_connect("/ws") as ws:
+        ws.send_json({"type": "create_room", "name": "A", "idToken": "t"})
+        code = _receive_type(ws, "joined")["room_code"]
+        _receive_type(ws, "room_state")
+        ws.send_json({"type": "create_room", "name": "A", "idToken": "t"})
+        assert _receive_type(ws, "error")["message"] == "Limite de salas atingido"
+
+        dropped = metrics.WS_RATE_LIMITED.value
+        burst = int(main.limiter.budgets["action"][1])
+        for _ in range(burst + 5):
+            ws.send_json({"type": "ready", "ready": True, "idToken": "t"})
+        ws.send_json({"type": "unknown"})
+        errors = []
+        while not errors or errors[-1] != "Mensagem invalida":
+            message = ws.receive_json()
+            if message["type"] == "error":
+                errors.append(message["message"])
+        assert errors == ["Muitas mensagens", "Mensagem invalida"]
+        assert metrics.WS_RATE_LIMITED.value == dropped + 5
+        rooms.remove_room(code)
@@ -0,0 +1,367 @@
+"""Microbenchmarks for the game and server hot paths.
+
+Each benchmark reports ops/sec (best of several repeats) plus memory use per
+operation from tracemalloc: the peak traced while a sample runs and what is
+still held afterwards, both averaged per op. Results can be saved as a baseline and later runs
+compared against it, failing when a benchmark slows down beyond a threshold.
+
+Usage:
+    python -m tools.bench --save .benchmarks/baseline.json
+    python -m tools.bench --compare .benchmarks/baseline.json --threshold 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence
+
+from server.app import ai
+from server.app.game import GameManager
+from server.app.matchmaking import Matchmaker
+from server.app import codec
+from server.app import main as server
+from server.app.main import Connection, broadcast_room, dispatch
+from server.app.outbox import Outbox
+from server.app.rooms import Room, RoomManager
+
+Op = Callable[[], object]
+BENCHMARKS: Dict[str, Callable[[], Op]] = {}
+
+
+def benchmark(name: str) -> Callable[[Callable[[], Op]], Callable[[], Op]]:
+    def register(setup: Callable[[], Op]) -> Callable[[], Op]:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+def _battle_room(ai_player: bool = False) -> Room:
+    room = Room(code="BENCH")
+    game = room.game
+    player_a = game.add_player("A")
+    player_b = game.add_ai_player("CPU") if ai_player else game.add_player("B")
+    if ai_player:
+        room.ai_player_id = player_b
+        room.ai_difficulty = "hard"
+    game.set_ready(player_a, True)
+    game.set_ready(player_b, True)
+    for pos in [(0, 0), (0, 1), (0, 2), (1, 0), (1, 1)]:
+        game.place_base(player_a, pos)
+    for pos in [(2, 0), (2, 1), (2, 2), (1, 2), (1, 3)]:
+        game.place_base(player_b, pos)
+    return room
+
+
+@benchmark("game.shot")
+def bench_shot() -> Op:
+    room = _battle_room()
+
+    def op() -> object:
+        nonlocal room
+        game = room.game
+        if game.state.phase == "ended":
+            room = _battle_room()
+            game = room.game
+        return game.shot(game.state.turn_player_id, "normal")
+
+    return op
+
+
+@benchmark("game.place_base")
+def bench_place_base() -> Op:
+    game = GameManager(rows=10, cols=10, max_bases=100)
+    player_a = game.add_player("A")
+    game.add_player("B")
+    game.state.phase = "placement"
+    positions = list(game.state.board.positions)
+    index = 0
+
+    def op() -> object:
+        nonlocal index
+        pos = positions[index % len(positions)]
+        index += 1
+        result = game.place_base(player_a, pos)
+        game.state.bases[player_a].discard(pos)
+        return result
+
+    return op
+
+
+@benchmark("game.place_bases")
+def bench_place_bases() -> Op:
+    game = GameManager(rows=10, cols=10, max_bases=100)
+    player_a = game.add_player("A")
+    game.add_player("B")
+    game.state.phase = "placement"
+    batch = [(0, col) for col in range(5)]
+
+    def op() -> object:
+        result = game.place_bases(player_a, batch)
+        game.state.bases[player_a].mask = 0
+        return result
+
+    return op
+
+
+@benchmark("game.serialize")
+def bench_serialize() -> Op:
+    return _battle_room().game.serialize
+
+
+@benchmark("room.state_frame")
+def bench_state_frame() -> Op:
+    room = _battle_room()
+
+    def op() -> object:
+        room.game.set_message("bench")
+        return room.state_frame()
+
+    return op
+
+
+@benchmark("room.binary_frame")
+def bench_binary_frame() -> Op:
+    room = _battle_room()
+
+    def op() -> object:
+        room.game.set_message("bench")
+        return room.binary_frame()
+
+    return op
+
+
+@benchmark("ai.apply_ai")
+def bench_apply_ai() -> Op:
+    room = _battle_room(ai_player=True)
+
+    def op() -> object:
+        nonlocal room
+        if room.game.state.phase == "ended":
+            room = _battle_room(ai_player=True)
+        room.game.state.turn_player_id = room.ai_player_id
+        return ai.apply_ai(room)
+
+    return op
+
+
+@benchmark("ai.apply_ai@50x50")
+def bench_apply_ai_large() -> Op:
+    def fresh() -> Room:
+        room = Room(code="BENCH", game=GameManager(rows=50, cols=50, max_bases=40))
+        game = room.game
+        human = game.add_player("A")
+        room.ai_player_id = game.add_ai_player("CPU")
+        room.ai_difficulty = "hard"
+        game.set_ready(human, True)
+        game.set_ready(room.ai_player_id, True)
+        for col in range(40):
+            game.place_base(human, (25, col))
+        ai.apply_ai(room)
+        return room
+
+    room = fresh()
+
+    def op() -> object:
+        nonlocal room
+        if room.game.state.phase == "ended":
+            room = fresh()
+        room.game.state.turn_player_id = room.ai_player_id
+        return ai.apply_ai(room)
+
+    return op
+
+
+@benchmark("rooms.create_room@50k")
+def bench_create_room() -> Op:
+    manager = RoomManager()
+    for _ in range(50000):
+        manager.create_room()
+
+    def op() -> object:
+        room = manager.create_room()
+        manager.remove_room(room.code)
+        return room
+
+    return op
+
+
+class _NullSocket:
+    async def send_text(self, frame: str) -> None:
+        return None
+
+    async def send_json(self, payload: Dict) -> None:
+        return None
+
+
+@benchmark("main.broadcast_room")
+def bench_broadcast_room() -> Op:
+    loop = asyncio.new_event_loop()
+    room = _battle_room()
+
+    async def attach() -> None:
+        for player_id in room.game.state.players:
+            outbox = Outbox(_NullSocket())
+            outbox.start()
+            room.connections[player_id] = outbox
+
+    loop.run_until_complete(attach())
+
+    async def step() -> None:
+        room.game.set_message("bench")
+        await broadcast_room(room, flush=True)
+        # Let the writer tasks drain their mailboxes.
+        await asyncio.sleep(0)
+
+    def op() -> object:
+        return loop.run_until_complete(step())
+
+    def close() -> None:
+        for outbox in room.connections.values():
+            loop.run_until_complete(outbox.close())
+        loop.close()
+
+    op.close = close  # type: ignore[attr-defined]
+    return op
+
+
+@benchmark("matchmaking.enqueue")
+def bench_enqueue() -> Op:
+    queue = Matchmaker(bucket_width=100, widen=5.0, timeout=30.0)
+    rng = random.Random(7)
+    ratings = [rng.randint(0, 3000) for _ in range(4096)]
+    index = 0
+
+    def op() -> object:
+        nonlocal index
+        index += 1
+        return queue.enqueue(index, ratings[index % len(ratings)], now=index / 5000)
+
+    return op
+
+
+@benchmark("main.dispatch")
+def bench_dispatch() -> Op:
+    loop = asyncio.new_event_loop()
+    room = server.rooms.create_room()
+    player_id = room.game.add_player("A")
+    room.game.add_player("B")
+    conn = Connection(Outbox(_NullSocket()), player_id=player_id, room_code=room.code)
+    conn.session = {"uid": "bench", "exp": time.time() + 3600}
+    frames = [f'{{"type":"ready","ready":{value},"idToken":"t"}}' for value in ("true", "false")]
+    index = 0
+
+    async def step() -> None:
+        nonlocal index
+        index += 1
+        await dispatch(conn, codec.loads(frames[index % 2]))
+
+    def op() -> object:
+        return loop.run_until_complete(step())
+
+    def close() -> None:
+        server.rooms.remove_room(room.code)
+        loop.close()
+
+    op.close = close  # type: ignore[attr-defined]
+    return op
+
+
+def measure(setup: Callable[[], Op], iterations: int, repeats: int) -> Dict[str, float]:
+    random.seed(1234)
+    op = setup()
+    for _ in range(min(iterations, 100)):
+        op()
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            op()
+        best = min(best, time.perf_counter() - start)
+
+    sample = max(1, min(iterations, 1000))
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(sample):
+            op()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    close = getattr(op, "close", None)
+    if close:
+        close()
+
+    return {
+        "ops_per_sec": iterations / best if best > 0 else float("inf"),
+        "peak_bytes_per_op": max(peak - baseline, 0) / sample,
+        "retained_bytes_per_op": max(current - baseline, 0) / sample,
+    }
+
+
+def run(names: Optional[Sequence[str]] = None, iterations: int = 10000, repeats: int = 5) -> Dict[str, Dict]:
+    selected = names or list(BENCHMARKS)
+    return {name: measure(BENCHMARKS[name], iterations, repeats) for name in selected}
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> Dict[str, float]:
+    """Benchmarks whose ops/sec dropped by more than `threshold` (as a ratio)."""
+    regressions = {}
+    for name, row in results.items():
+        before = baseline.get(name)
+        if not before or not before.get("ops_per_sec"):
+            continue
+        change = row["ops_per_sec"] / before["ops_per_sec"] - 1.0
+        if change < -threshold:
+            regressions[name] = change
+    return regressions
+
+
+def main(argv: Sequence[str] = ()) -> int:
+    parser = argparse.ArgumentParser(description="Cannon Blitz microbenchmarks")
+    parser.add_argument("names", nargs="*", help=f"subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--iterations", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--save", type=Path, help="write results to this baseline file")
+    parser.add_argument("--compare", type=Path, help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed ops/sec drop (0.2 = 20%%)")
+    args = parser.parse_args(list(argv) or None)
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    results = run(args.names, args.iterations, args.repeats)
+    baseline = json.loads(args.compare.read_text()) if args.compare else {}
+
+    print(f"{'benchmark':<24} {'ops/sec':>12} {'peak B/op':>10} {'kept B/op':>10} {'vs base':>8}")
+    for name, row in results.items():
+        change = ""
+        if name in baseline and baseline[name].get("ops_per_sec"):
+            change = f"{(row['ops_per_sec'] / baseline[name]['ops_per_sec'] - 1) * 100:+.1f}%"
+        print(
+            f"{name:<24} {row['ops_per_sec']:>12,.0f} {row['peak_bytes_per_op']:>10.0f} "
+            f"{row['retained_bytes_per_op']:>10.0f} {change:>8}"
+        )
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps(results, indent=2, sort_keys=True))
+
+    regressions = compare(results, baseline, args.threshold)
+    for name, change in regressions.items():
+        print(f"REGRESSION {name}: {change * 100:.1f}% ops/sec", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,254 @@
+"""WebSocket load generator for the /ws endpoint.
+
+Opens many simulated clients that play real matches: pairs of clients go
+through create_room, join_room, ready, place_bases and shot, and a share of
+clients play create_ai_room games. It reports latency from an action being
+sent to the next room_state arriving on that connection, throughput, and
+the generator's own event-loop lag (high lag means the numbers measure the
+generator rather than the server).
+
+Start the server with auth disabled, then run for example:
+    AUTH_DISABLED=1 uvicorn server.app.main:app --port 8000
+    python -m tools.loadgen --url ws://127.0.0.1:8000/ws --clients 2000 --ai-ratio 0.25
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+import websockets
+
+
+@dataclass
+class Stats:
+    latencies: Dict[str, List[float]] = field(default_factory=dict)
+    loop_lag: List[float] = field(default_factory=list)
+    games: int = 0
+    errors: int = 0
+    timeouts: int = 0
+
+    def record(self, action: str, seconds: float) -> None:
+        self.latencies.setdefault(action, []).append(seconds)
+
+
+def percentile(samples: Sequence[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class Client:
+    def __init__(self, url: str, stats: Stats, timeout: float) -> None:
+        self.url = url
+        self.stats = stats
+        self.timeout = timeout
+        self.ws = None
+        self.player_id: Optional[str] = None
+        self.room_code: Optional[str] = None
+        self.state: Dict = {}
+        self._changed = asyncio.Event()
+        self._pending: Optional[tuple] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "Client":
+        self.ws = await websockets.connect(self.url, max_queue=None)
+        self._reader = asyncio.create_task(self._read())
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self._reader:
+            self._reader.cancel()
+        await self.ws.close()
+
+    async def _read(self) -> None:
+        async for raw in self.ws:
+            message = json.loads(raw)
+            msg_type = message.get("type")
+            if msg_type == "joined":
+                self.player_id = message["player_id"]
+                self.room_code = message["room_code"]
+            elif msg_type == "room_state":
+                self.state = message["data"]
+                if self._pending:
+                    action, sent_at = self._pending
+                    self.stats.record(action, time.perf_counter() - sent_at)
+                    self._pending = None
+            elif msg_type == "error":
+                self.stats.errors += 1
+            self._changed.set()
+
+    async def action(self, message: Dict) -> None:
+        """Send a message and wait for the room_state that follows it."""
+        message.setdefault("idToken", "load-test")
+        self._pending = (message["type"], time.perf_counter())
+        await self.ws.send(json.dumps(message))
+        await self.wait_for(lambda state: self._pending is None)
+
+    async def wait_for(self, predicate: Callable[[Dict], bool]) -> Dict:
+        deadline = time.perf_counter() + self.timeout
+        while not predicate(self.state):
+            self._changed.clear()
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                self.stats.timeouts += 1
+                raise asyncio.TimeoutError
+            try:
+                await asyncio.wait_for(self._changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                continue
+        return self.state
+
+
+async def _play(client: Client) -> None:
+    state = await client.wait_for(lambda s: s.get("phase") in ("placement", "battle", "ended"))
+    positions = [(r, c) for r in range(state["rows"]) for c in range(state["cols"])]
+    random.shuffle(positions)
+    if state["phase"] == "placement":
+        batch = [list(pos) for pos in positions[: state["max_bases"]]]
+        await client.action({"type": "place_bases", "positions": batch})
+
+    def my_turn_or_over(s: Dict) -> bool:
+        return s.get("phase") == "ended" or (
+            s.get("phase") == "battle" and s.get("turn_player_id") == client.player_id
+        )
+
+    while True:
+        state = await client.wait_for(my_turn_or_over)
+        if state["phase"] == "ended":
+            return
+        await client.action({"type": "shot", "shot_type": "normal"})
+
+
+async def run_pair(url: str, stats: Stats, timeout: float) -> None:
+    async with Client(url, stats, timeout) as host, Client(url, stats, timeout) as guest:
+        await host.action({"type": "create_room", "name": "Host"})
+        await guest.action({"type": "join_room", "name": "Guest", "room_code": host.room_code})
+        await host.action({"type": "ready", "ready": True})
+        await guest.action({"type": "ready", "ready": True})
+        await asyncio.gather(_play(host), _play(guest))
+        stats.games += 1
+
+
+async def run_ai(url: str, stats: Stats, timeout: float, difficulty: str) -> None:
+    async with Client(url, stats, timeout) as client:
+        await client.action({"type": "create_ai_room", "name": "Solo", "difficulty": difficulty})
+        await _play(client)
+        stats.games += 1
+
+
+async def _watch_loop(stats: Stats, interval: float = 0.05) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        stats.loop_lag.append(max(0.0, loop.time() - expected))
+
+
+async def run_load(
+    url: str,
+    clients: int,
+    ai_ratio: float = 0.0,
+    games: int = 1,
+    ramp: float = 0.0,
+    timeout: float = 30.0,
+    difficulty: str = "normal",
+) -> Dict:
+    stats = Stats()
+    ai_clients = int(round(clients * ai_ratio))
+    pairs = (clients - ai_clients) // 2
+
+    async def worker(index: int, job: Callable[[], object]) -> None:
+        if ramp:
+            await asyncio.sleep(ramp * index / max(1, pairs + ai_clients))
+        for _ in range(games):
+            try:
+                await job()
+            except (asyncio.TimeoutError, OSError, websockets.ConnectionClosed):
+                stats.errors += 1
+
+    jobs = [lambda: run_pair(url, stats, timeout) for _ in range(pairs)]
+    jobs += [lambda: run_ai(url, stats, timeout, difficulty) for _ in range(ai_clients)]
+    watcher = asyncio.create_task(_watch_loop(stats))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i, job) for i, job in enumerate(jobs)))
+    elapsed = time.perf_counter() - started
+    watcher.cancel()
+    return report(stats, elapsed)
+
+
+def report(stats: Stats, elapsed: float) -> Dict:
+    every = [value for values in stats.latencies.values() for value in values]
+
+    def summary(samples: Sequence[float]) -> Dict[str, float]:
+        return {
+            "count": len(samples),
+            "p50_ms": percentile(samples, 50) * 1000,
+            "p99_ms": percentile(samples, 99) * 1000,
+            "p999_ms": percentile(samples, 99.9) * 1000,
+            "max_ms": max(samples, default=0.0) * 1000,
+        }
+
+    return {
+        "elapsed_s": elapsed,
+        "games": stats.games,
+        "actions": len(every),
+        "actions_per_sec": len(every) / elapsed if elapsed else 0.0,
+        "errors": stats.errors,
+        "timeouts": stats.timeouts,
+        "latency": summary(every),
+        "latency_by_type": {name: summary(values) for name, values in sorted(stats.latencies.items())},
+        "loop_lag": summary(stats.loop_lag),
+    }
+
+
+def main(argv: Sequence[str] = ()) -> int:
+    parser = argparse.ArgumentParser(description="Cannon Blitz WebSocket load generator")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--ai-ratio", type=float, default=0.0, help="share of clients playing the AI")
+    parser.add_argument("--difficulty", default="normal")
+    parser.add_argument("--games", type=int, default=1, help="games played by each client")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds to spread connections over")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-action timeout")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(list(argv) or None)
+
+    result = asyncio.run(
+        run_load(
+            args.url,
+            args.clients,
+            ai_ratio=args.ai_ratio,
+            games=args.games,
+            ramp=args.ramp,
+            timeout=args.timeout,
+            difficulty=args.difficulty,
+        )
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return 0
+    print(
+        f"games={result['games']} actions={result['actions']} "
+        f"throughput={result['actions_per_sec']:.0f}/s errors={result['errors']} "
+        f"timeouts={result['timeouts']} elapsed={result['elapsed_s']:.1f}s"
+    )
+    print(f"{'action':<16} {'count':>7} {'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8} {'max ms':>8}")
+    rows = dict(result["latency_by_type"], all=result["latency"], loop_lag=result["loop_lag"])
+    for name, row in rows.items():
+        print(
+            f"{name:<16} {row['count']:>7} {row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+            f"{row['p999_ms']:>8.2f} {row['max_ms']:>8.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,340 @@
+"""Headless batch simulator for AI-vs-AI Cannon Blitz games.
+
+Plays many games at once on NumPy arrays, mirroring the rules in
+`server.app.game.GameManager` and the AI in `server.app.ai`. Every game draws from its own counter-based
+RNG stream derived from its seed, so results do not depend on batch size or
+how games are split across worker processes.
+
+Usage:
+    python -m tools.simulate --games 20000 --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import sys
+from multiprocessing import Pool
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from server.app.ai import hard_tables
+from server.app.models import geometry
+
+DIFFICULTIES = ("easy", "normal", "hard")
+NORMAL, PRECISE, STRONG, BUY = 0, 1, 2, 3
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    x = (x ^ (x >> np.uint64(30))) * _MIX_1
+    x = (x ^ (x >> np.uint64(27))) * _MIX_2
+    return x ^ (x >> np.uint64(31))
+
+
+class BatchRng:
+    """One SplitMix64 stream per game, advanced only for that game."""
+
+    def __init__(self, seeds: np.ndarray) -> None:
+        self.state = _mix(seeds.astype(np.uint64) * _GOLDEN + _GOLDEN)
+
+    def uniform(self, games: np.ndarray, width: int) -> np.ndarray:
+        base = self.state[games]
+        steps = np.arange(1, width + 1, dtype=np.uint64) * _GOLDEN
+        raw = _mix(base[:, None] + steps[None, :])
+        self.state[games] = base + steps[-1]
+        return (raw >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def _pick(mask: np.ndarray, u: np.ndarray) -> np.ndarray:
+    """Index of a uniformly chosen True cell per row (rows must be non-empty)."""
+    counts = mask.sum(axis=1)
+    k = np.minimum((u * counts).astype(np.int64), counts - 1)
+    return (mask.cumsum(axis=1) > k[:, None]).argmax(axis=1)
+
+
+def _hard_turn(
+    g, shooter, enemy, bases, saldo, candidates,
+    cleared, ruled_out, seen_enemy, seen_own, last_impact, last_shooter, exposure,
+) -> np.ndarray:
+    """Vectorised HardAI.observe, should_buy and choose_shot for hard shooters."""
+    cells = exposure.size
+    enemy_side = 1 - shooter
+    own_count = bases[g, shooter].sum(axis=1)
+    enemy_count = enemy.sum(axis=1)
+
+    bought = (seen_enemy[g, shooter] >= 0) & (enemy_count > seen_enemy[g, shooter])
+    cleared[g[bought], shooter[bought]] = False
+    shot_at = (seen_own[g, shooter] >= 0) & (last_shooter[g] == enemy_side)
+    was_hit = shot_at & (own_count < seen_own[g, shooter])
+    ruled_out[g[was_hit], shooter[was_hit]] = False
+    single = shot_at & ~was_hit & (last_impact[g].sum(axis=1) == 1)
+    ruled_out[g[single], shooter[single]] |= last_impact[g[single]]
+    seen_enemy[g, shooter] = enemy_count
+    seen_own[g, shooter] = own_count
+
+    unknown = ~cleared[g, shooter]
+    stale = unknown.sum(axis=1) < enemy_count
+    cleared[g[stale], shooter[stale]] = False
+    unknown[stale] = True
+    density = enemy_count / unknown.sum(axis=1)
+    pool = candidates[g, shooter].sum(axis=1)
+    pool[pool == 0] = cells
+    normal = np.minimum(1.0, enemy_count / pool)
+    strong = density * (unknown * exposure).sum(axis=1) / cells
+    value = np.maximum(0.0, 0.5 - normal)
+    money = saldo[g, shooter]
+
+    shot = np.full(g.size, NORMAL)
+    best = normal * (1 + value)
+    score = 0.5 * (1 + value) - value
+    better = (money >= 1) & (score > best)
+    shot[better] = PRECISE
+    best = np.where(better, score, best)
+    score = strong * (1 + value) - 3 * value
+    shot[(money >= 3) & (score > best)] = STRONG
+
+    live = np.maximum(cells - ruled_out[g, shooter].sum(axis=1), own_count)
+    threat = own_count / live
+    threat[saldo[g, enemy_side] >= 1] = np.maximum(threat[saldo[g, enemy_side] >= 1], 0.5)
+    buy = (money >= 2) & (own_count <= 1) & (enemy_count != 1) & (threat >= 0.25)
+    shot[buy] = BUY
+    return shot
+
+
+def simulate_batch(
+    difficulty_a: str,
+    difficulty_b: str,
+    seeds: np.ndarray,
+    rows: int = 3,
+    cols: int = 5,
+    max_bases: int = 5,
+    max_turns: int = 10000,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Play one game per seed; returns (winner, shots) arrays.
+
+    winner is 0 for player A, 1 for player B and -1 if max_turns ran out.
+    shots counts the shots fired by both players.
+    """
+    board = geometry(rows, cols)
+    cells = board.size
+    exposure = np.array(hard_tables(rows, cols).exposure, dtype=np.float64)
+    neighborhoods = np.array(
+        [[bool(mask >> i & 1) for i in range(cells)] for mask in board.neighborhoods]
+    )
+    games = len(seeds)
+    everyone = np.arange(games)
+    rng = BatchRng(np.asarray(seeds))
+    difficulty = np.array(
+        [[DIFFICULTIES.index(difficulty_a), DIFFICULTIES.index(difficulty_b)]] * games
+    )
+
+    # Placement: each side takes max_bases distinct random cells; the hard AI
+    # fills the least exposed cells first.
+    keys = rng.uniform(everyone, 2 * cells).reshape(games, 2, cells)
+    keys += np.where(difficulty[:, :, None] == 2, exposure, 0.0)
+    chosen = np.argsort(keys, axis=2)[:, :, :max_bases]
+    bases = np.zeros((games, 2, cells), dtype=bool)
+    np.put_along_axis(bases, chosen, True, axis=2)
+
+    candidates = np.ones((games, 2, cells), dtype=bool)
+    saldo = np.zeros((games, 2), dtype=np.int64)
+    turn = (rng.uniform(everyone, 1)[:, 0] < 0.5).astype(np.int64)
+    winner = np.full(games, -1, dtype=np.int64)
+    shots = np.zeros(games, dtype=np.int64)
+    active = everyone
+    # Mirror of ai.HardAI, per game and side.
+    cleared = np.zeros((games, 2, cells), dtype=bool)
+    ruled_out = np.zeros((games, 2, cells), dtype=bool)
+    seen_enemy = np.full((games, 2), -1, dtype=np.int64)
+    seen_own = np.full((games, 2), -1, dtype=np.int64)
+    last_impact = np.zeros((games, cells), dtype=bool)
+    last_shooter = np.full(games, -1, dtype=np.int64)
+
+    while active.size and shots[active[0]] < max_turns:
+        g = active
+        shooter = turn[g]
+        enemy_side = 1 - shooter
+        u = rng.uniform(g, 3)
+        money = saldo[g, shooter]
+        level = difficulty[g, shooter]
+
+        shot = np.full(g.size, NORMAL)
+        shot[(level == 1) & (money >= 1) & (u[:, 0] < 0.5)] = PRECISE
+
+        enemy = bases[g, enemy_side]
+        hard = np.flatnonzero(level == 2)
+        if hard.size:
+            shot[hard] = _hard_turn(
+                g[hard], shooter[hard], enemy[hard], bases, saldo, candidates,
+                cleared, ruled_out, seen_enemy, seen_own, last_impact, last_shooter, exposure,
+            )
+
+        buy = np.flatnonzero(shot == BUY)
+        if buy.size:
+            own = bases[g[buy], shooter[buy]]
+            keys = rng.uniform(g[buy], cells) + exposure
+            keys += np.where(ruled_out[g[buy], shooter[buy]], 0.0, cells * 10.0)
+            keys[own] = np.inf
+            own[np.arange(buy.size), keys.argmin(axis=1)] = True
+            bases[g[buy], shooter[buy]] = own
+            saldo[g[buy], shooter[buy]] -= 2
+            seen_own[g[buy], shooter[buy]] = own.sum(axis=1)
+        impact = np.zeros((g.size, cells), dtype=bool)
+
+        normal = np.flatnonzero(shot == NORMAL)
+        if normal.size:
+            pool = candidates[g[normal], shooter[normal]]
+            pool[~pool.any(axis=1)] = True
+            cell = _pick(pool, u[normal, 1])
+            hit = enemy[normal, cell]
+            pool[np.flatnonzero(~hit), cell[~hit]] = False
+            pool[hit] = True
+            candidates[g[normal], shooter[normal]] = pool
+            impact[normal, cell] = True
+
+        precise = np.flatnonzero(shot == PRECISE)
+        if precise.size:
+            target = enemy[precise]
+            on_target = target.any(axis=1) & (u[precise, 2] < 0.5)
+            free = ~target
+            free[~free.any(axis=1)] = True
+            pool = np.where(on_target[:, None], target, free)
+            cell = _pick(pool, u[precise, 1])
+            impact[precise, cell] = True
+            saldo[g[precise], shooter[precise]] -= 1
+
+        strong = np.flatnonzero(shot == STRONG)
+        if strong.size:
+            center = np.minimum((u[strong, 1] * cells).astype(np.int64), cells - 1)
+            impact[strong] = neighborhoods[center]
+            saldo[g[strong], shooter[strong]] -= 3
+
+        fired = shot != BUY
+        hits = (enemy & impact).sum(axis=1)
+        enemy &= ~impact
+        bases[g, enemy_side] = enemy
+        saldo[g, shooter] += hits
+        shots[g] += fired
+        last_impact[g[fired]] = impact[fired]
+        last_shooter[g[fired]] = shooter[fired]
+        if hard.size:
+            side = shooter[hard]
+            cleared[g[hard], side] |= impact[hard]
+            seen_enemy[g[hard], side] = enemy[hard].sum(axis=1)
+
+        won = ~enemy.any(axis=1)
+        winner[g[won]] = shooter[won]
+        turn[g[~won]] = enemy_side[~won]
+        active = g[~won]
+
+    return winner, shots
+
+
+def _run_chunk(args: Tuple) -> Tuple[str, str, np.ndarray, np.ndarray]:
+    difficulty_a, difficulty_b, start, count, options = args
+    seeds = np.arange(start, start + count, dtype=np.uint64)
+    winner, shots = simulate_batch(difficulty_a, difficulty_b, seeds, **options)
+    return difficulty_a, difficulty_b, winner, shots
+
+
+def summarize(winner: np.ndarray, shots: np.ndarray) -> Dict:
+    games = int(winner.size)
+    finished = shots[winner >= 0]
+    histogram = np.bincount(finished) if finished.size else np.zeros(0, dtype=np.int64)
+    return {
+        "games": games,
+        "win_rate_a": float((winner == 0).sum() / games) if games else 0.0,
+        "win_rate_b": float((winner == 1).sum() / games) if games else 0.0,
+        "unfinished": int((winner < 0).sum()),
+        "shots_mean": float(finished.mean()) if finished.size else 0.0,
+        "shots_p10": float(np.percentile(finished, 10)) if finished.size else 0.0,
+        "shots_p50": float(np.percentile(finished, 50)) if finished.size else 0.0,
+        "shots_p90": float(np.percentile(finished, 90)) if finished.size else 0.0,
+        "shots_max": int(finished.max()) if finished.size else 0,
+        "shots_histogram": {
+            int(length): int(count) for length, count in enumerate(histogram) if count
+        },
+    }
+
+
+def run(
+    matchups: Sequence[Tuple[str, str]],
+    games: int,
+    seed: int = 0,
+    workers: int = 1,
+    chunk: int = 5000,
+    **options,
+) -> Dict[str, Dict]:
+    """Simulate `games` games per matchup, split into chunks across workers."""
+    jobs = []
+    for index, (difficulty_a, difficulty_b) in enumerate(matchups):
+        first = seed + index * games
+        for start in range(0, games, chunk):
+            jobs.append((difficulty_a, difficulty_b, first + start, min(chunk, games - start), options))
+
+    if workers > 1:
+        with Pool(workers) as pool:
+            results = pool.map(_run_chunk, jobs)
+    else:
+        results = [_run_chunk(job) for job in jobs]
+
+    merged: Dict[Tuple[str, str], List[Tuple[np.ndarray, np.ndarray]]] = {}
+    for difficulty_a, difficulty_b, winner, shots in results:
+        merged.setdefault((difficulty_a, difficulty_b), []).append((winner, shots))
+    report = {}
+    for (difficulty_a, difficulty_b), parts in merged.items():
+        winner = np.concatenate([part[0] for part in parts])
+        shots = np.concatenate([part[1] for part in parts])
+        report[f"{difficulty_a}-vs-{difficulty_b}"] = summarize(winner, shots)
+    return report
+
+
+def main(argv: Sequence[str] = ()) -> int:
+    parser = argparse.ArgumentParser(description="Batch AI-vs-AI balance simulator")
+    parser.add_argument("--games", type=int, default=10000, help="games per matchup")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--chunk", type=int, default=5000)
+    parser.add_argument("--rows", type=int, default=3)
+    parser.add_argument("--cols", type=int, default=5)
+    parser.add_argument("--max-bases", type=int, default=5)
+    parser.add_argument("--difficulties", default=",".join(DIFFICULTIES))
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args(list(argv) or None)
+
+    levels = [level.strip() for level in args.difficulties.split(",") if level.strip()]
+    for level in levels:
+        if level not in DIFFICULTIES:
+            parser.error(f"unknown difficulty: {level}")
+    matchups = list(itertools.combinations_with_replacement(levels, 2))
+    report = run(
+        matchups,
+        args.games,
+        seed=args.seed,
+        workers=args.workers,
+        chunk=args.chunk,
+        rows=args.rows,
+        cols=args.cols,
+        max_bases=args.max_bases,
+    )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+    print(f"{'matchup':<18} {'games':>7} {'A win':>7} {'B win':>7} {'mean':>6} {'p10':>5} {'p50':>5} {'p90':>5} {'max':>5}")
+    for name, row in report.items():
+        print(
+            f"{name:<18} {row['games']:>7} {row['win_rate_a']:>7.3f} {row['win_rate_b']:>7.3f} "
+            f"{row['shots_mean']:>6.1f} {row['shots_p10']:>5.0f} {row['shots_p50']:>5.0f} "
+            f"{row['shots_p90']:>5.0f} {row['shots_max']:>5}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
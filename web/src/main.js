@@ -189,6 +189,7 @@ let socket = null;
 let playerId = null;
 let state = null;
 let buyingMode = false;
+let draftBases = [];
 let readyState = false;
 let roomCode = null;
 let lastShooterId = null;
@@ -329,8 +330,7 @@ const lobbySteps = initLobbySteps(ui, {
     send('join_room', { name, room_code: code });
   },
   onQuick({ name }) {
-    ui.lobbyMessage.textContent = 'Quick match em breve.';
-    send('create_room', { name });
+    send('quick_match', { name });
   },
   onBack() {
     router.navigate('/menu');
@@ -445,7 +445,8 @@ function setConnectionState(state) {
 
 function connect() {
   setConnectionState('Connecting...');
-  socket = new WebSocket(currentWsUrl);
+  const ws = new WebSocket(currentWsUrl);
+  socket = ws;
   socket.addEventListener('open', () => {
     setConnectionState('Connected');
     const storedRoom = localStorage.getItem('cannon_room');
@@ -463,6 +464,18 @@ function connect() {
 
   socket.addEventListener('message', (evt) => {
     const msg = JSON.parse(evt.data);
+    if (msg.type === 'redirect') {
+      // The room lives on another server worker: reconnect there and retry.
+      pendingJoin = !localStorage.getItem('cannon_room');
+      setWsUrl(msg.url);
+      ws.close();
+      connect();
+      return;
+    }
+    if (msg.type === 'queued') {
+      ui.lobbyMessage.textContent = 'Procurando oponente...';
+      return;
+    }
     if (msg.type === 'joined') {
       playerId = msg.player_id;
       roomCode = msg.room_code;
@@ -517,7 +530,7 @@ function connect() {
   });
 
   socket.addEventListener('close', () => {
-    setConnectionState('Disconnected');
+    if (socket === ws) setConnectionState('Disconnected');
   });
 }
 
@@ -561,6 +574,7 @@ function renderState() {
   const me = state.players.find((p) => p.id === playerId);
   const enemy = state.players.find((p) => p.id !== playerId);
   const myBases = state.bases[playerId] || [];
+  if (state.phase !== 'placement') draftBases = [];
   const enemyBases = enemy ? state.bases[enemy.id] || [] : [];
   const impactsOnEnemy = myImpacts;
   const impactsOnMe = enemyImpacts;
@@ -584,7 +598,7 @@ function renderState() {
   ui.btnReady.disabled = state.phase !== 'lobby';
 
   enemyBoard.render({ bases: enemyBases, impacts: impactsOnEnemy, showBases: enemy ? 'enemy' : null });
-  myBoard.render({ bases: myBases, impacts: impactsOnMe, showBases: 'me' });
+  myBoard.render({ bases: myBases.concat(draftBases), impacts: impactsOnMe, showBases: 'me' });
 
   if (lastPhase !== state.phase) {
     if (state.phase === 'placement') {
@@ -712,7 +726,18 @@ ui.btnCopyLink.addEventListener('click', async () => {
 myBoard.onCellClick(({ r, c }) => {
   if (!state) return;
   if (state.phase === 'placement') {
-    send('place_base', { pos: [r, c] });
+    // Bases are picked locally and sent as one batch once all are chosen.
+    const myBases = state.bases[playerId] || [];
+    const at = (b) => b[0] === r && b[1] === c;
+    if (myBases.some(at)) return;
+    const index = draftBases.findIndex(at);
+    if (index >= 0) draftBases.splice(index, 1);
+    else draftBases.push([r, c]);
+    if (myBases.length + draftBases.length >= state.max_bases) {
+      send('place_bases', { positions: draftBases });
+      draftBases = [];
+    }
+    renderState();
     return;
   }
   if (state.phase === 'battle' && buyingMode) {